@@ -0,0 +1,255 @@
+"""
+Intent Parser
+=============
+Local keyword/regex extractor for the ``INTENT_EXTRACTION_PROMPT`` schema
+(tour_type, categories, num_stops, time_budget_min, accessibility,
+transport_mode).  Most chat messages name their topic plainly, so the
+agent only needs the LLM when ``extract_intent`` reports low confidence.
+"""
+
+import json
+import re
+
+from app.services.poi_service import CATEGORY_MAP
+
+TOUR_TYPES = ("historic", "foodie", "nature", "architecture", "general")
+TRANSPORT_MODES = ("walking", "driving", "transit")
+
+# Keywords match whole words; a trailing ``*`` makes one a word-prefix stem.
+TOUR_TYPE_KEYWORDS = {
+    "historic": ("histor*", "heritage", "revolution*", "colonial", "freedom trail", "gold rush"),
+    "foodie": ("food*", "eat", "eats", "eating", "eatery", "restaurant*", "cuisine", "pizza*",
+               "tasting", "bakery", "bakeries", "deli", "delis", "brunch"),
+    "nature": ("nature", "park", "parks", "garden*", "hike", "hiking", "outdoor*", "scenic",
+               "beach*", "forest*"),
+    "architecture": ("architect*", "building*", "skyscraper*", "skyline*"),
+}
+
+# Keywords → CATEGORY_MAP keys.
+CATEGORY_KEYWORDS = {
+    "landmarks": ("landmark*", "monument*", "sights", "sightseeing", "iconic", "famous", "must-see"),
+    "museums": ("museum*", "galler*", "exhibit*"),
+    "restaurants": ("restaurant*", "food*", "eat", "eats", "eating", "eatery", "dinner", "lunch",
+                    "cuisine", "pizza*", "bakery", "bakeries", "deli", "delis", "brunch"),
+    "parks": ("park", "parks", "garden*", "nature", "green space*", "outdoor*"),
+    "historical": ("histor*", "heritage", "colonial", "revolution*", "freedom trail", "gold rush"),
+    "architecture": ("architect*", "building*", "skyscraper*", "skyline*"),
+    "nightlife": ("nightlife", "bar", "bars", "club*", "cocktail*", "pub", "pubs"),
+    "shopping": ("shop*", "market*", "boutique*", "mall", "malls"),
+}
+
+# Categories implied by a tour type when none are named explicitly.
+TOUR_TYPE_CATEGORIES = {
+    "historic": ["historical", "landmarks"],
+    "foodie": ["restaurants"],
+    "nature": ["parks"],
+    "architecture": ["architecture", "landmarks"],
+    "general": ["landmarks"],
+}
+
+TRANSPORT_KEYWORDS = {
+    "walking": ("walk*", "stroll*", "on foot", "wander*"),
+    "driving": ("drive", "driving", "by car", "road trip"),
+    "transit": ("subway", "metro", "bus", "buses", "transit", "public transport*", "train", "trains"),
+}
+
+ACCESSIBILITY_KEYWORDS = ("wheelchair", "accessible", "stroller", "limited mobility", "step-free")
+
+NUMBER_WORDS = {
+    "one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6,
+    "seven": 7, "eight": 8, "nine": 9, "ten": 10, "a couple of": 2, "a few": 3,
+}
+_NUMBER = r"(\d+|" + "|".join(sorted(NUMBER_WORDS, key=len, reverse=True)) + r")"
+# "5 stops", "three museums", "a few historic sites" — generic nouns or any category keyword.
+STOP_NOUNS = ("stops", "places", "spots", "sites", "locations", "destinations", "attractions") + tuple(
+    kw for kws in CATEGORY_KEYWORDS.values() for kw in kws
+)
+_STOPS_RE = re.compile(
+    r"\b" + _NUMBER + r"\s+(?:(?!(?:hours?|hrs?|minutes?|mins?|days?)\b)\w+\s+)?(?:"
+    + "|".join(re.escape(kw[:-1]) + r"\w*" if kw.endswith("*") else re.escape(kw) + r"\b" for kw in STOP_NOUNS)
+    + ")"
+)
+_HALF = r"(\s*½|\s+and\s+a\s+half)"
+_HOURS_RE = re.compile(
+    r"\b(\d+(?:\.\d+)?|an?|one|two|three|four|five|six)" + _HALF + r"?\s*(?:-\s*)?(?:hours?|hrs?)\b" + _HALF + "?"
+)
+_HALF_HOUR_RE = re.compile(r"\bhalf an? hour\b")
+_MINUTES_RE = re.compile(r"\b(\d+)\s*(?:minutes?|mins?)\b")
+_DAY_RE = re.compile(r"\b(?:half a day|half-day|full day|all day)\b")
+# Any number or duration; if one is left over after the rules above, they misread the message.
+_QUANTITY_RE = re.compile(
+    r"\d|½|\b(?:" + "|".join(w for w in NUMBER_WORDS if " " not in w)
+    + r"|hours?|hrs?|minutes?|mins?|days?)\b"
+)
+_NEGATION_RE = re.compile(
+    r"\b(?:not|no|don't|dont|without|except|avoid|skip|anything but|other than|instead of)\b"
+)
+
+MIN_STOPS, MAX_STOPS, DEFAULT_STOPS = 2, 12, 5
+MINUTES_PER_STOP = 35
+
+
+def extract_intent(message: str, city: str, preferences: dict | None = None) -> tuple[dict, float]:
+    """Return ``(intent, confidence)`` for *message* using keyword rules only."""
+    text = f" {message.casefold()} "
+    prefs = preferences or {}
+    interests = " ".join(str(i) for i in prefs.get("interests", []) or []).casefold()
+    topic_text = f"{text} {interests}"
+
+    type_hits = {t: _count(topic_text, kws) for t, kws in TOUR_TYPE_KEYWORDS.items()}
+    tour_type = max(type_hits, key=type_hits.get) if any(type_hits.values()) else "general"
+    categories = [c for c, kws in CATEGORY_KEYWORDS.items() if _count(topic_text, kws)]
+    topic_matched = bool(categories) or tour_type != "general"
+    if not categories:
+        categories = list(TOUR_TYPE_CATEGORIES[tour_type])
+
+    used: list[re.Match] = []
+    time_budget = _int_pref(prefs, "time_budget_min") or _time_budget(text, used)
+    num_stops = _int_pref(prefs, "num_stops") or _num_stops(text, used)
+    explicit_stops = num_stops is not None
+    if num_stops is None:
+        num_stops = round(time_budget / MINUTES_PER_STOP) if time_budget else DEFAULT_STOPS
+
+    transport = prefs.get("transport_mode") or next(
+        (mode for mode, kws in TRANSPORT_KEYWORDS.items() if _count(text, kws)), None
+    )
+    accessibility = prefs.get("accessibility") or next(
+        (kw for kw in ACCESSIBILITY_KEYWORDS if kw in text), None
+    )
+
+    intent = normalise_intent({
+        "tour_type": tour_type,
+        "categories": categories,
+        "num_stops": num_stops,
+        "time_budget_min": time_budget,
+        "accessibility": accessibility,
+        "transport_mode": transport or "walking",
+    })
+
+    confidence = 0.6 if topic_matched else 0.2
+    confidence += 0.1 * sum((explicit_stops, time_budget is not None, transport is not None))
+    if _NEGATION_RE.search(text):
+        # "no museums", "anything except food" — rules can't reason about these.
+        confidence = min(confidence, 0.3)
+    if _unused_quantity(text, used):
+        # "3 museums and 2 parks", "a few hours" — numbers the rules couldn't place.
+        confidence = min(confidence, 0.3)
+    if len(text.split()) > 40:
+        confidence *= 0.8
+    return intent, round(min(confidence, 1.0), 2)
+
+
+def parse_llm_intent(content: str) -> dict | None:
+    """Pull the JSON object out of an LLM reply and normalise it."""
+    match = re.search(r"\{.*\}", content, re.DOTALL)
+    if not match:
+        return None
+    try:
+        raw = json.loads(match.group(0))
+    except json.JSONDecodeError:
+        return None
+    return normalise_intent(raw) if isinstance(raw, dict) else None
+
+
+def normalise_intent(raw: dict) -> dict:
+    """Coerce an intent dict onto the prompt schema with safe defaults."""
+    tour_type = str(raw.get("tour_type") or "general").lower()
+    if tour_type not in TOUR_TYPES:
+        tour_type = "general"
+
+    by_label = {label.casefold(): key for key, label in CATEGORY_MAP.items()}
+    categories = []
+    for cat in raw.get("categories") or []:
+        key = str(cat).casefold()
+        key = key if key in CATEGORY_MAP else by_label.get(key)
+        if key and key not in categories:
+            categories.append(key)
+
+    try:
+        num_stops = int(raw.get("num_stops") or DEFAULT_STOPS)
+    except (TypeError, ValueError):
+        num_stops = DEFAULT_STOPS
+    try:
+        time_budget = int(raw["time_budget_min"]) if raw.get("time_budget_min") else None
+    except (TypeError, ValueError):
+        time_budget = None
+
+    transport = str(raw.get("transport_mode") or "walking").lower()
+    return {
+        "tour_type": tour_type,
+        "categories": categories or list(TOUR_TYPE_CATEGORIES[tour_type]),
+        "num_stops": max(MIN_STOPS, min(MAX_STOPS, num_stops)),
+        "time_budget_min": time_budget,
+        "accessibility": raw.get("accessibility") or None,
+        "transport_mode": transport if transport in TRANSPORT_MODES else "walking",
+    }
+
+
+# ── Helpers ──────────────────────────────────────────────────────────
+
+
+def _pattern(keywords: tuple[str, ...]) -> re.Pattern:
+    parts = [
+        re.escape(kw[:-1]) + r"\w*" if kw.endswith("*") else re.escape(kw) + r"\b"
+        for kw in keywords
+    ]
+    return re.compile(r"\b(?:" + "|".join(parts) + ")")
+
+
+_PATTERNS: dict[tuple[str, ...], re.Pattern] = {}
+
+
+def _count(text: str, keywords: tuple[str, ...]) -> int:
+    """Number of distinct *keywords* present in *text*."""
+    pattern = _PATTERNS.get(keywords)
+    if pattern is None:
+        pattern = _PATTERNS[keywords] = _pattern(keywords)
+    return len(set(pattern.findall(text)))
+
+
+def _int_pref(prefs: dict, key: str) -> int | None:
+    """A numeric preference as ``int`` (clients may send strings); ``None`` if unusable."""
+    try:
+        return int(prefs[key]) if prefs.get(key) else None
+    except (TypeError, ValueError):
+        return None
+
+
+def _to_number(token: str) -> float:
+    if token in ("a", "an"):
+        return 1
+    return NUMBER_WORDS.get(token) or float(token)
+
+
+def _num_stops(text: str, used: list[re.Match]) -> int | None:
+    match = _STOPS_RE.search(text)
+    if not match:
+        return None
+    used.append(match)
+    return int(_to_number(match.group(1)))
+
+
+def _time_budget(text: str, used: list[re.Match]) -> int | None:
+    if match := _DAY_RE.search(text):
+        used.append(match)
+        return 240 if match.group(0).startswith("half") else 480
+    minutes = 0.0
+    if match := _HALF_HOUR_RE.search(text):
+        used.append(match)
+        minutes += 30
+    elif match := _HOURS_RE.search(text):
+        used.append(match)
+        half = 0.5 if match.group(2) or match.group(3) else 0
+        minutes += (_to_number(match.group(1)) + half) * 60
+    if match := _MINUTES_RE.search(text):
+        used.append(match)
+        minutes += float(match.group(1))
+    return int(minutes) if minutes else None
+
+
+def _unused_quantity(text: str, used: list[re.Match]) -> bool:
+    """Whether *text* mentions a number or duration outside the *used* matches."""
+    for match in used:
+        start, end = match.span()
+        text = text[:start] + " " * (end - start) + text[end:]
+    return bool(_QUANTITY_RE.search(text))
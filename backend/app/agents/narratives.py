@@ -0,0 +1,172 @@
+"""
+Narratives
+==========
+Per-stop narrative pieces and how they are keyed, parsed and assembled.
+
+The agent caches one narrative per (POI, tour_type, style) and only asks
+the LLM for stops it has never written before.  The LLM replies in the
+same ``### <n>. <name>`` section format that the final reply uses, so
+fresh sections can be streamed straight through while cached ones are
+spliced in at the right positions.
+"""
+
+import re
+
+from app.data.cache import normalise_key
+
+_HEADING_RE = re.compile(r"^### (\d+)\.[^\n]*\n", re.MULTILINE)
+
+
+def narrative_key(poi: dict, tour_type: str, style: str) -> str:
+    """Cache key for one stop's narrative: POI identity + tour_type + style."""
+    loc = poi.get("location") or {}
+    identity = (
+        f"{normalise_key(poi.get('name', ''))}"
+        f"@{round(loc.get('lat', 0.0), 4)},{round(loc.get('lng', 0.0), 4)}"
+    )
+    return f"{identity}|{tour_type}|{normalise_key(style)}"
+
+
+def heading(position: int, poi: dict) -> str:
+    return f"### {position}. {poi.get('name', 'Unknown')}\n"
+
+
+def format_section(position: int, poi: dict, body: str) -> str:
+    return f"{heading(position, poi)}{body.strip()}\n\n"
+
+
+def fallback_body(poi: dict) -> str:
+    """Used (but never cached) when the LLM skips a stop."""
+    return poi.get("description") or f"A stop at {poi.get('name', 'this location')}."
+
+
+def parse_sections(text: str) -> dict[int, str]:
+    """``### n. name`` blocks → ``{n: body}`` (1-based positions)."""
+    matches = list(_HEADING_RE.finditer(text))
+    bodies: dict[int, str] = {}
+    for match, nxt in zip(matches, matches[1:] + [None]):
+        body = text[match.end():nxt.start() if nxt else len(text)].strip()
+        if body:
+            bodies[int(match.group(1))] = body
+    return bodies
+
+
+def route_summary(route: dict | None) -> str:
+    if not route or not route.get("total_distance_miles"):
+        return ""
+    return (
+        f"**Total:** {route['total_distance_miles']} mi, "
+        f"about {round(route.get('total_time_min', 0))} min of travel between stops."
+    )
+
+
+def assemble(pois: list[dict], bodies: dict[int, str], route: dict | None) -> str:
+    """Join per-stop sections (in visiting order) and the route summary."""
+    text = "".join(
+        format_section(i, poi, bodies.get(i) or fallback_body(poi))
+        for i, poi in enumerate(pois, start=1)
+    )
+    return text + route_summary(route)
+
+
+class SectionStream:
+    """
+    Incrementally re-orders a streamed LLM reply into the final layout.
+
+    ``feed`` takes raw LLM text and returns the text that can be shown
+    now: fresh sections pass through as they arrive, and cached (or
+    skipped) stops are emitted as soon as the stream reaches them.
+    """
+
+    def __init__(self, pois: list[dict], cached: dict[int, str]):
+        self.pois = pois
+        self.cached = cached
+        self.fresh: dict[int, str] = {}
+        self._buf = ""
+        self._scanned = 0       # raw text consumed so far
+        self._current = None    # position whose body is streaming
+        self._body_start = 0
+        self._next = 1          # next position not yet emitted
+        self._tail = "\n\n"   # last characters emitted
+
+    def start(self) -> str:
+        """Cached sections that precede the first stop the LLM must write."""
+        out = []
+        while self._next <= len(self.pois) and self._next in self.cached:
+            out.append(self._section(self._next))
+        return self._emit(out)
+
+    def feed(self, text: str) -> str:
+        self._buf += text
+        return self._drain(self._safe_end())
+
+    def close(self) -> str:
+        out = [self._drain(len(self._buf))]
+        self._finish_current()
+        out.append(self._emit(self._sections_before(len(self.pois) + 1)))
+        # End on a blank line, exactly like ``assemble``.
+        trailing = len(self._tail) - len(self._tail.rstrip("\n"))
+        out.append(self._emit(["\n" * (2 - trailing)]))
+        return "".join(out)
+
+    # ── Internals ────────────────────────────────────────────────────
+
+    def _drain(self, end: int) -> str:
+        out = []
+        while match := _HEADING_RE.search(self._buf, self._scanned, end):
+            out.append(self._take(match.start()))
+            self._finish_current()
+            self._scanned = match.end()
+            position = int(match.group(1))
+            if self._next <= position <= len(self.pois) and position not in self.cached:
+                # Splice in any cached/skipped stops the stream jumped past.
+                out.append(self._emit(self._sections_before(position)))
+                out.append(self._emit([heading(position, self.pois[position - 1])]))
+                self._current, self._body_start, self._next = position, match.end(), position + 1
+        out.append(self._take(end))
+        return "".join(out)
+
+    def _take(self, end: int) -> str:
+        """Consume raw text up to *end*; only the current body is shown."""
+        if end <= self._scanned:
+            return ""
+        text = self._buf[self._scanned:end] if self._current is not None else ""
+        self._scanned = end
+        return self._emit([text]) if text else ""
+
+    def _safe_end(self) -> int:
+        # Hold back a trailing partial line that may still become a heading.
+        tail_start = self._buf.rfind("\n") + 1
+        tail = self._buf[tail_start:]
+        if tail.startswith("###") or "### ".startswith(tail):
+            return max(tail_start, self._scanned)
+        return len(self._buf)
+
+    def _finish_current(self):
+        if self._current is None:
+            return
+        body = self._buf[self._body_start:self._scanned].strip()
+        if body:
+            self.fresh[self._current] = body
+        self._current = None
+
+    def _sections_before(self, position: int) -> list[str]:
+        out = []
+        while self._next < position:
+            out.append(self._section(self._next))
+        return out
+
+    def _section(self, position: int) -> str:
+        poi = self.pois[position - 1]
+        self._next = position + 1
+        return format_section(position, poi, self.cached.get(position) or fallback_body(poi))
+
+    def _emit(self, parts: list[str]) -> str:
+        text = "".join(parts)
+        if not text:
+            return ""
+        if text.startswith("### ") and self._tail != "\n\n":
+            # Keep a blank line between a streamed body and the next heading.
+            text = ("\n" if self._tail.endswith("\n") else "\n\n") + text
+        self._tail = (self._tail + text)[-2:]
+        return text
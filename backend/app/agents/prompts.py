@@ -48,3 +48,20 @@ For each stop include:
 
 End with a summary of total distance and estimated duration.
 """
+
+STOP_NARRATIVE_PROMPT = """\
+Write tour narratives for the numbered stops below.
+
+Stops:
+{stops}
+
+Tour type: {tour_type}
+User preferences: {preferences}
+
+For each stop write a fun 2-3 sentence narrative with an interesting fact,
+followed by an estimated time to spend there.  Reply with one block per
+stop, keeping the given numbers and names, in exactly this format:
+
+### <number>. <name>
+<narrative>
+"""
@@ -6,18 +6,43 @@ The main LangChain agent that orchestrates:
   2. Fetching POI data from ArcGIS
   3. Optimizing the route
   4. Generating a rich narrative for each stop
+
+The LLM stack (``langchain``, ``langchain_openai``, ``openai``) is
+imported on first use, not with this module, so processes that only
+serve the catalogue never pay for it.
 """
 
-from langchain_openai import ChatOpenAI
-from langchain.prompts import ChatPromptTemplate
-from langchain.schema import HumanMessage, SystemMessage
+import asyncio
+import logging
+import time
+from typing import AsyncIterator
 
+from app.agents.intent_parser import extract_intent, parse_llm_intent
+from app.agents.narratives import (
+    SectionStream,
+    assemble,
+    fallback_body,
+    narrative_key,
+    parse_sections,
+    route_summary,
+)
+from app.agents.prompts import INTENT_EXTRACTION_PROMPT, STOP_NARRATIVE_PROMPT
 from app.config import settings
+from app.data.cache import build_cache, request_key
+from app.data.cities import SUPPORTED_CITIES
+from app.models.schemas import POI, Tour, TourStop
 from app.services.arcgis_service import ArcGISService
+from app.services.http_pool import HTTPClientPool
+from app.services.distance_matrix import DistanceMatrixCache
 from app.services.route_service import RouteService
 from app.services.poi_service import POIService
+from app.services.telemetry import LLM_TOKENS, span, traced
+
+log = logging.getLogger(__name__)
 
 
+OPENAI_BASE_URL = "https://api.openai.com/v1"
+
 SYSTEM_PROMPT = """\
 You are GeoExplore-AI, an expert tour guide and travel planner.
 You create personalized walking/driving tours for cities using real
@@ -31,18 +56,169 @@ accessibility needs).  Be enthusiastic but concise.
 """
 
 
+# Intent assumed for speculative prefetch (and the pre-LLM default).
+DEFAULT_INTENT = {
+    "tour_type": "general",
+    "categories": ["landmarks"],
+    "num_stops": 5,
+    "transport_mode": "walking",
+}
+
+
+class SpeculationStats:
+    """Counters for the speculative POI/route prefetch."""
+
+    def __init__(self):
+        self.started = 0
+        self.hits = 0
+        self.misses = 0
+        self.failures = 0
+        self.time_saved_s = 0.0
+
+    def record_hit(self, saved_s: float):
+        self.hits += 1
+        self.time_saved_s += max(saved_s, 0.0)
+
+    def stats(self) -> dict:
+        decided = self.hits + self.misses
+        return {
+            "started": self.started,
+            "hits": self.hits,
+            "misses": self.misses,
+            "failures": self.failures,
+            "hit_rate": round(self.hits / decided, 3) if decided else 0.0,
+            "time_saved_s": round(self.time_saved_s, 3),
+        }
+
+
+class IntentStats:
+    """How chat intents were resolved: cache, local rules or the LLM."""
+
+    def __init__(self):
+        self.requests = 0
+        self.cache_hits = 0
+        self.rule_hits = 0
+        self.llm_calls = 0
+        self.llm_failures = 0
+
+    def stats(self) -> dict:
+        skipped = self.cache_hits + self.rule_hits
+        return {
+            "requests": self.requests,
+            "cache_hits": self.cache_hits,
+            "rule_hits": self.rule_hits,
+            "llm_calls": self.llm_calls,
+            "llm_failures": self.llm_failures,
+            "llm_skip_rate": round(skipped / self.requests, 3) if self.requests else 0.0,
+        }
+
+
+class NarrativeStats:
+    """Per-stop narrative reuse versus fresh generation."""
+
+    def __init__(self):
+        self.stops_cached = 0
+        self.stops_generated = 0
+        self.llm_calls = 0
+        self.llm_failures = 0
+
+    def stats(self) -> dict:
+        total = self.stops_cached + self.stops_generated
+        return {
+            "stops_cached": self.stops_cached,
+            "stops_generated": self.stops_generated,
+            "llm_calls": self.llm_calls,
+            "llm_failures": self.llm_failures,
+            "reuse_rate": round(self.stops_cached / total, 3) if total else 0.0,
+        }
+
+
+def llm_usage_callback(model: str):
+    """A LangChain callback that feeds token counts into ``geoexplore_llm_tokens_total``."""
+    from langchain.callbacks.base import AsyncCallbackHandler
+
+    class LLMUsageCallback(AsyncCallbackHandler):
+        async def on_llm_new_token(self, token: str, **kwargs):
+            # Streamed replies carry no usage block; count chunks (≈ tokens).
+            LLM_TOKENS.inc(model, "completion")
+
+        async def on_llm_end(self, response, **kwargs):
+            usage = (response.llm_output or {}).get("token_usage") or {}
+            if usage:
+                LLM_TOKENS.inc(model, "prompt", amount=usage.get("prompt_tokens", 0))
+                LLM_TOKENS.inc(model, "completion", amount=usage.get("completion_tokens", 0))
+
+    return LLMUsageCallback()
+
+
 class TourAgent:
     """High-level agent that chains together the LangChain pipeline."""
 
-    def __init__(self):
-        self.llm = ChatOpenAI(
+    def __init__(self, http: HTTPClientPool | None = None):
+        self._http = http
+        self._llm = None  # built on first use (see ``llm``)
+        self.arcgis = ArcGISService(http=http)
+        self.poi_service = POIService(arcgis=self.arcgis)
+        self.route_service = RouteService(
+            http=http, matrices=DistanceMatrixCache(self.poi_service.store)
+        )
+        self.speculation = SpeculationStats()
+        self.intent_cache = build_cache(
+            "intent", settings.INTENT_CACHE_SIZE, settings.INTENT_CACHE_TTL_S
+        )
+        self.intents = IntentStats()
+        self.narrative_cache = build_cache(
+            "narrative", settings.NARRATIVE_CACHE_SIZE, settings.NARRATIVE_CACHE_TTL_S
+        )
+        self.narratives = NarrativeStats()
+
+    @property
+    def llm(self):
+        """The chat model, created (and the LLM stack imported) on first use."""
+        if self._llm is None:
+            self._llm = self._build_llm()
+        return self._llm
+
+    @llm.setter
+    def llm(self, model):
+        self._llm = model
+
+    def _build_llm(self):
+        import openai
+        from langchain_openai import ChatOpenAI
+
+        llm_kwargs = {}
+        if self._http is not None:
+            # Route OpenAI traffic through the shared keep-alive pool too;
+            # its transport already rate-limits, retries and circuit-breaks,
+            # so the SDK's own retry loop is switched off.
+            llm_kwargs["async_client"] = openai.AsyncOpenAI(
+                api_key=settings.OPENAI_API_KEY,
+                http_client=self._http.client(OPENAI_BASE_URL),
+                max_retries=0,
+            ).chat.completions
+        return ChatOpenAI(
             model="gpt-4o",
             temperature=0.7,
             api_key=settings.OPENAI_API_KEY,
+            callbacks=[llm_usage_callback("gpt-4o")],
+            **llm_kwargs,
         )
-        self.arcgis = ArcGISService()
-        self.route_service = RouteService()
-        self.poi_service = POIService()
+
+    def stats(self) -> dict:
+        return {
+            "caches": {
+                "geocode": self.arcgis.geocode_cache.stats(),
+                "intent": self.intent_cache.stats(),
+                "narrative": self.narrative_cache.stats(),
+            },
+            "poi_store": self.poi_service.store.stats(),
+            "distance_matrices": self.route_service.matrices.stats(),
+            "routes": self.route_service.stats(),
+            "intents": self.intents.stats(),
+            "narratives": self.narratives.stats(),
+            "speculation": self.speculation.stats(),
+        }
 
     async def run(
         self,
@@ -55,81 +231,378 @@ class TourAgent:
         user message → intent parsing → POI retrieval → route optimisation → narrative
         """
 
-        # Step 1  — Understand intent & extract parameters
-        intent = await self._parse_intent(message, city, preferences)
+        # Step 1  — Understand intent & extract parameters (a speculative
+        #           POI search + route runs if the LLM is needed)
+        intent, planned = await self._understand(message, city, preferences)
 
-        # Step 2  — Retrieve relevant POIs from ArcGIS
-        pois = await self.poi_service.search(
-            city=city,
-            categories=intent.get("categories", ["landmarks"]),
-            limit=intent.get("num_stops", 5),
-        )
+        if planned is None:
+            # Step 2  — Retrieve relevant POIs from ArcGIS
+            pois = await self._find_pois(city, intent)
 
-        # Step 3  — Build an optimised route
-        route = await self.route_service.optimise(pois)
+            # Step 3  — Build an optimised route and visit stops in that order
+            route, pois = await self._build_route(city, pois, intent)
+        else:
+            pois, route = planned
 
         # Step 4  — Generate the narrative response
         narrative = await self._generate_narrative(
             pois=pois,
             route=route,
             preferences=preferences,
+            intent=intent,
         )
 
-        return {
-            "reply": narrative,
-            "tour": {
-                "stops": pois,
-                "route": route,
-                "category": intent.get("tour_type", "general"),
-            },
-            "map_data": {
-                "center": route.get("center") if route else None,
-                "waypoints": [p.get("location") for p in pois],
-            },
+        return self._assemble(narrative, pois, route, intent)
+
+    async def run_stream(
+        self,
+        message: str,
+        city: str = "nyc",
+        preferences: dict | None = None,
+    ) -> AsyncIterator[tuple[str, dict]]:
+        """
+        Same pipeline as ``run`` but yields ``(event, payload)`` pairs as
+        soon as each stage finishes, then the narrative token by token:
+
+        intent → pois → route → token* → done
+        """
+        intent, planned = await self._understand(message, city, preferences)
+        yield "intent", intent
+
+        if planned is None:
+            pois = await self._find_pois(city, intent)
+        else:
+            pois, route = planned
+        yield "pois", {
+            "stops": pois,
+            "waypoints": [p.get("location") for p in pois],
+        }
+
+        if planned is None:
+            route, pois = await self._build_route(city, pois, intent)
+        yield "route", {
+            "route": route,
+            "center": route.get("center") if route else None,
+            "waypoints": [p.get("location") for p in pois],
         }
 
+        keys, cached = self._cached_narratives(pois, intent, preferences)
+        stream = SectionStream(pois, cached)
+        if text := stream.start():
+            yield "token", {"text": text}
+        failed = False
+        if len(cached) < len(pois):
+            self.narratives.llm_calls += 1
+            messages = self._narrative_messages(pois, cached, preferences, intent)
+            try:
+                with span("narrative_stream"):
+                    async for chunk in self.llm.astream(messages):
+                        if chunk.content and (text := stream.feed(chunk.content)):
+                            yield "token", {"text": text}
+            except Exception as e:
+                # Finish with fallbacks for whatever the LLM didn't write.
+                log.warning(f"⚠️  Narrative LLM error: {e}")
+                self.narratives.llm_failures += 1
+                failed = True
+        if text := stream.close() + route_summary(route):
+            yield "token", {"text": text}
+        if not failed:
+            # A cut-off stream may end mid-section; don't cache that.
+            self._store_narratives(keys, stream.fresh)
+
+        narrative = assemble(pois, {**cached, **stream.fresh}, route)
+        yield "done", self._assemble(narrative, pois, route, intent)
+
+    @traced("template")
+    async def materialise_template(self, template: dict) -> tuple[dict, bool]:
+        """
+        Build the finished tour for a ``TOUR_TEMPLATES`` entry: geocode its
+        ``default_stops``, route them and narrate each stop.  Returns a
+        ``schemas.Tour`` payload (stops that don't geocode are left out)
+        and whether it is *degraded* — some narratives are placeholders or
+        the route fell back to a local estimate — and worth rebuilding.
+        """
+        city = SUPPORTED_CITIES[template["city"]]
+        found = await self.arcgis.geocode_many(
+            [f"{name}, {city['name']}" for name in template["default_stops"]]
+        )
+        pois = [
+            {
+                "name": name,
+                "category": template["category"],
+                "location": {"lat": hit["lat"], "lng": hit["lng"]},
+                "address": hit.get("label") or "",
+            }
+            for name, hit in zip(template["default_stops"], found)
+            if hit is not None
+        ]
+        intent = {**DEFAULT_INTENT, "tour_type": template["category"], "num_stops": len(pois)}
+        route, pois = await self._build_route(template["city"], pois, intent)
+        bodies = await self._narrative_bodies(pois, None, intent)
+
+        travel_min = route.get("total_time_min", 0) if route else 0
+        # Whatever the template's duration leaves after travel is split across stops.
+        dwell_min = max(
+            TourStop.model_fields["duration_min"].default,
+            round((template["estimated_duration_min"] - travel_min) / max(len(pois), 1)),
+        )
+        degraded = len(bodies) < len(pois) or bool(route and route.get("fallback"))
+        tour = Tour(
+            id=template["id"],
+            name=template["name"],
+            city=template["city"],
+            category=template["category"],
+            stops=[
+                TourStop(
+                    order=i,
+                    poi=POI(**poi),
+                    narrative=bodies.get(i) or fallback_body(poi),
+                    duration_min=dwell_min,
+                )
+                for i, poi in enumerate(pois, start=1)
+            ],
+            total_distance_miles=route.get("total_distance_miles", 0) if route else 0,
+            total_time_min=travel_min,
+        ).model_dump()
+        return tour, degraded
+
     # ── Private helpers ──────────────────────────────────────────────
 
+    @traced("intent")
+    async def _understand(
+        self, message: str, city: str, preferences: dict | None
+    ) -> tuple[dict, tuple[list[dict], dict | None] | None]:
+        """
+        Resolve the intent — cache, then local rules, then the LLM — and,
+        only when the LLM round-trip is needed, overlap it with a
+        speculative plan.  Returns ``(intent, (pois, route) | None)``.
+        """
+        self.intents.requests += 1
+        key = request_key(message, city, preferences)
+        intent = self.intent_cache.get(key)
+        if intent is not None:
+            self.intents.cache_hits += 1
+            return intent, None
+
+        draft, confidence = extract_intent(message, city, preferences)
+        if confidence >= settings.INTENT_RULES_MIN_CONFIDENCE:
+            self.intents.rule_hits += 1
+            self.intent_cache.set(key, draft)
+            return draft, None
+
+        speculation = self._start_speculation(city)
+        try:
+            intent = await self._parse_intent(message, city, preferences)
+        except BaseException:
+            # Cancelled (e.g. the SSE client went away) or failed: don't
+            # leave the prefetch running on its own.
+            await self._discard_speculation(speculation)
+            raise
+        if intent is None:
+            intent = draft
+        else:
+            self.intent_cache.set(key, intent)
+        return intent, await self._resolve_speculation(speculation, intent)
+
+    def _start_speculation(self, city: str) -> asyncio.Task | None:
+        """Kick off POI search + routing for DEFAULT_INTENT in the background."""
+        if not settings.SPECULATIVE_PREFETCH:
+            return None
+        self.speculation.started += 1
+        return asyncio.create_task(self._speculate(city))
+
+    @traced("speculation")
+    async def _speculate(self, city: str) -> tuple[list[dict], dict | None, float]:
+        started = time.perf_counter()
+        pois = await self._find_pois(city, DEFAULT_INTENT)
+        route, pois = await self._build_route(city, pois, DEFAULT_INTENT)
+        return pois, route, time.perf_counter() - started
+
+    async def _resolve_speculation(
+        self, task: asyncio.Task | None, intent: dict
+    ) -> tuple[list[dict], dict | None] | None:
+        """
+        Reuse the speculative ``(pois, route)`` if *intent* asks for exactly
+        what was prefetched; otherwise cancel it and return ``None``.
+        """
+        if task is None:
+            return None
+        if not self._matches_default(intent):
+            await self._discard_speculation(task)
+            self.speculation.misses += 1
+            return None
+        waited_from = time.perf_counter()
+        try:
+            pois, route, elapsed = await task
+        except Exception as e:
+            log.warning(f"⚠️  Speculative prefetch failed: {e}")
+            self.speculation.failures += 1
+            return None
+        # Time saved = speculative work that overlapped intent parsing.
+        self.speculation.record_hit(elapsed - (time.perf_counter() - waited_from))
+        return pois, route
+
+    @staticmethod
+    async def _discard_speculation(task: asyncio.Task | None):
+        """Cancel a prefetch and wait for it, so its outcome is never left unretrieved."""
+        if task is None:
+            return
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+    @staticmethod
+    def _matches_default(intent: dict) -> bool:
+        return (
+            list(intent.get("categories", ["landmarks"])) == DEFAULT_INTENT["categories"]
+            and intent.get("num_stops", 5) == DEFAULT_INTENT["num_stops"]
+            and intent.get("transport_mode", "walking") == DEFAULT_INTENT["transport_mode"]
+        )
+
+    @traced("intent_llm")
     async def _parse_intent(
         self, message: str, city: str, preferences: dict | None
-    ) -> dict:
-        """Use the LLM to extract structured intent from the user message."""
+    ) -> dict | None:
+        """Use the LLM to extract structured intent (``None`` if unusable)."""
+        from langchain.prompts import ChatPromptTemplate
+
         prompt = ChatPromptTemplate.from_messages(
-            [
-                ("system", "Extract the tour intent from the user message. "
-                 "Return JSON with keys: tour_type, categories (list), "
-                 "num_stops (int), time_budget_min (int or null)."),
-                ("human", "{message}\nCity: {city}\nPreferences: {preferences}"),
-            ]
+            [("human", INTENT_EXTRACTION_PROMPT)]
         )
         chain = prompt | self.llm
-        result = await chain.ainvoke(
-            {"message": message, "city": city, "preferences": str(preferences)}
+        self.intents.llm_calls += 1
+        try:
+            result = await chain.ainvoke(
+                {"message": message, "city": city, "preferences": str(preferences)}
+            )
+            intent = parse_llm_intent(result.content)
+        except Exception as e:
+            log.warning(f"⚠️  Intent LLM error: {e}")
+            intent = None
+        if intent is None:
+            self.intents.llm_failures += 1
+        return intent
+
+    @traced("pois")
+    async def _find_pois(self, city: str, intent: dict) -> list[dict]:
+        return await self.poi_service.search(
+            city=city,
+            categories=intent.get("categories", ["landmarks"]),
+            limit=intent.get("num_stops", 5),
         )
-        # TODO: parse the JSON from the LLM response
+
+    @traced("route")
+    async def _build_route(
+        self, city: str, pois: list[dict], intent: dict
+    ) -> tuple[dict | None, list[dict]]:
+        """Optimise the route; return it with *pois* in visiting order."""
+        route = await self.route_service.optimise(
+            pois, transport_mode=intent.get("transport_mode", "walking"), city=city
+        )
+        if route and route.get("sequence"):
+            pois = [pois[i] for i in route["sequence"]]
+        return route, pois
+
+    @staticmethod
+    def _assemble(narrative: str, pois: list[dict], route: dict | None, intent: dict) -> dict:
         return {
-            "tour_type": "general",
-            "categories": ["landmarks"],
-            "num_stops": 5,
+            "reply": narrative,
+            "tour": {
+                "stops": pois,
+                "route": route,
+                "category": intent.get("tour_type", "general"),
+            },
+            "map_data": {
+                "center": route.get("center") if route else None,
+                "waypoints": [p.get("location") for p in pois],
+            },
         }
 
+    @traced("narrative")
     async def _generate_narrative(
-        self, pois: list, route: dict | None, preferences: dict | None
+        self,
+        pois: list,
+        route: dict | None,
+        preferences: dict | None,
+        intent: dict | None = None,
     ) -> str:
-        """Generate a rich, engaging tour narrative from the POI list."""
+        """
+        Build the tour narrative from per-stop pieces, asking the LLM to
+        write only the stops that aren't already in the narrative cache.
+        """
+        bodies = await self._narrative_bodies(pois, preferences, intent or DEFAULT_INTENT)
+        return assemble(pois, bodies, route)
+
+    async def _narrative_bodies(
+        self, pois: list, preferences: dict | None, intent: dict
+    ) -> dict[int, str]:
+        """Per-stop narrative bodies (1-based); stops the LLM skipped are absent."""
+        keys, cached = self._cached_narratives(pois, intent, preferences)
+        bodies = dict(cached)
+        if len(cached) < len(pois):
+            self.narratives.llm_calls += 1
+            try:
+                response = await self.llm.ainvoke(
+                    self._narrative_messages(pois, cached, preferences, intent)
+                )
+            except Exception as e:
+                # Upstream down or circuit open: uncached stops fall back to
+                # their descriptions (see ``assemble``).
+                log.warning(f"⚠️  Narrative LLM error: {e}")
+                self.narratives.llm_failures += 1
+                return bodies
+            fresh = {
+                pos: body
+                for pos, body in parse_sections(response.content).items()
+                if 1 <= pos <= len(pois) and pos not in cached
+            }
+            self._store_narratives(keys, fresh)
+            bodies.update(fresh)
+        return bodies
+
+    def _cached_narratives(
+        self, pois: list, intent: dict, preferences: dict | None
+    ) -> tuple[list[str], dict[int, str]]:
+        """Cache keys for every stop and the bodies already cached (1-based)."""
+        style = str((preferences or {}).get("style") or "default")
+        tour_type = intent.get("tour_type", "general")
+        keys = [narrative_key(p, tour_type, style) for p in pois]
+        cached = {}
+        for position, key in enumerate(keys, start=1):
+            body = self.narrative_cache.get(key)
+            if body is not None:
+                cached[position] = body
+        self.narratives.stops_cached += len(cached)
+        self.narratives.stops_generated += len(pois) - len(cached)
+        return keys, cached
+
+    def _store_narratives(self, keys: list[str], fresh: dict[int, str]):
+        for position, body in fresh.items():
+            self.narrative_cache.set(keys[position - 1], body)
+
+    @staticmethod
+    def _narrative_messages(
+        pois: list, cached: dict[int, str], preferences: dict | None, intent: dict
+    ) -> list:
+        from langchain.schema import HumanMessage, SystemMessage
+
         stops_text = "\n".join(
-            f"- {p.get('name', 'Unknown')} ({p.get('category', '')})"
-            for p in pois
+            f"{i}. {p.get('name', 'Unknown')} ({p.get('category', '')})"
+            + (f" — {p['address']}" if p.get("address") else "")
+            for i, p in enumerate(pois, start=1)
+            if i not in cached
         )
-        messages = [
+        return [
             SystemMessage(content=SYSTEM_PROMPT),
             HumanMessage(
-                content=(
-                    f"Create an engaging tour narrative for these stops:\n"
-                    f"{stops_text}\n\n"
-                    f"User preferences: {preferences}"
+                content=STOP_NARRATIVE_PROMPT.format(
+                    stops=stops_text,
+                    tour_type=intent.get("tour_type", "general"),
+                    preferences=preferences,
                 )
             ),
         ]
-        response = await self.llm.ainvoke(messages)
-        return response.content
+
+    async def close(self):
+        """Release service-owned HTTP clients (no-op for a shared pool)."""
+        await self.arcgis.close()
+        await self.route_service.close()
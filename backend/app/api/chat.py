@@ -1,21 +1,40 @@
 """
 Chat endpoint  —  main conversational interface.
 Receives a user message → runs the LangChain agent → returns response.
+``/stream`` returns the same pipeline as Server-Sent Events.
 """
 
-from fastapi import APIRouter
+import json
+import logging
+from typing import Literal
+
+from fastapi import APIRouter, Depends, Request
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 
 from app.agents.tour_agent import TourAgent
+from app.config import settings
+from app.data.cache import request_key
+from app.services.geometry import compact_route, compact_tour
+from app.services.singleflight import SingleFlight
+
+log = logging.getLogger(__name__)
 
 router = APIRouter()
 
 
 # ── Request / Response Schemas ───────────────────────────────────────
+GeometryFormat = Literal["paths", "polyline", "raw"]
+
+
 class ChatRequest(BaseModel):
     message: str
     city: str = "nyc"
     preferences: dict | None = None
+    # Route geometry is simplified for this map zoom (default: the city's)
+    # and returned as coordinate ``paths``, encoded ``polyline``s or ``raw``.
+    zoom: float | None = None
+    geometry_format: GeometryFormat = "paths"
 
 
 class ChatResponse(BaseModel):
@@ -24,18 +43,84 @@ class ChatResponse(BaseModel):
     map_data: dict | None = None
 
 
+# ── Dependencies ─────────────────────────────────────────────────────
+def get_tour_agent(request: Request) -> TourAgent:
+    """Return the app-wide agent, building it on first use over the shared pool."""
+    state = request.app.state
+    agent = getattr(state, "tour_agent", None)
+    if agent is None:
+        agent = TourAgent(http=getattr(state, "http_pool", None))
+        state.tour_agent = agent
+    return agent
+
+
+def get_chat_flight(request: Request) -> SingleFlight:
+    """App-wide single-flight group that coalesces duplicate chat requests."""
+    state = request.app.state
+    flight = getattr(state, "chat_flight", None)
+    if flight is None:
+        flight = SingleFlight(settings.CHAT_RESULT_TTL_S, settings.CHAT_RESULT_CACHE_SIZE)
+        state.chat_flight = flight
+    return flight
+
+
 # ── Endpoint ─────────────────────────────────────────────────────────
 @router.post("/", response_model=ChatResponse)
-async def chat(req: ChatRequest):
+async def chat(
+    req: ChatRequest,
+    agent: TourAgent = Depends(get_tour_agent),
+    flight: SingleFlight = Depends(get_chat_flight),
+):
     """Process a user chat message through the tour-generation agent."""
-    agent = TourAgent()
-    result = await agent.run(
-        message=req.message,
-        city=req.city,
-        preferences=req.preferences,
+    result = await flight.do(
+        request_key(req.message, req.city, req.preferences),
+        lambda: agent.run(
+            message=req.message,
+            city=req.city,
+            preferences=req.preferences,
+        ),
     )
     return ChatResponse(
         reply=result.get("reply", ""),
-        tour=result.get("tour"),
+        tour=compact_tour(result.get("tour"), req.city, req.zoom, req.geometry_format),
         map_data=result.get("map_data"),
     )
+
+
+@router.post("/stream")
+async def chat_stream(req: ChatRequest, agent: TourAgent = Depends(get_tour_agent)):
+    """
+    Stream the tour as Server-Sent Events: ``intent``, ``pois`` and
+    ``route`` as each stage finishes, then narrative ``token``s and a
+    final ``done`` carrying the full ChatResponse payload.
+    """
+
+    async def events():
+        try:
+            async for event, data in agent.run_stream(
+                message=req.message,
+                city=req.city,
+                preferences=req.preferences,
+            ):
+                if event == "route":
+                    data = {**data, "route": compact_route(
+                        data["route"], req.city, req.zoom, req.geometry_format
+                    )}
+                elif event == "done":
+                    data = {**data, "tour": compact_tour(
+                        data["tour"], req.city, req.zoom, req.geometry_format
+                    )}
+                yield _sse(event, data)
+        except Exception as e:
+            log.warning(f"⚠️  Chat stream error: {e}")
+            yield _sse("error", {"detail": str(e)})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
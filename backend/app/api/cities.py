@@ -1,24 +1,25 @@
 """
 Cities endpoint  —  list supported cities & their metadata.
+Responses are served from the pre-serialised catalogue.
 """
 
-from fastapi import APIRouter
+from fastapi import APIRouter, Request
 
-from app.data.cities import SUPPORTED_CITIES
+from app.api.responses import prepared_json_response
+from app.data.catalogue import get_catalogue
 
 router = APIRouter()
 
 
 @router.get("/")
-async def list_cities():
+async def list_cities(request: Request):
     """Return all supported cities."""
-    return SUPPORTED_CITIES
+    return prepared_json_response(request, get_catalogue().city_list)
 
 
 @router.get("/{city_id}")
-async def get_city(city_id: str):
+async def get_city(request: Request, city_id: str):
     """Return metadata for a specific city."""
-    city = SUPPORTED_CITIES.get(city_id)
-    if city:
-        return city
-    return {"error": "City not found"}
+    catalogue = get_catalogue()
+    prepared = catalogue.city_details.get(city_id, catalogue.city_not_found)
+    return prepared_json_response(request, prepared)
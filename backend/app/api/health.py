@@ -1,12 +1,37 @@
 """
-Health-check endpoint.
+Health-check and metrics endpoints.
 """
 
-from fastapi import APIRouter
+from fastapi import APIRouter, Request
+from fastapi.responses import PlainTextResponse
+
+from app.services.telemetry import REGISTRY
 
 router = APIRouter()
 
 
 @router.get("/health")
-async def health_check():
-    return {"status": "healthy", "service": "GeoExplore-AI"}
+async def health_check(request: Request):
+    body = {"status": "healthy", "service": "GeoExplore-AI"}
+    pool = getattr(request.app.state, "http_pool", None)
+    if pool is not None:
+        body["http_pool"] = pool.stats()
+    flight = getattr(request.app.state, "chat_flight", None)
+    if flight is not None:
+        body["chat_singleflight"] = flight.stats()
+    runner = getattr(request.app.state, "batch_runner", None)
+    if runner is not None:
+        body["batch"] = runner.stats()
+    tours = getattr(request.app.state, "template_tours", None)
+    if tours is not None:
+        body["template_tours"] = tours.stats()
+    agent = getattr(request.app.state, "tour_agent", None)
+    if agent is not None:
+        body.update(agent.stats())
+    return body
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Prometheus scrape endpoint (stage, upstream, LLM token and API metrics)."""
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
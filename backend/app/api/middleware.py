@@ -0,0 +1,136 @@
+"""
+ASGI middleware  —  request IDs and inbound latency metrics, and
+response compression.
+"""
+
+import gzip
+import time
+import uuid
+
+from starlette.datastructures import MutableHeaders
+
+from app.api.responses import accepts_encoding
+from app.config import settings
+from app.services.telemetry import HTTP_REQUEST_SECONDS, request_id_var
+
+try:
+    import brotli
+except ImportError:  # optional; gzip only without it
+    brotli = None
+
+REQUEST_ID_HEADER = b"x-request-id"
+
+# Only whole (non-streamed) bodies of these types are compressed.
+COMPRESSIBLE_TYPES = ("application/json", "text/plain")
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5  # 11 is too slow for per-request bodies
+
+
+class RequestContextMiddleware:
+    """
+    Pure ASGI middleware (no per-request task or body buffering): adopts
+    the caller's ``X-Request-ID`` or mints one, exposes it to logs via
+    ``request_id_var``, echoes it on the response and times the request.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_id = (next(
+            (v.decode("latin-1") for k, v in scope["headers"] if k == REQUEST_ID_HEADER),
+            None,
+        ) or uuid.uuid4().hex)[:128]
+        token = request_id_var.set(request_id)
+        status = 500
+        started = time.perf_counter()
+
+        async def send_with_id(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                message["headers"] = [
+                    *message.get("headers", []),
+                    (REQUEST_ID_HEADER, request_id.encode("latin-1")),
+                ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            route = scope.get("route")
+            HTTP_REQUEST_SECONDS.observe(
+                time.perf_counter() - started,
+                scope["method"],
+                getattr(route, "path", "unmatched"),
+                str(status),
+            )
+            request_id_var.reset(token)
+
+
+class CompressionMiddleware:
+    """
+    Brotli (when installed and accepted) or gzip for whole response
+    bodies of at least ``COMPRESS_MIN_BYTES``.  Streamed responses (SSE,
+    NDJSON) pass straight through so every event is flushed as it is
+    sent, as do bodies the app already encoded (pre-gzipped catalogue).
+    """
+
+    def __init__(self, app, minimum_size: int | None = None):
+        self.app = app
+        self.minimum_size = minimum_size if minimum_size is not None else settings.COMPRESS_MIN_BYTES
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        accept = next(
+            (v.decode("latin-1") for k, v in scope["headers"] if k == b"accept-encoding"), ""
+        )
+        if brotli is not None and accepts_encoding(accept, "br"):
+            coding = "br"
+        elif accepts_encoding(accept, "gzip"):
+            coding = "gzip"
+        else:
+            await self.app(scope, receive, send)
+            return
+
+        start = None
+
+        async def send_compressed(message):
+            nonlocal start
+            if message["type"] == "http.response.start":
+                start = message  # held until we've seen the body
+                return
+            if start is None or message["type"] != "http.response.body":
+                await send(message)
+                return
+            held, start = start, None
+            body = message.get("body", b"")
+            headers = MutableHeaders(raw=held["headers"])
+            if not message.get("more_body") and self._compressible(headers, body):
+                packed = (
+                    brotli.compress(body, quality=BROTLI_QUALITY)
+                    if coding == "br"
+                    else gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+                )
+                if len(packed) < len(body):
+                    body = packed
+                    headers["Content-Encoding"] = coding
+                    headers["Content-Length"] = str(len(body))
+                    headers.add_vary_header("Accept-Encoding")
+            await send(held)
+            await send({**message, "body": body})
+
+        await self.app(scope, receive, send_compressed)
+
+    def _compressible(self, headers: MutableHeaders, body: bytes) -> bool:
+        return (
+            len(body) >= self.minimum_size
+            and "content-encoding" not in headers
+            and headers.get("content-type", "").startswith(COMPRESSIBLE_TYPES)
+        )
@@ -0,0 +1,51 @@
+"""
+Response helpers for pre-serialised payloads: strong ETags,
+``If-None-Match`` → 304, and gzip when the client accepts it.
+"""
+
+from fastapi import Request, Response
+
+from app.config import settings
+from app.data.catalogue import PreparedJSON
+
+
+def prepared_json_response(request: Request, prepared: PreparedJSON) -> Response:
+    """Serve *prepared* as-is, short-circuiting to 304 when the client is current."""
+    use_gzip = prepared.gzip_body is not None and _accepts_gzip(request)
+    etag = prepared.gzip_etag if use_gzip else prepared.etag
+    headers = {
+        "ETag": etag,
+        "Cache-Control": f"public, max-age={settings.CATALOGUE_MAX_AGE_S}",
+        "Vary": "Accept-Encoding",
+    }
+
+    if _etag_matches(request.headers.get("if-none-match"), (prepared.etag, prepared.gzip_etag)):
+        return Response(status_code=304, headers=headers)
+
+    if use_gzip:
+        headers["Content-Encoding"] = "gzip"
+        return Response(prepared.gzip_body, media_type="application/json", headers=headers)
+    return Response(prepared.body, media_type="application/json", headers=headers)
+
+
+def _accepts_gzip(request: Request) -> bool:
+    return accepts_encoding(request.headers.get("accept-encoding", ""), "gzip")
+
+
+def accepts_encoding(header: str, coding: str) -> bool:
+    """Whether an ``Accept-Encoding`` value allows *coding* (explicitly or via ``*``)."""
+    for part in header.split(","):
+        name, _, params = part.strip().partition(";")
+        if name.strip().lower() in (coding, "*"):
+            return params.replace(" ", "") not in ("q=0", "q=0.0", "q=0.00", "q=0.000")
+    return False
+
+
+def _etag_matches(header: str | None, etags: tuple[str | None, ...]) -> bool:
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    # If-None-Match uses weak comparison, so ignore any W/ prefix.
+    candidates = {tag.strip().removeprefix("W/") for tag in header.split(",")}
+    return any(tag in candidates for tag in etags if tag)
@@ -1,11 +1,22 @@
 """
 Tours endpoint  —  CRUD-style access to pre-built & generated tours.
+Template responses are served from the pre-serialised catalogue.
+``/batch`` generates many tours as one job, streamed back as NDJSON.
 """
 
-from fastapi import APIRouter
-from pydantic import BaseModel
+import json
 
-from app.services.tour_templates import TOUR_TEMPLATES
+from fastapi import APIRouter, Depends, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import BaseModel, Field
+
+from app.agents.tour_agent import TourAgent
+from app.api.chat import GeometryFormat, get_chat_flight, get_tour_agent
+from app.api.responses import prepared_json_response
+from app.config import settings
+from app.data.catalogue import get_catalogue
+from app.services.batch import BatchJob, BatchRunner
+from app.services.singleflight import SingleFlight
 
 router = APIRouter()
 
@@ -19,19 +30,99 @@ class TourSummary(BaseModel):
     city: str
 
 
+class BatchSpec(BaseModel):
+    message: str
+    city: str = "nyc"
+    preferences: dict | None = None
+    zoom: float | None = None
+    geometry_format: GeometryFormat = "paths"
+    id: str | None = None  # caller's label, echoed on the result line
+
+
+class BatchRequest(BaseModel):
+    specs: list[BatchSpec] = Field(min_length=1, max_length=settings.BATCH_MAX_SPECS)
+    stream: bool = True
+
+
+def get_batch_runner(request: Request) -> BatchRunner:
+    """App-wide batch runner (one concurrency limit for every job)."""
+    state = request.app.state
+    runner = getattr(state, "batch_runner", None)
+    if runner is None:
+        runner = BatchRunner()
+        state.batch_runner = runner
+    return runner
+
+
 @router.get("/templates", response_model=list[TourSummary])
-async def list_templates(city: str | None = None):
-    """Return available tour templates, optionally filtered by city."""
-    templates = TOUR_TEMPLATES
-    if city:
-        templates = [t for t in templates if t["city"] == city]
-    return templates
+async def list_templates(request: Request, city: str | None = None, category: str | None = None):
+    """Return available tour templates, optionally filtered by city and/or category."""
+    return prepared_json_response(
+        request, get_catalogue().template_summaries(city=city, category=category)
+    )
 
 
 @router.get("/templates/{tour_id}")
-async def get_template(tour_id: str):
+async def get_template(request: Request, tour_id: str):
     """Return full detail for a single tour template."""
-    for t in TOUR_TEMPLATES:
-        if t["id"] == tour_id:
-            return t
-    return {"error": "Tour not found"}
+    catalogue = get_catalogue()
+    prepared = catalogue.template_details.get(tour_id, catalogue.template_not_found)
+    return prepared_json_response(request, prepared)
+
+
+@router.get("/templates/{tour_id}/tour")
+async def get_template_tour(request: Request, tour_id: str):
+    """Return the pre-built tour (stops, narrative, route totals) for a template."""
+    catalogue = get_catalogue()
+    if tour_id not in catalogue.template_details:
+        return prepared_json_response(request, catalogue.template_not_found)
+    materialiser = getattr(request.app.state, "template_tours", None)
+    prepared = materialiser.get(tour_id) if materialiser is not None else None
+    if prepared is None:
+        return JSONResponse(
+            {"error": "Tour not built yet"}, status_code=503, headers={"Retry-After": "60"}
+        )
+    return prepared_json_response(request, prepared)
+
+
+@router.post("/batch")
+async def create_batch(
+    req: BatchRequest,
+    agent: TourAgent = Depends(get_tour_agent),
+    flight: SingleFlight = Depends(get_chat_flight),
+    runner: BatchRunner = Depends(get_batch_runner),
+):
+    """
+    Generate a tour for every spec.  Streams NDJSON: a ``job`` line, one
+    ``result`` line per spec as it finishes (in completion order, with
+    its ``index``), then ``done``.  With ``"stream": false`` returns the
+    job id at once (202) for polling ``GET /batch/{job_id}``.
+    """
+    job = runner.submit([spec.model_dump() for spec in req.specs], agent, flight)
+    headers = {"X-Batch-Job-ID": job.id, "Location": f"/api/tours/batch/{job.id}"}
+    if not req.stream:
+        return JSONResponse(job.summary(), status_code=202, headers=headers)
+    return StreamingResponse(
+        _ndjson(job), media_type="application/x-ndjson", headers=headers
+    )
+
+
+@router.get("/batch/{job_id}")
+async def get_batch(job_id: str, offset: int = 0, runner: BatchRunner = Depends(get_batch_runner)):
+    """Job progress plus results from *offset* (in completion order) onwards."""
+    job = runner.get(job_id)
+    if job is None:
+        return JSONResponse({"error": "Batch job not found"}, status_code=404)
+    results = job.results[max(0, offset):]
+    return {**job.summary(), "results": results, "next_offset": max(0, offset) + len(results)}
+
+
+async def _ndjson(job: BatchJob):
+    yield _line({"type": "job", **job.summary()})
+    async for result in job.follow():
+        yield _line({"type": "result", **result})
+    yield _line({"type": "done", **job.summary()})
+
+
+def _line(data: dict) -> str:
+    return json.dumps(data) + "\n"
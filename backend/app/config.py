@@ -31,5 +31,100 @@ class Settings(BaseSettings):
     # Database
     DATABASE_URL: str = "sqlite:///./geoexplore.db"
 
+    # Shared cache tier behind every in-process cache (see app.data.cache)
+    CACHE_URL: str = ""  # empty → DATABASE_URL; one file shared by all workers
+    CACHE_L2_MAX_ENTRIES: int = 100_000  # per namespace; 0 = unbounded
+    CACHE_L1_TTL_S: float = 300  # cap on L1 lifetime in front of the shared tier
+
+    # Outbound HTTP (shared per-host connection pool)
+    HTTP_TIMEOUT_S: float = 30  # socket connect/read/write timeouts
+    HTTP_ATTEMPT_TIMEOUT_S: float = 8  # one try, connect → response headers
+    HTTP_DEADLINE_S: float = 20  # every try plus backoff, per request
+    OPENAI_TIMEOUT_S: float = 60  # completions: one try (timeouts aren't resent)
+    HTTP_MAX_CONNECTIONS_PER_HOST: int = 20
+    HTTP_MAX_KEEPALIVE_PER_HOST: int = 10
+    HTTP_KEEPALIVE_EXPIRY_S: float = 30
+    HTTP2_ENABLED: bool = False
+
+    # Upstream resilience (rate limits sized to quota, retries, circuit breaker)
+    ARCGIS_RATE_PER_S: float = 20
+    ARCGIS_BURST: int = 40
+    OPENAI_RATE_PER_S: float = 5
+    OPENAI_BURST: int = 10
+    RETRY_MAX_ATTEMPTS: int = 3
+    RETRY_BASE_DELAY_S: float = 0.25
+    RETRY_MAX_DELAY_S: float = 4
+    BREAKER_FAILURE_THRESHOLD: int = 5
+    BREAKER_RESET_TIMEOUT_S: float = 30
+
+    # Geocode cache (in-memory LRU in front of the DATABASE_URL SQLite tier)
+    GEOCODE_CACHE_SIZE: int = 4096
+    GEOCODE_CACHE_TTL_S: float = 30 * 24 * 3600
+    GEOCODE_BATCH_SIZE: int = 100
+    GEOCODE_CONCURRENCY: int = 8
+
+    # Feature-service paging (ArcGISService.iter_features)
+    FEATURE_PAGE_SIZE: int = 1000
+    FEATURE_QUERY_CONCURRENCY: int = 4
+
+    # POI catalogue: offline ingestion from a Feature Service into a local store
+    POI_STORE_URL: str = ""  # empty → DATABASE_URL
+    POI_FEATURE_SERVICE_URL: str = ""  # layer queried by ingestion and live search
+    POI_CATEGORY_FIELD: str = "Category"
+    POI_NAME_FIELD: str = "Name"
+    POI_ADDRESS_FIELD: str = "Address"
+    POI_DESCRIPTION_FIELD: str = "Description"
+    POI_EDIT_DATE_FIELD: str = "EditDate"  # empty → OBJECTID watermark
+    POI_REFRESH_INTERVAL_S: float = 0  # background refresh; 0 disables
+
+    # POI search fan-out across categories
+    POI_SEARCH_CONCURRENCY: int = 4
+    POI_CATEGORY_TIMEOUT_S: float = 5
+    POI_LIVE_RESULT_TTL_S: float = 60  # live (non-stored) category results
+
+    # Agent: prefetch POIs/route for the default intent while parsing
+    SPECULATIVE_PREFETCH: bool = True
+
+    # Agent: rule-based intent fast path (LLM only below this confidence)
+    INTENT_RULES_MIN_CONFIDENCE: float = 0.6
+    INTENT_CACHE_SIZE: int = 2048
+    INTENT_CACHE_TTL_S: float = 24 * 3600
+
+    # Agent: per-stop narrative cache keyed on (POI, tour_type, style)
+    NARRATIVE_CACHE_SIZE: int = 4096
+    NARRATIVE_CACHE_TTL_S: float = 30 * 24 * 3600
+
+    # Chat: coalesce identical concurrent requests, then cache briefly
+    CHAT_RESULT_TTL_S: float = 30
+    CHAT_RESULT_CACHE_SIZE: int = 512
+
+    # Batch tour generation (POST /api/tours/batch)
+    BATCH_CONCURRENCY: int = 8  # specs in flight at once, across all jobs
+    BATCH_MAX_SPECS: int = 1000
+    BATCH_MAX_JOBS: int = 100  # finished jobs kept for polling
+    BATCH_JOB_TTL_S: float = 3600
+
+    # Static catalogue responses (templates, cities)
+    CATALOGUE_MAX_AGE_S: int = 300
+
+    # Response compression (gzip, or brotli when installed)
+    COMPRESS_MIN_BYTES: int = 1024
+
+    # Pre-built template tours (GET /api/tours/templates/{id}/tour)
+    TEMPLATE_TOURS_REFRESH_INTERVAL_S: float = 6 * 3600  # 0 disables
+    TEMPLATE_TOURS_CONCURRENCY: int = 2
+    TEMPLATE_TOURS_CACHE_SIZE: int = 256
+
+    # Per-city memory-mapped POI distance matrices (see DistanceMatrixCache)
+    DISTANCE_MATRIX_DIR: str = "./.cache/distance"
+    DISTANCE_MATRIX_MAX_POIS: int = 10_000  # n² float32 → 400 MB at the cap
+
+    # Routing: "auto" | "esri" | "local" (see RouteService.optimise)
+    ROUTE_MODE: str = "auto"
+    ROUTE_LOCAL_MAX_MILES: float = 3.0
+    ROUTE_CACHE_SIZE: int = 1024
+    ROUTE_CACHE_TTL_S: float = 7 * 24 * 3600
+    ROUTE_SIMPLIFY_PX: float = 1.0  # Douglas–Peucker tolerance, in pixels at the map zoom
+
 
 settings = Settings()
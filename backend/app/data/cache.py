@@ -0,0 +1,420 @@
+"""
+Caches
+======
+Small, dependency-free caching primitives shared by the services:
+
+  • ``LRUCache``     — in-process, size-bounded, per-entry TTL
+  • ``SQLiteCache``  — persistent tier in one SQLite file (WAL mode), so
+                       every worker process on a host shares it
+  • ``TieredCache``  — L1 (memory) in front of an optional shared L2
+
+The L2 is chosen by the scheme of ``CACHE_URL`` (default: ``DATABASE_URL``)
+from ``CACHE_BACKENDS``; other stores plug in by registering a factory
+there.  With several workers, one worker's geocode, route or LLM result
+lands in the shared tier and every other worker's next miss reads it from
+there.  L1 entries in front of a shared tier live at most
+``CACHE_L1_TTL_S``, which bounds how long a worker can keep serving an
+entry another worker has since replaced or invalidated.
+
+Values must be JSON-serialisable so they survive the persistent tier.
+``None`` is never cached; a ``get`` returning ``None`` means "miss".
+"""
+
+import json
+import logging
+import math
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable
+
+from app.config import settings
+
+log = logging.getLogger(__name__)
+
+
+def normalise_key(text: str) -> str:
+    """Canonical cache key: NFKC, case-folded, commas/whitespace collapsed."""
+    text = unicodedata.normalize("NFKC", text).casefold()
+    return re.sub(r"[\s,]+", " ", text).strip()
+
+
+def request_key(message: str, city: str, preferences: dict | None) -> str:
+    """Key for a chat request: city, normalised message and sorted preferences."""
+    prefs = json.dumps(preferences or {}, sort_keys=True, default=str)
+    return f"{city}|{normalise_key(message)}|{prefs}"
+
+
+def sqlite_path(database_url: str) -> str | None:
+    """Map a ``sqlite:///path`` URL to a filesystem path (``None`` if not SQLite)."""
+    if not database_url.startswith("sqlite:"):
+        return None
+    path = database_url.partition("://")[2].lstrip("/")
+    if database_url.startswith("sqlite:////"):
+        path = "/" + path
+    return path or ":memory:"
+
+
+# ── L1: in-process LRU ───────────────────────────────────────────────
+
+
+class LRUCache:
+    """Ordered-dict LRU with optional TTL and hit/miss/eviction counters."""
+
+    def __init__(self, maxsize: int = 1024, ttl: float | None = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: OrderedDict[str, tuple[float | None, Any]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: str) -> Any | None:
+        entry = self._data.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        expires_at, value = entry
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self._data[key]
+            self.expirations += 1
+            self.misses += 1
+            return None
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: str, value: Any, ttl: float | None = None):
+        if value is None:
+            return
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = time.monotonic() + ttl if ttl else None
+        self._data[key] = (expires_at, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def delete(self, key: str):
+        self._data.pop(key, None)
+
+    def clear(self):
+        self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+
+# ── L2: shared SQLite ────────────────────────────────────────────────
+
+# How long background work (schema setup, trims, deferred deletes) waits
+# for another process's write lock before failing.
+SQLITE_BUSY_TIMEOUT_S = 5.0
+# The same wait on the request path: a lookup or write that can't get the
+# lock this quickly is treated as a miss / skipped instead of stalling the
+# event loop behind another worker.
+SQLITE_REQUEST_BUSY_TIMEOUT_MS = 50
+
+# One thread per process runs every namespace's background work.
+_trim_executor: ThreadPoolExecutor | None = None
+
+
+def _trimmer() -> ThreadPoolExecutor:
+    global _trim_executor
+    if _trim_executor is None:
+        _trim_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="cache-trim")
+    return _trim_executor
+
+
+class SQLiteCache:
+    """
+    Namespaced key → JSON store in a single ``cache_entries`` table.
+
+    The file is opened in WAL mode, so any number of processes can read
+    while one writes.  With *maxsize*, each namespace is trimmed back to
+    that many entries every few writes: expired rows go first, then the
+    least recently written.  Trims run on a background thread with their
+    own connection and find the cutoff through indexes, not a sort.
+
+    Calls made on the request path wait at most
+    ``SQLITE_REQUEST_BUSY_TIMEOUT_MS`` for another worker's write lock:
+    a ``get`` then misses and a ``set`` is dropped (both counted as
+    ``busy``), while ``delete`` / ``clear`` are retried in the background.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        namespace: str,
+        ttl: float | None = None,
+        maxsize: int | None = None,
+    ):
+        self.path = path
+        self.namespace = namespace
+        self.ttl = ttl
+        self.maxsize = maxsize
+        # Trim every ~10% of maxsize writes (at most every 64), so the
+        # overshoot between trims stays small.
+        self._trim_every = max(1, min(64, maxsize // 10)) if maxsize else None
+        self._writes = 0
+        self._trim_pending = False
+        self._background_future: Future | None = None
+        self._background_conn: sqlite3.Connection | None = None
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            path, timeout=SQLITE_BUSY_TIMEOUT_S, check_same_thread=False, isolation_level=None
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(
+            "CREATE TABLE IF NOT EXISTS cache_entries ("
+            " namespace TEXT NOT NULL,"
+            " key TEXT NOT NULL,"
+            " value TEXT NOT NULL,"
+            " expires_at REAL,"
+            " PRIMARY KEY (namespace, key));"
+            "CREATE INDEX IF NOT EXISTS cache_entries_expiry"
+            " ON cache_entries (namespace, expires_at);"
+            # Index entries carry the rowid, so this one is in write order
+            # per namespace — trimming walks it instead of sorting.
+            "CREATE INDEX IF NOT EXISTS cache_entries_written"
+            " ON cache_entries (namespace);"
+        )
+        self._conn.execute(f"PRAGMA busy_timeout = {SQLITE_REQUEST_BUSY_TIMEOUT_MS}")
+        self.hits = 0
+        self.misses = 0
+        self.expirations = 0
+        self.evictions = 0
+        self.busy = 0
+
+    def get(self, key: str) -> Any | None:
+        with self._lock:
+            try:
+                row = self._conn.execute(
+                    "SELECT value, expires_at FROM cache_entries WHERE namespace = ? AND key = ?",
+                    (self.namespace, key),
+                ).fetchone()
+            except sqlite3.OperationalError as e:
+                if not _is_busy(e):
+                    raise
+                self.busy += 1
+                self.misses += 1
+                return None
+            if row is None:
+                self.misses += 1
+                return None
+            value, expires_at = row
+            if expires_at is not None and expires_at <= time.time():
+                try:
+                    self._conn.execute(
+                        "DELETE FROM cache_entries WHERE namespace = ? AND key = ?",
+                        (self.namespace, key),
+                    )
+                except sqlite3.OperationalError as e:
+                    if not _is_busy(e):
+                        raise  # otherwise the next trim removes it
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self.hits += 1
+        return json.loads(value)
+
+    def set(self, key: str, value: Any, ttl: float | None = None):
+        if value is None:
+            return
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = time.time() + ttl if ttl else None
+        with self._lock:
+            try:
+                # REPLACE re-inserts the row, so rowid order is write order.
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO cache_entries (namespace, key, value, expires_at)"
+                    " VALUES (?, ?, ?, ?)",
+                    (self.namespace, key, json.dumps(value), expires_at),
+                )
+            except sqlite3.OperationalError as e:
+                if not _is_busy(e):
+                    raise
+                self.busy += 1  # a cache write is optional; the value is still in L1
+                return
+            self._writes += 1
+            if self._trim_every and self._writes % self._trim_every == 0:
+                if self.path == ":memory:":
+                    # Private to this connection (tests): small, trim in place.
+                    self._trim(self._conn)
+                elif not self._trim_pending:
+                    self._trim_pending = True
+                    self._background_future = _trimmer().submit(self._trim_in_background)
+
+    def _trim_in_background(self):
+        # Writes from here on schedule another trim.
+        self._trim_pending = False
+        try:
+            self._trim(self._background())
+        except sqlite3.Error as e:
+            log.warning(f"⚠️  Cache trim for {self.namespace!r} failed: {e}")
+
+    def _background(self) -> sqlite3.Connection:
+        """This cache's connection for the background thread (patient with locks)."""
+        if self._background_conn is None:
+            self._background_conn = sqlite3.connect(
+                self.path, timeout=SQLITE_BUSY_TIMEOUT_S, check_same_thread=False, isolation_level=None
+            )
+        return self._background_conn
+
+    def _delete_where(self, sql: str, params: tuple):
+        """Run a DELETE now, or — if another worker holds the lock — in the background."""
+        with self._lock:
+            try:
+                self._conn.execute(sql, params)
+                return
+            except sqlite3.OperationalError as e:
+                if not _is_busy(e) or self.path == ":memory:":
+                    raise
+                self.busy += 1
+
+        def retry():
+            try:
+                self._background().execute(sql, params)
+            except sqlite3.Error as e:
+                log.warning(f"⚠️  Cache delete in {self.namespace!r} failed: {e}")
+
+        self._background_future = _trimmer().submit(retry)
+
+    def _trim(self, conn: sqlite3.Connection):
+        """Drop expired rows, then the oldest-written beyond ``maxsize``."""
+        self.expirations += conn.execute(
+            "DELETE FROM cache_entries WHERE namespace = ? AND expires_at <= ?",
+            (self.namespace, time.time()),
+        ).rowcount
+        cutoff = conn.execute(
+            "SELECT rowid FROM cache_entries WHERE namespace = ?"
+            " ORDER BY rowid DESC LIMIT 1 OFFSET ?",
+            (self.namespace, self.maxsize),
+        ).fetchone()
+        if cutoff is not None:
+            self.evictions += conn.execute(
+                "DELETE FROM cache_entries WHERE namespace = ? AND rowid <= ?",
+                (self.namespace, cutoff[0]),
+            ).rowcount
+
+    def delete(self, key: str):
+        self._delete_where(
+            "DELETE FROM cache_entries WHERE namespace = ? AND key = ?", (self.namespace, key)
+        )
+
+    def clear(self):
+        self._delete_where("DELETE FROM cache_entries WHERE namespace = ?", (self.namespace,))
+
+    def __len__(self) -> int:
+        with self._lock:
+            (count,) = self._conn.execute(
+                "SELECT COUNT(*) FROM cache_entries WHERE namespace = ?", (self.namespace,)
+            ).fetchone()
+        return count
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "busy": self.busy,
+        }
+
+    def close(self):
+        if self._background_future is not None:
+            self._background_future.result()
+        if self._background_conn is not None:
+            self._background_conn.close()
+        self._conn.close()
+
+
+def _is_busy(error: sqlite3.OperationalError) -> bool:
+    """Whether *error* is SQLite giving up on another connection's lock."""
+    message = str(error)
+    return "locked" in message or "busy" in message
+
+
+# ── Two-tier facade ──────────────────────────────────────────────────
+
+
+class TieredCache:
+    """Read-through L1 → L2; L2 hits are promoted into L1."""
+
+    def __init__(self, l1: LRUCache, l2: Any | None = None):
+        self.l1 = l1
+        self.l2 = l2
+
+    def get(self, key: str) -> Any | None:
+        value = self.l1.get(key)
+        if value is not None or self.l2 is None:
+            return value
+        value = self.l2.get(key)
+        if value is not None:
+            self.l1.set(key, value)
+        return value
+
+    def set(self, key: str, value: Any, ttl: float | None = None):
+        self.l1.set(key, value, ttl)
+        if self.l2 is not None:
+            self.l2.set(key, value, ttl)
+
+    def invalidate(self, key: str | None = None):
+        """Drop one key — or everything when *key* is ``None`` — from both tiers."""
+        for tier in (self.l1, self.l2):
+            if tier is None:
+                continue
+            if key is None:
+                tier.clear()
+            else:
+                tier.delete(key)
+
+    def stats(self) -> dict:
+        return {
+            "l1": self.l1.stats(),
+            "l2": self.l2.stats() if self.l2 is not None else None,
+        }
+
+
+# URL scheme → factory ``(url, namespace, ttl, maxsize)`` for the shared
+# tier.  A backend needs ``get`` / ``set`` / ``delete`` / ``clear`` /
+# ``stats`` with ``SQLiteCache``'s semantics.
+CACHE_BACKENDS: dict[str, Callable[[str, str, float | None, int | None], Any]] = {
+    "sqlite": lambda url, namespace, ttl, maxsize: SQLiteCache(
+        sqlite_path(url), namespace, ttl, maxsize
+    ),
+}
+
+
+def build_cache(namespace: str, maxsize: int, ttl: float | None) -> TieredCache:
+    """
+    LRU + the shared tier for *namespace* at ``CACHE_URL`` (or
+    ``DATABASE_URL``), when ``CACHE_BACKENDS`` knows its scheme.
+    """
+    url = settings.CACHE_URL or settings.DATABASE_URL
+    factory = CACHE_BACKENDS.get(url.partition(":")[0])
+    if factory is None:
+        return TieredCache(LRUCache(maxsize, ttl))
+    l2 = factory(url, namespace, ttl, settings.CACHE_L2_MAX_ENTRIES or None)
+    l1_ttl = ttl
+    if settings.CACHE_L1_TTL_S:
+        l1_ttl = min(ttl or math.inf, settings.CACHE_L1_TTL_S)
+    return TieredCache(LRUCache(maxsize, l1_ttl), l2)
@@ -0,0 +1,108 @@
+"""
+Catalogue
+=========
+Indexed, pre-serialised views of the static catalogue (tour templates
+and supported cities).
+
+Everything is built once — at startup, or on first use — so the
+catalogue endpoints just look up ready-made JSON/gzip bytes and ETags
+instead of scanning and re-serialising on every request.
+"""
+
+import gzip
+import hashlib
+import json
+
+from app.data.cities import SUPPORTED_CITIES
+from app.services.tour_templates import TOUR_TEMPLATES
+
+# Fields exposed by ``GET /api/tours/templates`` (matches ``TourSummary``).
+SUMMARY_FIELDS = ("id", "name", "category", "description", "estimated_duration_min", "city")
+
+# Bodies smaller than this aren't worth compressing.
+GZIP_MIN_BYTES = 256
+
+
+class PreparedJSON:
+    """One response body, serialised and (optionally) gzipped up front."""
+
+    __slots__ = ("body", "gzip_body", "etag", "gzip_etag")
+
+    def __init__(self, payload):
+        self.body = json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode()
+        digest = hashlib.sha256(self.body).hexdigest()[:32]
+        self.etag = f'"{digest}"'
+        compressed = gzip.compress(self.body, compresslevel=9, mtime=0)
+        if len(self.body) >= GZIP_MIN_BYTES and len(compressed) < len(self.body):
+            self.gzip_body = compressed
+            self.gzip_etag = f'"{digest}-gz"'
+        else:
+            self.gzip_body = None
+            self.gzip_etag = None
+
+
+class Catalogue:
+    """id / city / category indexes plus prepared responses for each view."""
+
+    def __init__(self, templates: list[dict], cities: dict[str, dict]):
+        self.templates_by_id: dict[str, dict] = {}
+        self.templates_by_city: dict[str, list[dict]] = {}
+        self.templates_by_category: dict[str, list[dict]] = {}
+        for t in templates:
+            self.templates_by_id[t["id"]] = t
+            self.templates_by_city.setdefault(t["city"], []).append(t)
+            self.templates_by_category.setdefault(t["category"], []).append(t)
+        self.cities = cities
+
+        self._summaries: dict[tuple[str | None, str | None], PreparedJSON] = {}
+        self.template_details = {tid: PreparedJSON(t) for tid, t in self.templates_by_id.items()}
+        self.city_list = PreparedJSON(cities)
+        self.city_details = {cid: PreparedJSON(c) for cid, c in cities.items()}
+        self.template_not_found = PreparedJSON({"error": "Tour not found"})
+        self.city_not_found = PreparedJSON({"error": "City not found"})
+        # Warm every single-filter view; combined filters are prepared on demand.
+        self.template_summaries()
+        for city in self.templates_by_city:
+            self.template_summaries(city=city)
+        for category in self.templates_by_category:
+            self.template_summaries(category=category)
+
+    def template_summaries(self, city: str | None = None, category: str | None = None) -> PreparedJSON:
+        """Summaries for the templates matching the (optional) filters."""
+        key = (city, category)
+        prepared = self._summaries.get(key)
+        if prepared is None:
+            if city is not None:
+                templates = self.templates_by_city.get(city, [])
+                if category is not None:
+                    templates = [t for t in templates if t["category"] == category]
+            elif category is not None:
+                templates = self.templates_by_category.get(category, [])
+            else:
+                templates = list(self.templates_by_id.values())
+            prepared = PreparedJSON([{f: t[f] for f in SUMMARY_FIELDS} for t in templates])
+            if (city is None or city in self.templates_by_city) and (
+                category is None or category in self.templates_by_category
+            ):
+                # Only memoise known filters so junk query strings can't
+                # grow the table without bound.
+                self._summaries[key] = prepared
+        return prepared
+
+
+_catalogue: Catalogue | None = None
+
+
+def get_catalogue() -> Catalogue:
+    """The process-wide catalogue, built on first use."""
+    global _catalogue
+    if _catalogue is None:
+        _catalogue = Catalogue(TOUR_TEMPLATES, SUPPORTED_CITIES)
+    return _catalogue
+
+
+def rebuild_catalogue() -> Catalogue:
+    """Rebuild indexes and prepared bodies (e.g. after templates change)."""
+    global _catalogue
+    _catalogue = Catalogue(TOUR_TEMPLATES, SUPPORTED_CITIES)
+    return _catalogue
@@ -0,0 +1,197 @@
+"""
+POI Catalogue
+=============
+Columnar, array-backed form of one city's POIs for city-scale work
+(spatial queries, distance matrices), instead of one nested dict per POI:
+
+  • ``lats`` / ``lngs``       — float64 NumPy arrays
+  • ``category_codes``        — int32 codes into ``category_names``, so
+                                each category string is stored once
+  • ``names`` / ``addresses`` / ``descriptions`` — plain string tables
+
+Distances, centroids and category / bounding-box filters run over the
+arrays.  ``POIView`` (``__slots__``, two fields) gives cheap row access,
+and the usual POI dicts — or ``schemas.POI`` models — are only built for
+the rows that end up in a response (``to_dict`` / ``to_model``).
+"""
+
+from typing import Iterable, Iterator
+
+import numpy as np
+
+from app.models.schemas import POI
+from app.services.route_optimiser import haversine_cross
+
+
+class POIView:
+    """One catalogue row, read lazily from the columns."""
+
+    __slots__ = ("catalogue", "index")
+
+    def __init__(self, catalogue: "POICatalogue", index: int):
+        self.catalogue = catalogue
+        self.index = index
+
+    @property
+    def name(self) -> str:
+        return self.catalogue.names[self.index]
+
+    @property
+    def category(self) -> str:
+        return self.catalogue.category_names[self.catalogue.category_codes[self.index]]
+
+    @property
+    def lat(self) -> float:
+        return float(self.catalogue.lats[self.index])
+
+    @property
+    def lng(self) -> float:
+        return float(self.catalogue.lngs[self.index])
+
+    @property
+    def location(self) -> dict:
+        return {"lat": self.lat, "lng": self.lng}
+
+    def to_dict(self) -> dict:
+        return self.catalogue.to_dict(self.index)
+
+    def __repr__(self) -> str:
+        return f"POIView({self.name!r}, {self.category!r}, {self.lat:.6f}, {self.lng:.6f})"
+
+
+class POICatalogue:
+    """Immutable column store over a set of POIs."""
+
+    def __init__(
+        self,
+        lats: np.ndarray,
+        lngs: np.ndarray,
+        category_codes: np.ndarray,
+        category_names: list[str],
+        names: list[str],
+        addresses: list[str | None],
+        descriptions: list[str | None],
+    ):
+        self.lats = lats
+        self.lngs = lngs
+        self.category_codes = category_codes
+        self.category_names = category_names
+        self._category_index = {name: code for code, name in enumerate(category_names)}
+        self.names = names
+        self.addresses = addresses
+        self.descriptions = descriptions
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[tuple]) -> "POICatalogue":
+        """Build from ``(name, category, lat, lng, address, description)`` tuples."""
+        rows = list(rows)
+        if not rows:
+            return cls.empty()
+        names, categories, lats, lngs, addresses, descriptions = map(list, zip(*rows))
+        index: dict[str, int] = {}
+        codes = np.fromiter(
+            (index.setdefault(c or "", len(index)) for c in categories),
+            dtype=np.int32,
+            count=len(rows),
+        )
+        return cls(
+            np.asarray(lats, dtype=np.float64),
+            np.asarray(lngs, dtype=np.float64),
+            codes,
+            list(index),
+            names,
+            addresses,
+            descriptions,
+        )
+
+    @classmethod
+    def from_pois(cls, pois: Iterable[dict]) -> "POICatalogue":
+        """Build from POI dicts (each with ``location``)."""
+        return cls.from_rows(
+            (
+                p.get("name", ""),
+                p.get("category"),
+                p["location"]["lat"],
+                p["location"]["lng"],
+                p.get("address"),
+                p.get("description"),
+            )
+            for p in pois
+        )
+
+    @classmethod
+    def empty(cls) -> "POICatalogue":
+        return cls(np.empty(0), np.empty(0), np.empty(0, dtype=np.int32), [], [], [], [])
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def __getitem__(self, index: int) -> POIView:
+        if not -len(self) <= index < len(self):
+            raise IndexError(index)
+        return POIView(self, index % len(self))
+
+    def __iter__(self) -> Iterator[POIView]:
+        return (POIView(self, i) for i in range(len(self)))
+
+    # ── Vectorised operations ────────────────────────────────────────
+
+    def codes(self, categories: Iterable[str]) -> np.ndarray:
+        """Codes of the given category labels (unknown labels are skipped)."""
+        return np.array(
+            [self._category_index[c] for c in categories if c in self._category_index],
+            dtype=np.int32,
+        )
+
+    def filter(
+        self,
+        categories: Iterable[str] | None = None,
+        bbox: tuple[float, float, float, float] | None = None,
+        indices: np.ndarray | None = None,
+    ) -> np.ndarray:
+        """
+        Row indices (optionally within *indices*) matching *categories*
+        and a ``(west, south, east, north)`` *bbox*, edges inclusive.
+        """
+        idx = np.arange(len(self)) if indices is None else np.asarray(indices, dtype=np.intp)
+        keep = np.ones(len(idx), dtype=bool)
+        if categories:
+            keep &= np.isin(self.category_codes[idx], self.codes(categories))
+        if bbox is not None:
+            west, south, east, north = bbox
+            lats, lngs = self.lats[idx], self.lngs[idx]
+            keep &= (lngs >= west) & (lngs <= east) & (lats >= south) & (lats <= north)
+        return idx[keep]
+
+    def distances_from(self, lat: float, lng: float, indices: np.ndarray | None = None) -> np.ndarray:
+        """Great-circle metres from (lat, lng) to each row (or each of *indices*)."""
+        lats = self.lats if indices is None else self.lats[indices]
+        lngs = self.lngs if indices is None else self.lngs[indices]
+        return haversine_cross([lat], [lng], lats, lngs)[0]
+
+    def centroid(self, indices: np.ndarray | None = None) -> dict | None:
+        """Mean lat/lng of every row (or of *indices*); ``None`` when empty."""
+        lats = self.lats if indices is None else self.lats[indices]
+        if not len(lats):
+            return None
+        lngs = self.lngs if indices is None else self.lngs[indices]
+        return {"lat": float(lats.mean()), "lng": float(lngs.mean())}
+
+    # ── Materialising rows ───────────────────────────────────────────
+
+    def to_dict(self, index: int) -> dict:
+        """The standard POI dict for one row."""
+        return {
+            "name": self.names[index],
+            "category": self.category_names[self.category_codes[index]],
+            "location": {"lat": float(self.lats[index]), "lng": float(self.lngs[index])},
+            "address": self.addresses[index],
+            "description": self.descriptions[index],
+        }
+
+    def to_dicts(self, indices: Iterable[int] | None = None) -> list[dict]:
+        return [self.to_dict(int(i)) for i in (range(len(self)) if indices is None else indices)]
+
+    def to_model(self, index: int) -> POI:
+        poi = self.to_dict(index)
+        return POI(**{**poi, "address": poi["address"] or "", "description": poi["description"] or ""})
@@ -0,0 +1,208 @@
+"""
+POI Store
+=========
+Local, per-city copy of the POI catalogue, filled by the offline
+ingestion job in ``app.services.poi_ingest``.
+
+Rows live in SQLite (``settings.POI_STORE_URL``, defaulting to
+``DATABASE_URL``) and are keyed on (city, category, object_id) so
+re-ingesting a feature updates it in place.  ``ingest_state`` records,
+per (city, category), the watermark the next incremental refresh
+resumes from — the newest edit date seen, or the highest object id when
+the layer has no edit tracking.
+"""
+
+import sqlite3
+import threading
+import time
+
+from app.config import settings
+from app.data.cache import SQLITE_BUSY_TIMEOUT_S, sqlite_path
+from app.data.poi_catalogue import POICatalogue
+
+
+class POIStore:
+    """SQLite-backed POI table plus per-(city, category) ingestion watermarks."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            path, timeout=SQLITE_BUSY_TIMEOUT_S, check_same_thread=False, isolation_level=None
+        )
+        # WAL: request-path reads don't wait on the refresh job's writes.
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(
+            "CREATE TABLE IF NOT EXISTS pois ("
+            " city TEXT NOT NULL,"
+            " category TEXT NOT NULL,"
+            " object_id INTEGER NOT NULL,"
+            " name TEXT NOT NULL,"
+            " lat REAL NOT NULL,"
+            " lng REAL NOT NULL,"
+            " address TEXT,"
+            " description TEXT,"
+            " edit_date INTEGER,"
+            " PRIMARY KEY (city, category, object_id));"
+            "CREATE TABLE IF NOT EXISTS ingest_state ("
+            " city TEXT NOT NULL,"
+            " category TEXT NOT NULL,"
+            " max_object_id INTEGER,"
+            " max_edit_date INTEGER,"
+            " ingested_at REAL NOT NULL,"
+            " PRIMARY KEY (city, category));"
+        )
+        self.hits = 0
+        self.misses = 0
+
+    # ── Reads ────────────────────────────────────────────────────────
+
+    def is_ingested(self, city: str, category: str) -> bool:
+        """Whether (city, category) has been ingested at least once."""
+        return self.watermark(city, category) is not None
+
+    def watermark(self, city: str, category: str) -> dict | None:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT max_object_id, max_edit_date, ingested_at FROM ingest_state"
+                " WHERE city = ? AND category = ?",
+                (city, category),
+            ).fetchone()
+        if row is None:
+            return None
+        return {"max_object_id": row[0], "max_edit_date": row[1], "ingested_at": row[2]}
+
+    def query(self, city: str, category: str, limit: int) -> list[dict] | None:
+        """
+        Up to *limit* POIs of *category* in *city*, or ``None`` when that
+        pair has never been ingested (an empty list means "ingested, none").
+        """
+        if not self.is_ingested(city, category):
+            self.misses += 1
+            return None
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT name, category, lat, lng, address, description FROM pois"
+                " WHERE city = ? AND category = ? ORDER BY object_id LIMIT ?",
+                (city, category, limit),
+            ).fetchall()
+        self.hits += 1
+        return [_to_poi(row) for row in rows]
+
+    def city_catalogue(self, city: str) -> POICatalogue:
+        """Every stored POI in *city*, columnar (categories are CATEGORY_MAP keys)."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT name, category, lat, lng, address, description FROM pois"
+                " WHERE city = ? ORDER BY category, object_id",
+                (city,),
+            ).fetchall()
+        return POICatalogue.from_rows(rows)
+
+    def city_pois(self, city: str) -> list[dict]:
+        """Every stored POI in *city* as dicts (prefer ``city_catalogue`` at scale)."""
+        return self.city_catalogue(city).to_dicts()
+
+    def version(self, city: str) -> float | None:
+        """Changes whenever any category of *city* is (re-)ingested."""
+        with self._lock:
+            (stamp,) = self._conn.execute(
+                "SELECT MAX(ingested_at) FROM ingest_state WHERE city = ?", (city,)
+            ).fetchone()
+        return stamp
+
+    def count(self, city: str | None = None) -> int:
+        with self._lock:
+            if city is None:
+                (n,) = self._conn.execute("SELECT COUNT(*) FROM pois").fetchone()
+            else:
+                (n,) = self._conn.execute(
+                    "SELECT COUNT(*) FROM pois WHERE city = ?", (city,)
+                ).fetchone()
+        return n
+
+    # ── Writes ───────────────────────────────────────────────────────
+
+    def upsert(self, city: str, category: str, rows: list[dict]) -> int:
+        """Insert or update normalised rows (see ``poi_ingest.feature_to_row``)."""
+        if not rows:
+            return 0
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO pois (city, category, object_id, name, lat, lng,"
+                    " address, description, edit_date) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    [
+                        (
+                            city, category, r["object_id"], r["name"], r["lat"], r["lng"],
+                            r.get("address"), r.get("description"), r.get("edit_date"),
+                        )
+                        for r in rows
+                    ],
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return len(rows)
+
+    def mark_ingested(
+        self,
+        city: str,
+        category: str,
+        max_object_id: int | None,
+        max_edit_date: int | None,
+    ):
+        """Advance the watermark; it never moves backwards."""
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO ingest_state (city, category, max_object_id, max_edit_date, ingested_at)"
+                " VALUES (?, ?, ?, ?, ?)"
+                " ON CONFLICT (city, category) DO UPDATE SET"
+                " max_object_id = MAX(COALESCE(max_object_id, excluded.max_object_id),"
+                "                     COALESCE(excluded.max_object_id, max_object_id)),"
+                " max_edit_date = MAX(COALESCE(max_edit_date, excluded.max_edit_date),"
+                "                     COALESCE(excluded.max_edit_date, max_edit_date)),"
+                " ingested_at = excluded.ingested_at",
+                (city, category, max_object_id, max_edit_date, time.time()),
+            )
+
+    def clear(self, city: str, category: str):
+        """Forget one (city, category) entirely — used by full re-ingests."""
+        with self._lock:
+            self._conn.execute("DELETE FROM pois WHERE city = ? AND category = ?", (city, category))
+            self._conn.execute(
+                "DELETE FROM ingest_state WHERE city = ? AND category = ?", (city, category)
+            )
+
+    def stats(self) -> dict:
+        with self._lock:
+            (ingested,) = self._conn.execute("SELECT COUNT(*) FROM ingest_state").fetchone()
+        return {
+            "pois": self.count(),
+            "ingested_pairs": ingested,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+    def close(self):
+        self._conn.close()
+
+
+def _to_poi(row: tuple) -> dict:
+    name, category, lat, lng, address, description = row
+    return {
+        "name": name,
+        "category": category,
+        "location": {"lat": lat, "lng": lng},
+        "address": address,
+        "description": description,
+    }
+
+
+def build_poi_store() -> POIStore:
+    """Open the store at ``POI_STORE_URL`` (or ``DATABASE_URL``)."""
+    url = settings.POI_STORE_URL or settings.DATABASE_URL
+    return POIStore(sqlite_path(url) or ":memory:")
@@ -0,0 +1,108 @@
+"""
+Spatial Index
+=============
+STRtree (via ``shapely``) over one city's ``POICatalogue`` for
+bounding-box, radius and k-nearest queries.  Queries return row indices
+into the catalogue, so POI dicts are only built for the rows a caller
+actually keeps.
+
+The tree holds points in plain lng/lat degrees, so it is only used to
+cut the candidate set down to an enclosing box; exact distances are then
+great-circle metres computed with NumPy over the survivors.
+"""
+
+import math
+
+import numpy as np
+
+from app.data.poi_catalogue import POICatalogue
+from app.services.route_optimiser import EARTH_RADIUS_M
+
+METRES_PER_DEGREE_LAT = math.pi * EARTH_RADIUS_M / 180
+
+# nearest_k grows its search radius from here (×2 per step).
+NEAREST_START_RADIUS_M = 250
+
+
+def haversine_m(lat: float, lng: float, lats: np.ndarray, lngs: np.ndarray) -> np.ndarray:
+    """Great-circle metres from one point to each of (*lats*, *lngs*)."""
+    lat1, lng1 = math.radians(lat), math.radians(lng)
+    lat2, lng2 = np.radians(lats), np.radians(lngs)
+    a = (
+        np.sin((lat2 - lat1) / 2) ** 2
+        + math.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+class SpatialIndex:
+    """Immutable index over a ``POICatalogue`` (or a list of POI dicts)."""
+
+    def __init__(self, pois: POICatalogue | list[dict]):
+        if not isinstance(pois, POICatalogue):
+            pois = POICatalogue.from_pois(pois)
+        self.catalogue = pois
+        self.lats = pois.lats
+        self.lngs = pois.lngs
+        import shapely  # deferred: only processes that run spatial queries load GEOS
+
+        self._tree = shapely.STRtree(shapely.points(self.lngs, self.lats))
+
+    def __len__(self) -> int:
+        return len(self.catalogue)
+
+    def within_bbox(
+        self,
+        west: float,
+        south: float,
+        east: float,
+        north: float,
+        categories: list[str] | None = None,
+    ) -> np.ndarray:
+        """Indices of POIs inside the box (edges inclusive), in index order."""
+        import shapely
+
+        hits = np.sort(self._tree.query(shapely.box(west, south, east, north)))
+        return self._filter(hits, categories)
+
+    def within_radius(
+        self,
+        lat: float,
+        lng: float,
+        radius_m: float,
+        categories: list[str] | None = None,
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """``(indices, distances_m)`` of POIs within *radius_m*, nearest first."""
+        dlat = radius_m / METRES_PER_DEGREE_LAT
+        dlng = dlat / max(math.cos(math.radians(lat)), 1e-6)
+        hits = self.within_bbox(lng - dlng, lat - dlat, lng + dlng, lat + dlat, categories)
+        dist = haversine_m(lat, lng, self.lats[hits], self.lngs[hits])
+        keep = dist <= radius_m
+        hits, dist = hits[keep], dist[keep]
+        order = np.argsort(dist, kind="stable")
+        return hits[order], dist[order]
+
+    def nearest_k(
+        self,
+        lat: float,
+        lng: float,
+        k: int,
+        categories: list[str] | None = None,
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """``(indices, distances_m)`` of the *k* POIs closest to (lat, lng)."""
+        if k <= 0 or not len(self):
+            return np.empty(0, dtype=np.intp), np.empty(0)
+        # Widen the radius until it holds k matches — anything closer than
+        # the k-th match must then also be inside it.  Past half the globe
+        # there is nothing left to find.
+        radius = NEAREST_START_RADIUS_M
+        while True:
+            hits, dist = self.within_radius(lat, lng, radius, categories)
+            if len(hits) >= k or radius >= math.pi * EARTH_RADIUS_M:
+                return hits[:k], dist[:k]
+            radius *= 2
+
+    def _filter(self, hits: np.ndarray, categories: list[str] | None) -> np.ndarray:
+        if not categories:
+            return hits
+        return self.catalogue.filter(categories, indices=hits)
@@ -4,16 +4,79 @@ GeoExplore-AI  —  Application Entry Point
 Run with:  uvicorn app.main:app --reload
 """
 
+import asyncio
+from contextlib import asynccontextmanager, suppress
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
 from app.config import settings
+from app.agents.tour_agent import TourAgent
 from app.api import chat, tours, cities, health
+from app.api.middleware import CompressionMiddleware, RequestContextMiddleware
+from app.data.catalogue import rebuild_catalogue
+from app.data.poi_store import build_poi_store
+from app.services.arcgis_service import ArcGISService
+from app.services.batch import BatchRunner
+from app.services.http_pool import HTTPClientPool
+from app.services.poi_ingest import POIIngestor, refresh_forever
+from app.services import template_tours
+from app.services.singleflight import SingleFlight
+from app.services.telemetry import configure_logging
+
+configure_logging()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    print("🌍 GeoExplore-AI backend starting up …")
+    # Build catalogue indexes and pre-serialised responses up front.
+    rebuild_catalogue()
+    # One keep-alive connection pool per upstream host, shared by every service.
+    app.state.http_pool = HTTPClientPool()
+    app.state.tour_agent = None  # built lazily on the first chat request
+    app.state.chat_flight = SingleFlight(settings.CHAT_RESULT_TTL_S, settings.CHAT_RESULT_CACHE_SIZE)
+    app.state.batch_runner = BatchRunner()
+    # Optional background incremental refresh of the local POI store.
+    poi_refresh = None
+    if settings.POI_REFRESH_INTERVAL_S > 0 and settings.POI_FEATURE_SERVICE_URL:
+        ingestor = POIIngestor(ArcGISService(http=app.state.http_pool), build_poi_store())
+        poi_refresh = asyncio.create_task(
+            refresh_forever(ingestor, settings.POI_REFRESH_INTERVAL_S)
+        )
+    # Pre-built template tours (needs both upstreams to build anything real).
+    app.state.template_tours = None
+    tour_refresh = None
+    if (
+        settings.TEMPLATE_TOURS_REFRESH_INTERVAL_S > 0
+        and settings.OPENAI_API_KEY
+        and settings.ARCGIS_API_KEY
+    ):
+        app.state.tour_agent = TourAgent(http=app.state.http_pool)
+        app.state.template_tours = template_tours.TemplateMaterialiser(app.state.tour_agent)
+        tour_refresh = asyncio.create_task(
+            template_tours.refresh_forever(
+                app.state.template_tours, settings.TEMPLATE_TOURS_REFRESH_INTERVAL_S
+            )
+        )
+    try:
+        yield
+    finally:
+        print("👋 GeoExplore-AI backend shutting down …")
+        for task in (poi_refresh, tour_refresh):
+            if task is not None:
+                task.cancel()
+                with suppress(asyncio.CancelledError):
+                    await task
+        await app.state.batch_runner.aclose()
+        await app.state.http_pool.aclose()
+
 
 app = FastAPI(
     title="GeoExplore-AI",
     description="AI-powered geographic tour generation using LangChain & ArcGIS",
     version="0.1.0",
+    lifespan=lifespan,
 )
 
 # ── CORS (allow the React frontend) ──────────────────────────────────
@@ -23,7 +86,12 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Request-ID"],
 )
+# gzip / brotli for whole JSON bodies (streams pass through).
+app.add_middleware(CompressionMiddleware)
+# Request IDs + inbound latency metrics (outermost, so it times everything).
+app.add_middleware(RequestContextMiddleware)
 
 # ── Routers ──────────────────────────────────────────────────────────
 app.include_router(health.router, tags=["health"])
@@ -31,12 +99,3 @@ app.include_router(chat.router, prefix="/api/chat", tags=["chat"])
 app.include_router(tours.router, prefix="/api/tours", tags=["tours"])
 app.include_router(cities.router, prefix="/api/cities", tags=["cities"])
 
-
-@app.on_event("startup")
-async def startup_event():
-    print("🌍 GeoExplore-AI backend starting up …")
-
-
-@app.on_event("shutdown")
-async def shutdown_event():
-    print("👋 GeoExplore-AI backend shutting down …")
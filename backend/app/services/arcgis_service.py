@@ -5,8 +5,20 @@ Low-level wrapper around the ArcGIS REST API for geocoding,
 feature queries, and basemap access.
 """
 
+import asyncio
+import json
+import logging
+from contextlib import aclosing
+from typing import AsyncIterator
+
 import httpx
+
 from app.config import settings
+from app.data.cities import SUPPORTED_CITIES
+from app.data.cache import TieredCache, build_cache, normalise_key
+from app.services.http_pool import HTTPClientPool
+
+log = logging.getLogger(__name__)
 
 
 ARCGIS_GEOCODE_URL = "https://geocode-api.arcgis.com/arcgis/rest/services/World/GeocodeServer"
@@ -16,21 +28,77 @@ ARCGIS_FEATURE_URL = "https://services.arcgis.com"
 class ArcGISService:
     """Thin async client for ArcGIS location services."""
 
-    def __init__(self):
+    def __init__(
+        self,
+        http: HTTPClientPool | None = None,
+        geocode_cache: TieredCache | None = None,
+    ):
         self.api_key = settings.ARCGIS_API_KEY
-        self._client = httpx.AsyncClient(timeout=30)
+        # Use the app-wide pool when given; otherwise own a private one.
+        self._owns_http = http is None
+        self._http = http or HTTPClientPool()
+        self.geocode_cache = geocode_cache or build_cache(
+            "geocode", settings.GEOCODE_CACHE_SIZE, settings.GEOCODE_CACHE_TTL_S
+        )
 
     # ── Geocoding ────────────────────────────────────────────────────
 
     async def geocode(self, address: str) -> dict | None:
-        """Forward-geocode an address → {lat, lng, label}."""
+        """Forward-geocode an address → {lat, lng, label}, via the geocode cache."""
+        key = normalise_key(address)
+        cached = self.geocode_cache.get(key)
+        if cached is not None:
+            return cached
+        result = await self._geocode_remote(address)
+        self.geocode_cache.set(key, result)
+        return result
+
+    async def geocode_many(self, addresses: list[str]) -> list[dict | None]:
+        """
+        Geocode many addresses at once, returning results in input order.
+        Cached addresses are skipped; the rest go through the batch
+        ``geocodeAddresses`` operation, falling back to bounded-concurrency
+        single lookups if batch geocoding is unavailable.
+        """
+        keys = [normalise_key(a) for a in addresses]
+        results: dict[str, dict | None] = {}
+        pending: dict[str, str] = {}
+        for address, key in zip(addresses, keys):
+            if key in results or key in pending:
+                continue
+            cached = self.geocode_cache.get(key)
+            if cached is not None:
+                results[key] = cached
+            else:
+                pending[key] = address
+
+        if pending:
+            fetched = None
+            if len(pending) > 1:
+                try:
+                    fetched = await self._geocode_batch(pending)
+                except (httpx.HTTPError, ValueError, KeyError) as e:
+                    log.warning(f"⚠️  Batch geocode unavailable, geocoding one by one: {e}")
+            if fetched is None:
+                fetched = await self._geocode_each(pending)
+            for key, result in fetched.items():
+                self.geocode_cache.set(key, result)
+                results[key] = result
+
+        return [results.get(key) for key in keys]
+
+    def invalidate_geocode(self, address: str | None = None):
+        """Forget one cached address, or the whole geocode cache."""
+        self.geocode_cache.invalidate(normalise_key(address) if address else None)
+
+    async def _geocode_remote(self, address: str) -> dict | None:
         params = {
             "f": "json",
             "singleLine": address,
             "token": self.api_key,
             "maxLocations": 1,
         }
-        resp = await self._client.get(
+        resp = await self._http.get(
             f"{ARCGIS_GEOCODE_URL}/findAddressCandidates", params=params
         )
         data = resp.json()
@@ -45,6 +113,54 @@ class ArcGISService:
             "score": best["score"],
         }
 
+    async def _geocode_batch(self, pending: dict[str, str]) -> dict[str, dict | None]:
+        """Resolve ``{key: address}`` via ``geocodeAddresses`` in chunks."""
+        items = list(pending.items())
+        fetched: dict[str, dict | None] = {}
+        size = settings.GEOCODE_BATCH_SIZE
+        for start in range(0, len(items), size):
+            chunk = items[start:start + size]
+            records = [
+                {"attributes": {"OBJECTID": i, "SingleLine": address}}
+                for i, (_, address) in enumerate(chunk)
+            ]
+            resp = await self._http.post(
+                f"{ARCGIS_GEOCODE_URL}/geocodeAddresses",
+                data={
+                    "f": "json",
+                    "token": self.api_key,
+                    "outSR": 4326,
+                    "addresses": json.dumps({"records": records}),
+                },
+            )
+            data = resp.json()
+            if "error" in data:
+                raise ValueError(data["error"].get("message", "batch geocode failed"))
+            by_id = {loc["attributes"]["ResultID"]: loc for loc in data.get("locations", [])}
+            for i, (key, _) in enumerate(chunk):
+                loc = by_id.get(i)
+                if not loc or not loc.get("location") or not loc.get("score"):
+                    fetched[key] = None
+                    continue
+                fetched[key] = {
+                    "lat": loc["location"]["y"],
+                    "lng": loc["location"]["x"],
+                    "label": loc["address"],
+                    "score": loc["score"],
+                }
+        return fetched
+
+    async def _geocode_each(self, pending: dict[str, str]) -> dict[str, dict | None]:
+        """Resolve ``{key: address}`` with single lookups, a few at a time."""
+        semaphore = asyncio.Semaphore(settings.GEOCODE_CONCURRENCY)
+
+        async def one(address: str) -> dict | None:
+            async with semaphore:
+                return await self._geocode_remote(address)
+
+        results = await asyncio.gather(*(one(a) for a in pending.values()))
+        return dict(zip(pending.keys(), results))
+
     async def reverse_geocode(self, lat: float, lng: float) -> str | None:
         """Reverse-geocode lat/lng → address string."""
         params = {
@@ -52,7 +168,7 @@ class ArcGISService:
             "location": f"{lng},{lat}",
             "token": self.api_key,
         }
-        resp = await self._client.get(
+        resp = await self._http.get(
             f"{ARCGIS_GEOCODE_URL}/reverseGeocode", params=params
         )
         data = resp.json()
@@ -63,17 +179,148 @@ class ArcGISService:
     async def query_features(
         self, service_url: str, where: str = "1=1", out_fields: str = "*", limit: int = 50
     ) -> list[dict]:
-        """Query an ArcGIS Feature Service and return records."""
+        """Query an ArcGIS Feature Service and return up to *limit* records."""
+        return [
+            feature
+            async for feature in self.iter_features(
+                service_url, where, out_fields, max_records=limit, concurrency=1
+            )
+        ]
+
+    async def iter_features(
+        self,
+        service_url: str,
+        where: str = "1=1",
+        out_fields: str = "*",
+        *,
+        return_geometry: bool = True,
+        bounds: dict | None = None,
+        city: str | None = None,
+        order_by: str | None = None,
+        page_size: int | None = None,
+        concurrency: int | None = None,
+        max_records: int | None = None,
+    ) -> AsyncIterator[dict]:
+        """
+        Stream every feature matching the query, page by page.
+
+        Pages are requested with ``resultOffset``; once the total count is
+        known up to *concurrency* pages are in flight at a time and yielded
+        in order, so memory stays bounded by that window regardless of
+        layer size.  *bounds* (or a *city*'s ``SUPPORTED_CITIES`` bounds)
+        adds a WGS84 envelope filter.  Pass *order_by* (e.g. ``"OBJECTID"``)
+        for layers that don't page in a stable order by default.
+        """
+        page_size = page_size or settings.FEATURE_PAGE_SIZE
+        concurrency = concurrency or settings.FEATURE_QUERY_CONCURRENCY
+        if city is not None:
+            bounds = SUPPORTED_CITIES[city]["bounds"]
+
         params = {
             "f": "json",
             "where": where,
             "outFields": out_fields,
-            "resultRecordCount": limit,
+            "returnGeometry": "true" if return_geometry else "false",
+            "outSR": 4326,
             "token": self.api_key,
         }
-        resp = await self._client.get(f"{service_url}/query", params=params)
+        if bounds:
+            params.update({
+                "geometry": f"{bounds['west']},{bounds['south']},{bounds['east']},{bounds['north']}",
+                "geometryType": "esriGeometryEnvelope",
+                "inSR": 4326,
+                "spatialRel": "esriSpatialRelIntersects",
+            })
+        if order_by:
+            params["orderByFields"] = order_by
+
+        total = None
+        if concurrency > 1:
+            total = await self._count_features(service_url, params)
+        if max_records is not None:
+            total = min(total, max_records) if total is not None else None
+
+        if total is None:
+            pages = self._sequential_pages(service_url, params, page_size, max_records)
+        else:
+            pages = self._concurrent_pages(service_url, params, page_size, total, concurrency)
+        # aclosing: if our consumer stops early, close the pager now so it
+        # reaps its in-flight page requests instead of leaving them to GC.
+        async with aclosing(pages):
+            async for features in pages:
+                for feature in features:
+                    yield feature
+
+    async def _query_page(self, service_url: str, params: dict, offset: int, count: int) -> dict:
+        resp = await self._http.get(
+            f"{service_url}/query",
+            params={**params, "resultOffset": offset, "resultRecordCount": count},
+        )
         data = resp.json()
-        return data.get("features", [])
+        if "error" in data:
+            raise ValueError(data["error"].get("message", "feature query failed"))
+        return data
+
+    async def _count_features(self, service_url: str, params: dict) -> int | None:
+        """Total matching features, or ``None`` if the layer won't say."""
+        try:
+            resp = await self._http.get(
+                f"{service_url}/query", params={**params, "returnCountOnly": "true"}
+            )
+            count = resp.json().get("count")
+        except (httpx.HTTPError, ValueError) as e:
+            log.warning(f"⚠️  Feature count unavailable, paging sequentially: {e}")
+            return None
+        return count if isinstance(count, int) else None
+
+    async def _sequential_pages(
+        self, service_url: str, params: dict, page_size: int, max_records: int | None
+    ) -> AsyncIterator[list[dict]]:
+        """Follow ``exceededTransferLimit`` one page at a time."""
+        offset = 0
+        while max_records is None or offset < max_records:
+            count = page_size if max_records is None else min(page_size, max_records - offset)
+            data = await self._query_page(service_url, params, offset, count)
+            features = data.get("features", [])
+            if features:
+                yield features
+            offset += len(features)
+            if not features or not data.get("exceededTransferLimit"):
+                return
+
+    async def _concurrent_pages(
+        self, service_url: str, params: dict, page_size: int, total: int, concurrency: int
+    ) -> AsyncIterator[list[dict]]:
+        """Fetch known page ranges with a sliding window of *concurrency* requests."""
+
+        async def fetch_range(offset: int, count: int) -> list[dict]:
+            # The server may cap a page below page_size (maxRecordCount);
+            # keep reading until this range is filled or the layer ends.
+            features: list[dict] = []
+            while len(features) < count:
+                data = await self._query_page(
+                    service_url, params, offset + len(features), count - len(features)
+                )
+                page = data.get("features", [])
+                features.extend(page)
+                if not page or not data.get("exceededTransferLimit"):
+                    break
+            return features
+
+        window: list[asyncio.Task] = []
+        try:
+            for offset in range(0, total, page_size):
+                window.append(asyncio.create_task(fetch_range(offset, min(page_size, total - offset))))
+                if len(window) >= concurrency:
+                    yield await window.pop(0)
+            while window:
+                yield await window.pop(0)
+        finally:
+            # Consumer stopped early or a page failed: reap the rest.
+            for task in window:
+                task.cancel()
+            await asyncio.gather(*window, return_exceptions=True)
 
     async def close(self):
-        await self._client.aclose()
+        if self._owns_http:
+            await self._http.aclose()
@@ -0,0 +1,187 @@
+"""
+Batch Tour Generation
+=====================
+Runs many tour specs through the ``TourAgent`` pipeline as one job.
+
+  • one app-wide semaphore (``BATCH_CONCURRENCY``) bounds how many specs
+    run at once across *all* jobs, so a big batch can't starve chat
+  • identical specs — within a batch or against live ``/api/chat``
+    traffic — share one run through the chat ``SingleFlight``; specs that
+    merely overlap share POI fetches and route solves through the
+    services' own in-flight coalescing and caches
+  • results are appended in completion order; ``BatchJob.follow`` lets
+    any number of readers (the NDJSON stream, pollers) tail them
+
+Jobs run as their own tasks, so a client disconnecting from the stream
+doesn't stop the job — it can be picked up again by id.
+"""
+
+import asyncio
+import logging
+import time
+import uuid
+from collections import OrderedDict
+from typing import AsyncIterator
+
+from app.config import settings
+from app.data.cache import request_key
+from app.services.geometry import compact_tour
+from app.services.singleflight import SingleFlight
+
+log = logging.getLogger(__name__)
+
+
+class BatchJob:
+    """One submitted batch: its results so far and whether it has finished."""
+
+    def __init__(self, total: int):
+        self.id = uuid.uuid4().hex
+        self.total = total
+        self.results: list[dict] = []  # completion order; each carries its ``index``
+        self.failed = 0
+        self.created_at = time.time()
+        self.finished_at: float | None = None
+        self._updated = asyncio.Event()
+
+    @property
+    def done(self) -> bool:
+        return self.finished_at is not None
+
+    def add(self, result: dict):
+        self.results.append(result)
+        if result["status"] != "ok":
+            self.failed += 1
+        if len(self.results) == self.total:
+            self.finished_at = time.time()
+        self._notify()
+
+    def cancel(self):
+        if not self.done:
+            self.finished_at = time.time()
+            self._notify()
+
+    async def follow(self, offset: int = 0) -> AsyncIterator[dict]:
+        """Yield results from *offset* on, waiting for new ones until the job ends."""
+        while True:
+            updated = self._updated
+            while offset < len(self.results):
+                yield self.results[offset]
+                offset += 1
+            if self.done:
+                return
+            await updated.wait()
+
+    def summary(self) -> dict:
+        return {
+            "job_id": self.id,
+            "status": "done" if self.done else "running",
+            "total": self.total,
+            "completed": len(self.results),
+            "failed": self.failed,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+        }
+
+    def _notify(self):
+        # Wake current followers; later ones wait on a fresh event.
+        self._updated.set()
+        self._updated = asyncio.Event()
+
+
+class BatchRunner:
+    """Schedules batch jobs under one global concurrency limit and keeps them for polling."""
+
+    def __init__(
+        self,
+        concurrency: int | None = None,
+        max_jobs: int | None = None,
+        job_ttl: float | None = None,
+    ):
+        self._semaphore = asyncio.Semaphore(concurrency or settings.BATCH_CONCURRENCY)
+        self.max_jobs = max_jobs or settings.BATCH_MAX_JOBS
+        self.job_ttl = job_ttl if job_ttl is not None else settings.BATCH_JOB_TTL_S
+        self.jobs: OrderedDict[str, BatchJob] = OrderedDict()
+        self._tasks: dict[str, asyncio.Task] = {}
+        self.specs_run = 0
+
+    def submit(self, specs: list[dict], agent, flight: SingleFlight) -> BatchJob:
+        """
+        Start a job over *specs* (``{"message", "city", "preferences", "id"}``
+        dicts, plus optional ``zoom`` / ``geometry_format`` for the route)
+        and return it immediately; the work runs in the background.
+        """
+        self._prune()
+        job = BatchJob(len(specs))
+        self.jobs[job.id] = job
+        if specs:
+            task = asyncio.create_task(self._run(job, specs, agent, flight))
+            self._tasks[job.id] = task
+            task.add_done_callback(lambda _: self._tasks.pop(job.id, None))
+        else:
+            job.finished_at = time.time()
+        return job
+
+    def get(self, job_id: str) -> BatchJob | None:
+        return self.jobs.get(job_id)
+
+    def stats(self) -> dict:
+        return {
+            "jobs": len(self.jobs),
+            "running": len(self._tasks),
+            "specs_run": self.specs_run,
+        }
+
+    async def aclose(self):
+        """Cancel running jobs (on shutdown)."""
+        for task in list(self._tasks.values()):
+            task.cancel()
+        await asyncio.gather(*self._tasks.values(), return_exceptions=True)
+        for job in self.jobs.values():
+            job.cancel()
+
+    async def _run(self, job: BatchJob, specs: list[dict], agent, flight: SingleFlight):
+        await asyncio.gather(
+            *(self._run_one(job, i, spec, agent, flight) for i, spec in enumerate(specs))
+        )
+
+    async def _run_one(self, job: BatchJob, index: int, spec: dict, agent, flight: SingleFlight):
+        result = {"index": index, "id": spec.get("id")}
+        async with self._semaphore:
+            self.specs_run += 1
+            try:
+                tour = await flight.do(
+                    request_key(spec["message"], spec["city"], spec.get("preferences")),
+                    lambda: agent.run(
+                        message=spec["message"],
+                        city=spec["city"],
+                        preferences=spec.get("preferences"),
+                    ),
+                )
+            except Exception as e:
+                log.warning(f"⚠️  Batch {job.id} spec {index} failed: {e}")
+                result.update(status="error", error=str(e))
+            else:
+                result.update(
+                    status="ok",
+                    reply=tour.get("reply", ""),
+                    tour=compact_tour(
+                        tour.get("tour"),
+                        spec["city"],
+                        spec.get("zoom"),
+                        spec.get("geometry_format", "paths"),
+                    ),
+                    map_data=tour.get("map_data"),
+                )
+        job.add(result)
+
+    def _prune(self):
+        """Forget finished jobs past their TTL, then the oldest beyond ``max_jobs``."""
+        now = time.time()
+        for job_id, job in list(self.jobs.items()):
+            if job.done and now - job.finished_at > self.job_ttl:
+                del self.jobs[job_id]
+        for job_id, job in list(self.jobs.items()):
+            if len(self.jobs) < self.max_jobs:
+                break
+            if job.done:
+                del self.jobs[job_id]
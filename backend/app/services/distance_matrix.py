@@ -0,0 +1,284 @@
+"""
+Distance Matrix
+===============
+Per-city pairwise distance matrices over the local POI catalogue
+(``POIStore``), precomputed once and memory-mapped from disk.
+
+Each city gets ``<city>.json`` (the row keys, the store version and the
+name of the matrix file) plus that ``<city>.<token>.npy`` file, an
+``(n, n)`` float32 array of great-circle metres.  Every build writes a
+new, uniquely named matrix and then swaps the JSON in one
+``os.replace``, so workers building the same city at once can never
+pair one build's keys with another's matrix.  POIs are keyed on their rounded
+coordinates, so any POI dict with a ``location`` can be looked up in
+O(1) — including ones returned by ``POIService.search``.
+
+When the store is re-ingested the matrix is rebuilt incrementally:
+rows for POIs that still exist are carried over and only POIs that are
+new (or moved) are measured against the rest.  Builds run in a worker
+thread, one per city at a time; until one finishes, ``get`` keeps
+returning the previous matrix (its rows are keyed on coordinates, so
+they stay correct) and callers measure unknown stops on the fly.
+
+Travel times for each ``transport_mode`` are a fixed multiple of
+distance (see ``route_optimiser.travel_time_min``), so they are derived
+per sub-matrix rather than stored as three more ``n × n`` arrays.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import tempfile
+import threading
+
+import numpy as np
+
+from app.config import settings
+from app.data.poi_store import POIStore
+from app.services import route_optimiser
+
+log = logging.getLogger(__name__)
+
+# Rows measured (or copied) per step while rebuilding, to bound scratch memory.
+BUILD_CHUNK_ROWS = 512
+
+
+def point_key(location: dict) -> str:
+    """Matrix row key for a ``{"lat", "lng"}`` location (≈10 cm rounding)."""
+    return f"{location['lat']:.6f},{location['lng']:.6f}"
+
+
+def point_keys(lats: np.ndarray, lngs: np.ndarray) -> list[str]:
+    """``point_key`` for each of (*lats*, *lngs*)."""
+    return [f"{lat:.6f},{lng:.6f}" for lat, lng in zip(lats.tolist(), lngs.tolist())]
+
+
+class CityMatrix:
+    """A city's (memory-mapped) distance matrix and its row index."""
+
+    def __init__(self, keys: list[str], dist: np.ndarray, version: float | None):
+        self.keys = keys
+        self.index = {key: i for i, key in enumerate(keys)}
+        self.dist = dist
+        self.version = version
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def indices(self, pois: list[dict]) -> np.ndarray | None:
+        """Row indices for *pois*, or ``None`` if any of them isn't in the matrix."""
+        try:
+            return np.array([self.index[point_key(p["location"])] for p in pois], dtype=np.intp)
+        except KeyError:
+            return None
+
+    def distance(self, a: dict, b: dict) -> float | None:
+        """Metres between two POIs (``None`` if either is unknown)."""
+        i = self.index.get(point_key(a["location"]))
+        j = self.index.get(point_key(b["location"]))
+        if i is None or j is None:
+            return None
+        return float(self.dist[i, j])
+
+    def submatrix(self, pois: list[dict]) -> np.ndarray | None:
+        """
+        ``(k, k)`` float64 distances between *pois*, in their order.
+
+        Only the k² requested cells are read from the mapped file; the
+        city matrix itself is never loaded or copied.
+        """
+        idx = self.indices(pois)
+        if idx is None:
+            return None
+        return self.dist[np.ix_(idx, idx)].astype(np.float64)
+
+    def travel_times(self, pois: list[dict], transport_mode: str = "walking") -> np.ndarray | None:
+        """``(k, k)`` door-to-door minutes between *pois* for *transport_mode*."""
+        sub = self.submatrix(pois)
+        if sub is None:
+            return None
+        return route_optimiser.travel_time_min(sub, transport_mode)
+
+
+class DistanceMatrixCache:
+    """Builds, persists and memory-maps one ``CityMatrix`` per city."""
+
+    def __init__(
+        self,
+        store: POIStore,
+        directory: str | None = None,
+        max_pois: int | None = None,
+    ):
+        self.store = store
+        self.directory = directory or settings.DISTANCE_MATRIX_DIR
+        self.max_pois = max_pois or settings.DISTANCE_MATRIX_MAX_POIS
+        self._matrices: dict[str, CityMatrix] = {}
+        # city → store version for which no matrix can be built (none / too many POIs)
+        self._unavailable: dict[str, float] = {}
+        self._building: dict[str, asyncio.Task] = {}
+        self._lock = threading.Lock()
+        self.loads = 0
+        self.builds = 0
+        self.rows_carried = 0
+        self.rows_measured = 0
+
+    def get(self, city: str) -> CityMatrix | None:
+        """
+        The city's current matrix, without blocking.  If the store has
+        changed since it was built, a rebuild is started in the
+        background and the previous matrix (if any) is returned meanwhile.
+        """
+        version = self.store.version(city)
+        if version is None:
+            return None
+        matrix = self._matrices.get(city)
+        if matrix is not None and matrix.version == version:
+            return matrix
+        if self._unavailable.get(city) != version:
+            self._schedule(city)
+        return matrix
+
+    async def refresh(self, city: str) -> CityMatrix | None:
+        """Load or (re)build the city's matrix in a worker thread."""
+        return await asyncio.to_thread(self.build, city)
+
+    def build(self, city: str) -> CityMatrix | None:
+        """Load or (re)build the city's matrix for the store's current version (blocking)."""
+        with self._lock:
+            version = self.store.version(city)
+            if version is None:
+                return None
+            matrix = self._matrices.get(city)
+            if matrix is not None and matrix.version == version:
+                return matrix
+            if self._unavailable.get(city) == version:
+                return None
+            matrix = self._load(city) or matrix
+            if matrix is None or matrix.version != version:
+                matrix = self._rebuild(city, version, matrix)
+            if matrix is None:
+                self._matrices.pop(city, None)
+                self._unavailable[city] = version
+            else:
+                self._matrices[city] = matrix
+                self._unavailable.pop(city, None)
+            return matrix
+
+    def submatrix(self, city: str, pois: list[dict]) -> np.ndarray | None:
+        """Shortcut for ``get(city).submatrix(pois)``; ``None`` when unavailable."""
+        matrix = self.get(city)
+        return matrix.submatrix(pois) if matrix is not None else None
+
+    def stats(self) -> dict:
+        return {
+            "cities": {city: len(m) for city, m in self._matrices.items()},
+            "building": sorted(self._building),
+            "unavailable": sorted(self._unavailable),
+            "loads": self.loads,
+            "builds": self.builds,
+            "rows_carried": self.rows_carried,
+            "rows_measured": self.rows_measured,
+        }
+
+    def _schedule(self, city: str):
+        if city in self._building:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # No event loop (scripts, the ingest CLI): nothing to stall, build inline.
+            self.build(city)
+            return
+        task = loop.create_task(self.refresh(city))
+        self._building[city] = task
+        task.add_done_callback(lambda t: self._built(city, t))
+
+    def _built(self, city: str, task: asyncio.Task):
+        self._building.pop(city, None)
+        if not task.cancelled() and task.exception() is not None:
+            log.warning(f"⚠️  Distance matrix build for {city!r} failed: {task.exception()}")
+
+    # ── Persistence ──────────────────────────────────────────────────
+
+    def _meta_path(self, city: str) -> str:
+        return os.path.join(self.directory, f"{city}.json")
+
+    def _read_meta(self, city: str) -> tuple[dict, str]:
+        """The city's metadata and the path of the matrix file it describes."""
+        with open(self._meta_path(city), encoding="utf-8") as f:
+            info = json.load(f)
+        return info, os.path.join(self.directory, info.get("matrix") or f"{city}.npy")
+
+    def _load(self, city: str) -> CityMatrix | None:
+        try:
+            info, npy = self._read_meta(city)
+            dist = np.load(npy, mmap_mode="r")
+        except (OSError, ValueError) as e:
+            if not isinstance(e, FileNotFoundError):
+                log.warning(f"⚠️  Distance matrix for {city!r} unreadable, rebuilding: {e}")
+            return None
+        if dist.shape != (len(info["keys"]), len(info["keys"])):
+            return None
+        self.loads += 1
+        return CityMatrix(info["keys"], dist, info.get("version"))
+
+    def _rebuild(self, city: str, version: float, old: CityMatrix | None) -> CityMatrix | None:
+        catalogue = self.store.city_catalogue(city)
+        # Key → first catalogue row at that point.
+        points: dict[str, int] = {}
+        for i, key in enumerate(point_keys(catalogue.lats, catalogue.lngs)):
+            points.setdefault(key, i)
+        if not points or len(points) > self.max_pois:
+            return None
+
+        # Surviving rows keep their relative order at the front; new ones follow.
+        kept = [k for k in (old.keys if old else []) if k in points]
+        keys = kept + [k for k in points if old is None or k not in old.index]
+        rows = np.fromiter((points[k] for k in keys), dtype=np.intp, count=len(keys))
+        lats, lngs = catalogue.lats[rows], catalogue.lngs[rows]
+        n, m = len(keys), len(kept)
+
+        os.makedirs(self.directory, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=self.directory, prefix=f"{city}.", suffix=".npy.tmp")
+        os.close(fd)
+        out = np.lib.format.open_memmap(tmp, mode="w+", dtype=np.float32, shape=(n, n))
+        if m:
+            old_idx = np.array([old.index[k] for k in kept], dtype=np.intp)
+            for start in range(0, m, BUILD_CHUNK_ROWS):
+                rows = old.dist[old_idx[start:start + BUILD_CHUNK_ROWS]]
+                out[start:start + len(rows), :m] = rows[:, old_idx]
+        for start in range(m, n, BUILD_CHUNK_ROWS):
+            stop = min(start + BUILD_CHUNK_ROWS, n)
+            block = route_optimiser.haversine_cross(lats[start:stop], lngs[start:stop], lats, lngs)
+            out[start:stop, :] = block
+            out[:, start:stop] = block.T
+        out.flush()
+        del out
+        npy = tmp.removesuffix(".tmp")
+        os.replace(tmp, npy)
+        # Map it before publishing: once published, another worker's next
+        # build may remove the file (open maps stay valid).
+        dist = np.load(npy, mmap_mode="r")
+
+        try:
+            previous = self._read_meta(city)[1]
+        except (OSError, ValueError):
+            previous = None
+        # The matrix is complete on disk before the metadata points at it.
+        with tempfile.NamedTemporaryFile(
+            "w", dir=self.directory, prefix=f"{city}.", suffix=".json.tmp",
+            encoding="utf-8", delete=False,
+        ) as f:
+            json.dump({"keys": keys, "version": version, "matrix": os.path.basename(npy)}, f)
+        os.replace(f.name, self._meta_path(city))
+        if previous is not None and previous != npy:
+            try:
+                os.remove(previous)  # open memory maps of it stay valid
+            except OSError:
+                pass
+
+        self.builds += 1
+        self.rows_carried += m
+        self.rows_measured += n - m
+        return CityMatrix(keys, dist, version)
@@ -0,0 +1,130 @@
+"""
+Route Geometry
+==============
+Shrinks route geometry for map payloads:
+
+  • Douglas–Peucker simplification (GEOS, via ``shapely``) with a
+    tolerance of ``ROUTE_SIMPLIFY_PX`` screen pixels at the map's zoom
+    level — vertices the client could never draw apart are dropped
+  • optional encoded-polyline output (Google's format, 1e-5 precision),
+    several times smaller than JSON coordinate arrays and cheap to decode
+
+Routes are cached and shared with their full geometry; ``compact_route``
+returns a copy shaped for one response.
+"""
+
+import math
+
+import numpy as np
+
+from app.config import settings
+from app.data.cities import SUPPORTED_CITIES
+from app.services.route_optimiser import EARTH_RADIUS_M
+
+# Web Mercator ground resolution at the equator, zoom 0 (metres per 256-px tile pixel).
+METRES_PER_PIXEL_Z0 = 2 * math.pi * EARTH_RADIUS_M / 256
+
+GEOMETRY_FORMATS = ("paths", "polyline", "raw")
+
+
+def zoom_tolerance_m(zoom: float, lat: float) -> float:
+    """Metres covered by ``ROUTE_SIMPLIFY_PX`` pixels at *zoom* and latitude *lat*."""
+    return settings.ROUTE_SIMPLIFY_PX * METRES_PER_PIXEL_Z0 * math.cos(math.radians(lat)) / 2 ** zoom
+
+
+def simplify_path(coords: np.ndarray, tolerance_m: float) -> np.ndarray:
+    """
+    Douglas–Peucker over an ``(n, 2)`` lng/lat path; endpoints are kept.
+    Runs in a local equirectangular projection so *tolerance_m* is metres.
+    """
+    if len(coords) < 3 or tolerance_m <= 0:
+        return coords
+    import shapely  # deferred: GEOS is only loaded once a real path needs simplifying
+
+    scale_y = math.pi * EARTH_RADIUS_M / 180
+    scale_x = scale_y * math.cos(math.radians(float(coords[:, 1].mean())))
+    scale = np.array([scale_x, scale_y])
+    line = shapely.linestrings(coords * scale)
+    kept = shapely.get_coordinates(shapely.simplify(line, tolerance_m, preserve_topology=False))
+    return kept / scale
+
+
+def encode_polyline(coords: np.ndarray, precision: int = 5) -> str:
+    """Encoded-polyline string for an ``(n, 2)`` lng/lat path (lat first, per the format)."""
+    if not len(coords):
+        return ""
+    scaled = np.round(np.asarray(coords)[:, ::-1] * 10 ** precision).astype(np.int64)
+    deltas = np.diff(scaled, axis=0, prepend=np.zeros((1, 2), dtype=np.int64)).ravel()
+    # Zig-zag: sign into the low bit.
+    values = np.where(deltas < 0, ~(deltas << 1), deltas << 1).tolist()
+    out = []
+    for value in values:
+        while value >= 0x20:
+            out.append(chr((0x20 | (value & 0x1F)) + 63))
+            value >>= 5
+        out.append(chr(value + 63))
+    return "".join(out)
+
+
+def decode_polyline(text: str, precision: int = 5) -> list[list[float]]:
+    """Inverse of ``encode_polyline``: ``[[lng, lat], ...]``."""
+    values, shift, acc = [], 0, 0
+    for char in text:
+        byte = ord(char) - 63
+        acc |= (byte & 0x1F) << shift
+        shift += 5
+        if byte < 0x20:
+            values.append(~(acc >> 1) if acc & 1 else acc >> 1)
+            shift, acc = 0, 0
+    points = np.cumsum(np.array(values, dtype=np.int64).reshape(-1, 2), axis=0) / 10 ** precision
+    return points[:, ::-1].tolist()
+
+
+def compact_route(
+    route: dict | None,
+    city: str,
+    zoom: float | None = None,
+    geometry_format: str = "paths",
+) -> dict | None:
+    """
+    A copy of *route* with its geometry simplified for *zoom* (default:
+    the city's map zoom) and, for ``"polyline"``, encoded.  ``"raw"``
+    returns *route* untouched.
+    """
+    if geometry_format not in GEOMETRY_FORMATS:
+        raise ValueError(
+            f"Unknown geometry format {geometry_format!r}; expected one of {GEOMETRY_FORMATS}"
+        )
+    geometry = (route or {}).get("geometry")
+    if geometry_format == "raw" or not geometry or not geometry.get("paths"):
+        return route
+
+    city_meta = SUPPORTED_CITIES.get(city) or {}
+    zoom = zoom if zoom is not None else city_meta.get("zoom", 12)
+    lat = (route.get("center") or city_meta.get("center") or {"lat": 0.0})["lat"]
+    tolerance = zoom_tolerance_m(zoom, lat)
+    paths = [
+        simplify_path(np.asarray(path, dtype=np.float64)[:, :2], tolerance)
+        for path in geometry["paths"]
+        if path
+    ]
+
+    compact = {k: v for k, v in geometry.items() if k != "paths"}
+    if geometry_format == "polyline":
+        compact["polylines"] = [encode_polyline(p) for p in paths]
+        compact["encoding"] = "polyline5"
+    else:
+        compact["paths"] = [np.round(p, 6).tolist() for p in paths]
+    return {**route, "geometry": compact}
+
+
+def compact_tour(
+    tour: dict | None,
+    city: str,
+    zoom: float | None = None,
+    geometry_format: str = "paths",
+) -> dict | None:
+    """``compact_route`` applied to ``tour["route"]`` (returns a copy)."""
+    if not tour or not tour.get("route"):
+        return tour
+    return {**tour, "route": compact_route(tour["route"], city, zoom, geometry_format)}
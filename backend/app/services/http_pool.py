@@ -0,0 +1,166 @@
+"""
+HTTP Client Pool
+================
+App-wide pool of keep-alive ``httpx.AsyncClient`` instances, one per
+upstream host (geocoder, routing, feature services, OpenAI …).
+
+Created once in the FastAPI lifespan and injected into every service so
+that connections (and their TLS sessions) are reused across requests
+instead of being opened — and leaked — per chat.  Every client's
+transport is wrapped in the per-host rate limit, retry and circuit
+breaker from ``app.services.resilience``.
+"""
+
+import importlib.util
+import time
+from urllib.parse import urlsplit
+
+import httpx
+
+from app.config import settings
+from app.services.resilience import ResilientTransport, Upstream
+from app.services.telemetry import UPSTREAM_SECONDS
+
+
+class HTTPClientPool:
+    """Lazily creates and caches one ``httpx.AsyncClient`` per upstream host."""
+
+    def __init__(
+        self,
+        *,
+        timeout: float | None = None,
+        max_connections_per_host: int | None = None,
+        max_keepalive_per_host: int | None = None,
+        keepalive_expiry: float | None = None,
+        http2: bool | None = None,
+        transport: httpx.AsyncBaseTransport | None = None,
+    ):
+        self.timeout = timeout if timeout is not None else settings.HTTP_TIMEOUT_S
+        self.limits = httpx.Limits(
+            max_connections=max_connections_per_host or settings.HTTP_MAX_CONNECTIONS_PER_HOST,
+            max_keepalive_connections=max_keepalive_per_host or settings.HTTP_MAX_KEEPALIVE_PER_HOST,
+            keepalive_expiry=(
+                keepalive_expiry if keepalive_expiry is not None else settings.HTTP_KEEPALIVE_EXPIRY_S
+            ),
+        )
+        want_http2 = settings.HTTP2_ENABLED if http2 is None else http2
+        # HTTP/2 needs the optional ``h2`` package (``pip install httpx[http2]``).
+        self.http2 = want_http2 and importlib.util.find_spec("h2") is not None
+        # Injectable transport — lets tests/benchmarks swap in local fakes.
+        self._transport = transport
+        self._clients: dict[str, httpx.AsyncClient] = {}
+        self._stats: dict[str, dict] = {}
+        self._upstreams: dict[str, Upstream] = {}
+        self._closed = False
+
+    # ── Client access ────────────────────────────────────────────────
+
+    def client(self, url: str) -> httpx.AsyncClient:
+        """Return the shared client for the host that *url* points at."""
+        if self._closed:
+            raise RuntimeError("HTTPClientPool is closed")
+        host = self._host_key(url)
+        client = self._clients.get(host)
+        if client is None:
+            inner = self._transport or httpx.AsyncHTTPTransport(limits=self.limits, http2=self.http2)
+            client = httpx.AsyncClient(
+                timeout=self.timeout,
+                transport=ResilientTransport(_TracedTransport(inner, host), self.upstream(url)),
+            )
+            self._clients[host] = client
+            self._stats[host] = {"requests": 0, "errors": 0, "in_flight": 0, "peak_in_flight": 0}
+        return client
+
+    def upstream(self, url: str) -> Upstream:
+        """Rate-limit / breaker state for the host that *url* points at."""
+        host = self._host_key(url)
+        upstream = self._upstreams.get(host)
+        if upstream is None:
+            upstream = self._upstreams[host] = Upstream(host)
+        return upstream
+
+    def available(self, url: str) -> bool:
+        """``False`` while the host's circuit is open (callers can skip to a fallback)."""
+        return self.upstream(url).available
+
+    async def request(self, method: str, url: str, **kwargs) -> httpx.Response:
+        """Send a request through the per-host client, tracking pool usage."""
+        client = self.client(url)
+        stats = self._stats[self._host_key(url)]
+        stats["requests"] += 1
+        stats["in_flight"] += 1
+        stats["peak_in_flight"] = max(stats["peak_in_flight"], stats["in_flight"])
+        try:
+            return await client.request(method, url, **kwargs)
+        except httpx.HTTPError:
+            stats["errors"] += 1
+            raise
+        finally:
+            stats["in_flight"] -= 1
+
+    async def get(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request("GET", url, **kwargs)
+
+    async def post(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request("POST", url, **kwargs)
+
+    # ── Introspection ────────────────────────────────────────────────
+
+    def stats(self) -> dict:
+        """Per-host request counters plus live connection counts for sizing."""
+        hosts = {}
+        for host, client in self._clients.items():
+            hosts[host] = {
+                **self._stats[host],
+                **self._connection_counts(client),
+                "max_connections": self.limits.max_connections,
+                **self._upstreams[host].stats(),
+            }
+        return {"http2": self.http2, "hosts": hosts}
+
+    @staticmethod
+    def _connection_counts(client: httpx.AsyncClient) -> dict:
+        # httpx does not expose pool state publicly; read httpcore's view
+        # defensively so a library upgrade degrades to zeros, not errors.
+        transport = getattr(client, "_transport", None)
+        while hasattr(transport, "inner"):
+            transport = transport.inner
+        pool = getattr(transport, "_pool", None)
+        connections = list(getattr(pool, "connections", []) or [])
+        idle = sum(1 for c in connections if getattr(c, "is_idle", lambda: False)())
+        return {"connections": len(connections), "idle_connections": idle}
+
+    @staticmethod
+    def _host_key(url: str) -> str:
+        parts = urlsplit(url)
+        return f"{parts.scheme}://{parts.netloc}"
+
+    # ── Lifecycle ────────────────────────────────────────────────────
+
+    async def aclose(self):
+        """Close every pooled client; safe to call more than once."""
+        self._closed = True
+        clients, self._clients = list(self._clients.values()), {}
+        for client in clients:
+            await client.aclose()
+
+
+class _TracedTransport(httpx.AsyncBaseTransport):
+    """Records each outbound attempt in ``geoexplore_upstream_request_seconds``."""
+
+    def __init__(self, inner: httpx.AsyncBaseTransport, host: str):
+        self.inner = inner
+        self.host = host
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        started = time.perf_counter()
+        status = "error"
+        try:
+            response = await self.inner.handle_async_request(request)
+            status = str(response.status_code)
+            return response
+        finally:
+            UPSTREAM_SECONDS.observe(time.perf_counter() - started, self.host, request.method, status)
+
+    async def aclose(self):
+        await self.inner.aclose()
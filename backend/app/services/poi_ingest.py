@@ -0,0 +1,141 @@
+"""
+POI Ingestion
+=============
+Bulk-copies POIs for every city in ``SUPPORTED_CITIES`` and every
+``CATEGORY_MAP`` category from the POI Feature Service
+(``settings.POI_FEATURE_SERVICE_URL``) into the local ``POIStore``.
+
+Refreshes are incremental: each (city, category) resumes from its
+watermark — features edited since the newest ``POI_EDIT_DATE_FIELD``
+value seen, or with a higher OBJECTID when edit tracking is off.
+Incremental runs can't see deletions; run with ``--full`` occasionally
+to rebuild a pair from scratch.
+
+Run with:  python -m app.services.poi_ingest [--city nyc] [--category museums] [--full]
+"""
+
+import argparse
+import asyncio
+import logging
+from datetime import datetime, timezone
+
+from app.config import settings
+from app.data.cities import SUPPORTED_CITIES
+from app.data.poi_store import POIStore, build_poi_store
+from app.services.arcgis_service import ArcGISService
+from app.services.http_pool import HTTPClientPool
+from app.services.poi_service import CATEGORY_MAP, category_where, feature_to_row
+
+log = logging.getLogger(__name__)
+
+# Rows written to the store per transaction.
+UPSERT_BATCH = 500
+
+
+class POIIngestor:
+    """Copies POI-layer features into a ``POIStore``, one (city, category) at a time."""
+
+    def __init__(self, arcgis: ArcGISService, store: POIStore, service_url: str | None = None):
+        self.arcgis = arcgis
+        self.store = store
+        self.service_url = service_url or settings.POI_FEATURE_SERVICE_URL
+
+    async def ingest(self, city: str, category: str, full: bool = False) -> int:
+        """Ingest one pair; returns the number of features written."""
+        if not self.service_url:
+            log.warning("⚠️  POI_FEATURE_SERVICE_URL is not set — nothing to ingest")
+            return 0
+        if full:
+            self.store.clear(city, category)
+
+        where = category_where(category, self._since(self.store.watermark(city, category)))
+        written = 0
+        max_oid = max_edit = None
+        batch: list[dict] = []
+        async for feature in self.arcgis.iter_features(
+            self.service_url, where, city=city, order_by="OBJECTID"
+        ):
+            row = feature_to_row(feature)
+            if row is None:
+                continue
+            batch.append(row)
+            max_oid = max(max_oid or 0, row["object_id"])
+            if row["edit_date"] is not None:
+                max_edit = max(max_edit or 0, row["edit_date"])
+            if len(batch) >= UPSERT_BATCH:
+                written += self.store.upsert(city, category, batch)
+                batch = []
+        written += self.store.upsert(city, category, batch)
+        # Only advance the watermark once the whole pass has succeeded.
+        self.store.mark_ingested(city, category, max_oid, max_edit)
+        return written
+
+    async def ingest_all(
+        self,
+        cities: list[str] | None = None,
+        categories: list[str] | None = None,
+        full: bool = False,
+    ) -> dict[str, int]:
+        """Ingest every requested pair; a failing pair is logged and skipped."""
+        counts: dict[str, int] = {}
+        for city in cities or list(SUPPORTED_CITIES):
+            for category in categories or list(CATEGORY_MAP):
+                try:
+                    counts[f"{city}/{category}"] = await self.ingest(city, category, full)
+                except Exception as e:
+                    log.warning(f"⚠️  POI ingestion for {city}/{category} failed: {e}", exc_info=True)
+        return counts
+
+    @staticmethod
+    def _since(watermark: dict | None) -> str | None:
+        """``where`` fragment selecting features newer than *watermark*."""
+        if not watermark:
+            return None
+        if settings.POI_EDIT_DATE_FIELD and watermark["max_edit_date"] is not None:
+            # ``>=`` so features edited within the same second aren't lost;
+            # re-upserting the boundary rows is harmless.
+            stamp = datetime.fromtimestamp(watermark["max_edit_date"] / 1000, tz=timezone.utc)
+            return f"{settings.POI_EDIT_DATE_FIELD} >= TIMESTAMP '{stamp:%Y-%m-%d %H:%M:%S}'"
+        if watermark["max_object_id"] is not None:
+            return f"OBJECTID > {watermark['max_object_id']}"
+        return None
+
+
+async def refresh_forever(ingestor: POIIngestor, interval: float):
+    """Background job: incremental refresh of every pair every *interval* seconds."""
+    while True:
+        counts = await ingestor.ingest_all()
+        log.info(f"🔄 POI refresh wrote {sum(counts.values())} features")
+        await asyncio.sleep(interval)
+
+
+# ── CLI ──────────────────────────────────────────────────────────────
+
+
+async def _run(args: argparse.Namespace) -> dict[str, int]:
+    http = HTTPClientPool()
+    store = build_poi_store()
+    try:
+        ingestor = POIIngestor(ArcGISService(http=http), store)
+        return await ingestor.ingest_all(args.city, args.category, args.full)
+    finally:
+        store.close()
+        await http.aclose()
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(description="Ingest POIs into the local store.")
+    parser.add_argument("--city", action="append", choices=sorted(SUPPORTED_CITIES),
+                        help="city id (repeatable; default: all)")
+    parser.add_argument("--category", action="append", choices=sorted(CATEGORY_MAP),
+                        help="category (repeatable; default: all)")
+    parser.add_argument("--full", action="store_true",
+                        help="drop existing rows and re-ingest instead of refreshing")
+    counts = asyncio.run(_run(parser.parse_args(argv)))
+    for pair, n in counts.items():
+        print(f"  {pair}: {n}")
+    print(f"✅ Ingested {sum(counts.values())} features")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,10 +3,26 @@ POI Service
 ===========
 Fetches and normalises Points of Interest from ArcGIS and
 supplementary open-data sources.
+
+Categories that the ingestion job (``app.services.poi_ingest``) has
+already copied into the local ``POIStore`` are served from there; only
+the rest go to the network.  The same local copy backs the spatial
+queries (``within_bbox``, ``within_radius``, ``nearest_k``) through a
+per-city ``SpatialIndex``.
 """
 
+import asyncio
+import logging
+
+from app.config import settings
 from app.services.arcgis_service import ArcGISService
+from app.services.http_pool import HTTPClientPool
+from app.services.singleflight import SingleFlight
 from app.data.cities import SUPPORTED_CITIES
+from app.data.poi_store import POIStore, build_poi_store
+from app.data.spatial_index import SpatialIndex
+
+log = logging.getLogger(__name__)
 
 # ArcGIS category mapping
 CATEGORY_MAP = {
@@ -24,8 +40,17 @@ CATEGORY_MAP = {
 class POIService:
     """Retrieve and normalise POI data for a given city."""
 
-    def __init__(self):
-        self.arcgis = ArcGISService()
+    def __init__(
+        self,
+        arcgis: ArcGISService | None = None,
+        http: HTTPClientPool | None = None,
+        store: POIStore | None = None,
+    ):
+        self.arcgis = arcgis or ArcGISService(http=http)
+        self.store = store or build_poi_store()
+        self._flight = SingleFlight(settings.POI_LIVE_RESULT_TTL_S)
+        # city → (store version it was built from, index)
+        self._indexes: dict[str, tuple[float | None, SpatialIndex]] = {}
 
     async def search(
         self,
@@ -41,20 +66,143 @@ class POIService:
         if not city_meta:
             return []
 
-        categories = categories or ["landmarks"]
-        results: list[dict] = []
+        # De-duplicate requested categories but keep the caller's order.
+        categories = list(dict.fromkeys(categories or ["landmarks"]))
+        semaphore = asyncio.Semaphore(settings.POI_SEARCH_CONCURRENCY)
+
+        async def fetch(cat: str) -> list[dict]:
+            local = self.store.query(city, cat, limit)
+            if local is not None:
+                label = CATEGORY_MAP.get(cat, cat)
+                for poi in local:
+                    poi["category"] = label
+                return local
+            async with semaphore:
+                try:
+                    # Overlapping searches (e.g. a batch of tours) share one fetch.
+                    pois = await asyncio.wait_for(
+                        self._flight.do(
+                            f"{city}|{cat}|{limit}",
+                            lambda: self._fetch_category(city_meta, cat, limit),
+                        ),
+                        timeout=settings.POI_CATEGORY_TIMEOUT_S,
+                    )
+                    return [dict(p) for p in pois]
+                except asyncio.TimeoutError:
+                    log.warning(f"⚠️  POI search for {cat!r} timed out — dropping category")
+                except Exception as e:
+                    log.warning(f"⚠️  POI search for {cat!r} failed: {e}")
+                return []
+
+        batches = await asyncio.gather(*(fetch(cat) for cat in categories))
+        return self._merge(batches, limit)
+
+    # ── Spatial queries over the local store ─────────────────────────
+
+    def spatial_index(self, city: str) -> SpatialIndex:
+        """The city's index, rebuilt whenever the store has been re-ingested."""
+        version = self.store.version(city)
+        cached = self._indexes.get(city)
+        if cached is None or cached[0] != version:
+            cached = self._indexes[city] = (version, SpatialIndex(self.store.city_catalogue(city)))
+        return cached[1]
+
+    def within_bbox(
+        self,
+        city: str,
+        west: float,
+        south: float,
+        east: float,
+        north: float,
+        categories: list[str] | None = None,
+        limit: int | None = None,
+    ) -> list[dict]:
+        """Stored POIs inside a lng/lat box."""
+        index = self.spatial_index(city)
+        hits = index.within_bbox(west, south, east, north, categories)
+        return [self._spatial_poi(index, i) for i in hits[:limit]]
+
+    def within_radius(
+        self,
+        city: str,
+        lat: float,
+        lng: float,
+        radius_m: float,
+        categories: list[str] | None = None,
+        limit: int | None = None,
+    ) -> list[dict]:
+        """Stored POIs within *radius_m* metres of a point, nearest first."""
+        index = self.spatial_index(city)
+        hits, dist = index.within_radius(lat, lng, radius_m, categories)
+        return [self._spatial_poi(index, i, d) for i, d in zip(hits[:limit], dist[:limit])]
+
+    def nearest_k(
+        self,
+        city: str,
+        lat: float,
+        lng: float,
+        k: int,
+        categories: list[str] | None = None,
+    ) -> list[dict]:
+        """The *k* stored POIs closest to a point, nearest first."""
+        index = self.spatial_index(city)
+        hits, dist = index.nearest_k(lat, lng, k, categories)
+        return [self._spatial_poi(index, i, d) for i, d in zip(hits, dist)]
 
-        for cat in categories:
-            arcgis_cat = CATEGORY_MAP.get(cat, cat)
-            # TODO: replace with real ArcGIS Places API / Feature Service call
-            # For now return placeholder data so the pipeline runs end-to-end
-            results.extend(
-                self._placeholder_pois(city_meta, arcgis_cat, limit)
-            )
+    @staticmethod
+    def _spatial_poi(index: SpatialIndex, i: int, distance_m: float | None = None) -> dict:
+        poi = index.catalogue.to_dict(int(i))
+        poi["category"] = CATEGORY_MAP.get(poi["category"], poi["category"])
+        if distance_m is not None:
+            poi["distance_m"] = round(float(distance_m), 1)
+        return poi
+
+    async def _fetch_category(self, city_meta: dict, category: str, limit: int) -> list[dict]:
+        """Fetch up to *limit* POIs of one category for a city."""
+        arcgis_cat = CATEGORY_MAP.get(category, category)
+        if not settings.POI_FEATURE_SERVICE_URL:
+            # No POI layer configured yet — return placeholder data so the
+            # pipeline runs end-to-end.
+            return self._placeholder_pois(city_meta, arcgis_cat, limit)
+        pois = []
+        async for feature in self.arcgis.iter_features(
+            settings.POI_FEATURE_SERVICE_URL,
+            category_where(category),
+            city=city_meta["id"],
+            order_by="OBJECTID",
+            max_records=limit,
+            concurrency=1,
+        ):
+            row = feature_to_row(feature)
+            if row is not None:
+                pois.append(row_to_poi(row, arcgis_cat))
+        return pois
 
-        return results[:limit]
+    @staticmethod
+    def _merge(batches: list[list[dict]], limit: int) -> list[dict]:
+        """
+        Concatenate per-category results in request order, dropping POIs
+        that share a name and (≈1 m rounded) location with an earlier one.
+        """
+        seen: set[tuple] = set()
+        merged: list[dict] = []
+        for batch in batches:
+            for poi in batch:
+                loc = poi.get("location") or {}
+                key = (
+                    poi.get("name", "").casefold().strip(),
+                    round(loc.get("lat", 0.0), 5),
+                    round(loc.get("lng", 0.0), 5),
+                )
+                if key in seen:
+                    continue
+                seen.add(key)
+                merged.append(poi)
+                if len(merged) >= limit:
+                    return merged
+        return merged
 
-    # ── Placeholder until real API is wired ──────────────────────────
+    # ── Placeholder until a POI layer is configured ──────────────────────────
 
     @staticmethod
     def _placeholder_pois(city_meta: dict, category: str, limit: int) -> list[dict]:
@@ -70,3 +218,43 @@ class POIService:
             }
             for i in range(min(limit, 3))
         ]
+
+
+# ── Feature Service mapping (shared with poi_ingest) ─────────────────
+
+
+def category_where(category: str, extra: str | None = None) -> str:
+    """SQL ``where`` selecting one ``CATEGORY_MAP`` category on the POI layer."""
+    label = CATEGORY_MAP.get(category, category).replace("'", "''")
+    where = f"{settings.POI_CATEGORY_FIELD} = '{label}'"
+    return f"{where} AND {extra}" if extra else where
+
+
+def feature_to_row(feature: dict) -> dict | None:
+    """Flatten a POI-layer feature into a ``POIStore`` row (``None`` if unusable)."""
+    attrs = feature.get("attributes") or {}
+    geom = feature.get("geometry") or {}
+    object_id = attrs.get("OBJECTID", attrs.get("ObjectID"))
+    name = attrs.get(settings.POI_NAME_FIELD)
+    if object_id is None or not name or geom.get("x") is None or geom.get("y") is None:
+        return None
+    edit_date = attrs.get(settings.POI_EDIT_DATE_FIELD) if settings.POI_EDIT_DATE_FIELD else None
+    return {
+        "object_id": int(object_id),
+        "name": name,
+        "lat": geom["y"],
+        "lng": geom["x"],
+        "address": attrs.get(settings.POI_ADDRESS_FIELD),
+        "description": attrs.get(settings.POI_DESCRIPTION_FIELD),
+        "edit_date": int(edit_date) if edit_date is not None else None,
+    }
+
+
+def row_to_poi(row: dict, category: str) -> dict:
+    return {
+        "name": row["name"],
+        "category": category,
+        "location": {"lat": row["lat"], "lng": row["lng"]},
+        "address": row.get("address"),
+        "description": row.get("description"),
+    }
@@ -0,0 +1,346 @@
+"""
+Resilience
+==========
+Per-upstream guards applied to every request leaving ``HTTPClientPool``
+(ArcGIS geocoding/features/routing and the OpenAI calls alike):
+
+  • ``TokenBucket``     — client-side rate limit sized to the upstream's
+                          quota; halves its rate on a 429 and creeps back
+                          up on success (AIMD)
+  • ``CircuitBreaker``  — after repeated failures, rejects calls
+                          immediately for a cool-down instead of letting
+                          each one wait out the full timeout
+  • retries             — jittered exponential backoff for idempotent
+                          requests on connection errors, timeouts, 429
+                          and 5xx; each attempt has its own short timeout
+                          and all of them share one overall deadline
+
+ArcGIS reports many failures (throttling, service errors) as
+``{"error": {"code": ...}}`` in a ``200`` body; for those upstreams the
+envelope's code stands in for the HTTP status in all three guards.
+
+They are wired in as an ``httpx`` transport wrapper, so they also cover
+clients handed to third-party SDKs (the OpenAI client).
+"""
+
+import asyncio
+import json
+import random
+import re
+import time
+from dataclasses import dataclass
+
+import httpx
+
+from app.config import settings
+
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "OPTIONS", "PUT", "DELETE"})
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+# Cheap test on the start of a body before parsing it as an error envelope.
+_ERROR_ENVELOPE_RE = re.compile(rb'\s*\{\s*"error"\s*:')
+
+
+class CircuitOpenError(httpx.TransportError):
+    """Raised instead of calling an upstream whose breaker is open."""
+
+
+@dataclass(frozen=True)
+class UpstreamPolicy:
+    rate_per_s: float | None          # ``None`` → unlimited
+    burst: int
+    # Resend any method after a 429/5xx or a failed connect — e.g. OpenAI
+    # completions.  Timeouts mid-request are only retried for idempotent
+    # methods, since the upstream may still be working on the first one.
+    retry_all_methods: bool = False
+    attempt_timeout_s: float | None = None  # connect → response headers, per try
+    deadline_s: float | None = None         # all tries and backoff together
+    error_envelope: bool = False            # failures may arrive as a 200 ``{"error": ...}``
+
+
+def upstream_policy(host: str) -> UpstreamPolicy:
+    """Limits for a ``scheme://netloc`` host key, sized to our quotas."""
+    netloc = host.partition("://")[2]
+    if netloc == "api.openai.com":
+        # Completions take a while to start answering; give the one attempt room.
+        return UpstreamPolicy(
+            settings.OPENAI_RATE_PER_S,
+            settings.OPENAI_BURST,
+            retry_all_methods=True,
+            attempt_timeout_s=settings.OPENAI_TIMEOUT_S,
+            deadline_s=settings.OPENAI_TIMEOUT_S,
+        )
+    if netloc.endswith("arcgis.com"):
+        return UpstreamPolicy(
+            settings.ARCGIS_RATE_PER_S,
+            settings.ARCGIS_BURST,
+            attempt_timeout_s=settings.HTTP_ATTEMPT_TIMEOUT_S,
+            deadline_s=settings.HTTP_DEADLINE_S,
+            error_envelope=True,
+        )
+    return UpstreamPolicy(
+        None, 0, attempt_timeout_s=settings.HTTP_ATTEMPT_TIMEOUT_S, deadline_s=settings.HTTP_DEADLINE_S
+    )
+
+
+# ── Rate limiting ────────────────────────────────────────────────────
+
+
+class TokenBucket:
+    """Async token bucket whose refill rate adapts to upstream 429s."""
+
+    def __init__(self, rate_per_s: float, burst: int):
+        self.max_rate = rate_per_s
+        self.rate = rate_per_s
+        self.capacity = max(1, burst)
+        self.tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+        self.waited_s = 0.0
+        self.throttled = 0
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._refill(now)
+                wait = self._paused_until - now
+                if wait <= 0:
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        return
+                    wait = (1 - self.tokens) / self.rate
+                self.waited_s += wait
+                await asyncio.sleep(wait)
+
+    def on_success(self):
+        # Additive increase back towards the configured quota.
+        self.rate = min(self.max_rate, self.rate + self.max_rate * 0.05)
+
+    def on_throttled(self, retry_after: float | None):
+        """Upstream said 429: halve the rate and honour ``Retry-After``."""
+        self.throttled += 1
+        self.rate = max(self.max_rate * 0.1, self.rate / 2)
+        self.tokens = 0.0
+        if retry_after:
+            self._paused_until = max(self._paused_until, time.monotonic() + retry_after)
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def stats(self) -> dict:
+        return {
+            "rate_per_s": round(self.rate, 2),
+            "max_rate_per_s": self.max_rate,
+            "tokens": round(self.tokens, 2),
+            "throttled": self.throttled,
+            "waited_s": round(self.waited_s, 3),
+        }
+
+
+# ── Circuit breaking ─────────────────────────────────────────────────
+
+
+class CircuitBreaker:
+    """closed → open after *threshold* consecutive failures → half-open probe."""
+
+    def __init__(self, threshold: int, reset_timeout: float):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+        self.rejected = 0
+        self.trips = 0
+
+    def allow(self) -> bool:
+        if self.state == "open" and time.monotonic() - self.opened_at >= self.reset_timeout:
+            self.state = "half_open"
+        if self.state == "half_open":
+            if self._probing:
+                self.rejected += 1
+                return False
+            self._probing = True
+            return True
+        if self.state == "open":
+            self.rejected += 1
+            return False
+        return True
+
+    def record_success(self):
+        self.state = "closed"
+        self.failures = 0
+        self._probing = False
+
+    def abandon(self):
+        """A call finished without telling us anything (e.g. cancelled)."""
+        self._probing = False
+
+    def record_failure(self):
+        self.failures += 1
+        self._probing = False
+        if self.state == "half_open" or self.failures >= self.threshold:
+            if self.state != "open":
+                self.trips += 1
+            self.state = "open"
+            self.opened_at = time.monotonic()
+
+    def stats(self) -> dict:
+        retry_in = 0.0
+        if self.state == "open":
+            retry_in = max(0.0, self.reset_timeout - (time.monotonic() - self.opened_at))
+        return {
+            "state": self.state,
+            "consecutive_failures": self.failures,
+            "trips": self.trips,
+            "rejected": self.rejected,
+            "retry_in_s": round(retry_in, 1),
+        }
+
+
+# ── Transport wrapper ────────────────────────────────────────────────
+
+
+class Upstream:
+    """Bucket + breaker + retry counters for one upstream host."""
+
+    def __init__(self, host: str, policy: UpstreamPolicy | None = None):
+        self.host = host
+        self.policy = policy or upstream_policy(host)
+        self.bucket = (
+            TokenBucket(self.policy.rate_per_s, self.policy.burst)
+            if self.policy.rate_per_s else None
+        )
+        self.breaker = CircuitBreaker(
+            settings.BREAKER_FAILURE_THRESHOLD, settings.BREAKER_RESET_TIMEOUT_S
+        )
+        self.retries = 0
+        self.timeouts = 0
+
+    @property
+    def available(self) -> bool:
+        """Whether a call now would be attempted (without claiming the probe)."""
+        if self.breaker.state == "open":
+            return time.monotonic() - self.breaker.opened_at >= self.breaker.reset_timeout
+        return True
+
+    def stats(self) -> dict:
+        return {
+            "breaker": self.breaker.stats(),
+            "rate_limit": self.bucket.stats() if self.bucket else None,
+            "retries": self.retries,
+            "timeouts": self.timeouts,
+        }
+
+
+class ResilientTransport(httpx.AsyncBaseTransport):
+    """Applies an ``Upstream``'s rate limit, breaker and retries around *inner*."""
+
+    def __init__(self, inner: httpx.AsyncBaseTransport, upstream: Upstream):
+        self.inner = inner
+        self.upstream = upstream
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        up = self.upstream
+        idempotent = request.method in IDEMPOTENT_METHODS
+        retryable = up.policy.retry_all_methods or idempotent
+        attempts = settings.RETRY_MAX_ATTEMPTS if retryable else 1
+        deadline = time.monotonic() + up.policy.deadline_s if up.policy.deadline_s else None
+        attempt = 0
+        while True:
+            if not up.breaker.allow():
+                raise CircuitOpenError(f"{up.host} circuit open — failing fast", request=request)
+            last = attempt >= attempts - 1
+            try:
+                if up.bucket is not None:
+                    await up.bucket.acquire()
+                response = await self._attempt(request, deadline)
+            except httpx.TransportError as e:
+                up.breaker.record_failure()
+                # A request that may have reached the upstream is only resent if idempotent.
+                sent = not isinstance(e, (httpx.ConnectError, httpx.ConnectTimeout))
+                if last or (sent and not idempotent) or self._expired(deadline):
+                    raise
+                await self._backoff(attempt, None, deadline)
+                attempt += 1
+                continue
+            except BaseException:
+                # Cancelled or broken mid-call: no verdict on the upstream.
+                up.breaker.abandon()
+                raise
+
+            status = response.status_code
+            if up.policy.error_envelope and status == 200:
+                status = await _envelope_status(response)
+            if status >= 500:
+                up.breaker.record_failure()
+            else:
+                up.breaker.record_success()
+            if up.bucket is not None:
+                if status == 429:
+                    up.bucket.on_throttled(_retry_after(response))
+                elif status < 400:
+                    up.bucket.on_success()
+
+            if status not in RETRY_STATUSES or last or self._expired(deadline):
+                return response
+            await response.aclose()
+            await self._backoff(attempt, _retry_after(response), deadline)
+            attempt += 1
+
+    async def _attempt(self, request: httpx.Request, deadline: float | None) -> httpx.Response:
+        """One try, bounded by the per-attempt timeout and what's left of *deadline*."""
+        limits = [self.upstream.policy.attempt_timeout_s]
+        if deadline is not None:
+            limits.append(deadline - time.monotonic())
+        limits = [t for t in limits if t is not None]
+        if not limits:
+            return await self.inner.handle_async_request(request)
+        timeout = max(0.0, min(limits))
+        try:
+            return await asyncio.wait_for(self.inner.handle_async_request(request), timeout)
+        except asyncio.TimeoutError:
+            self.upstream.timeouts += 1
+            raise httpx.ReadTimeout(
+                f"{self.upstream.host} gave no response within {timeout:.1f}s", request=request
+            ) from None
+
+    @staticmethod
+    def _expired(deadline: float | None) -> bool:
+        return deadline is not None and time.monotonic() >= deadline
+
+    async def _backoff(self, attempt: int, retry_after: float | None, deadline: float | None = None):
+        self.upstream.retries += 1
+        # "Full jitter" exponential backoff, unless the upstream named a delay.
+        ceiling = min(settings.RETRY_MAX_DELAY_S, settings.RETRY_BASE_DELAY_S * 2 ** attempt)
+        delay = retry_after if retry_after is not None else random.uniform(0, ceiling)
+        delay = min(delay, settings.RETRY_MAX_DELAY_S)
+        if deadline is not None:
+            delay = min(delay, max(0.0, deadline - time.monotonic()))
+        await asyncio.sleep(delay)
+
+    async def aclose(self):
+        await self.inner.aclose()
+
+
+async def _envelope_status(response: httpx.Response) -> int:
+    """The status a ``200`` body claims: its ``{"error": {"code": ...}}``, if any."""
+    body = await response.aread()
+    if not _ERROR_ENVELOPE_RE.match(body[:64]):
+        return response.status_code
+    try:
+        code = json.loads(body)["error"].get("code")
+    except (ValueError, TypeError, AttributeError):
+        return response.status_code
+    # An error without a usable code is still a failed call.
+    return code if isinstance(code, int) and 400 <= code < 600 else 500
+
+
+def _retry_after(response: httpx.Response) -> float | None:
+    try:
+        return float(response.headers["retry-after"])
+    except (KeyError, ValueError):
+        return None
@@ -0,0 +1,171 @@
+"""
+Route Optimiser
+===============
+In-process travelling-salesman solver used when the Esri Routing API is
+unavailable or unnecessary (short walking tours).
+
+Builds a vectorised haversine distance matrix, seeds a visit order with
+nearest-neighbour, then improves it with 2-opt and Or-opt moves.  Tours
+are open paths that start at the first stop and may end anywhere, which
+matches how walking tours are actually taken.
+"""
+
+import numpy as np
+
+EARTH_RADIUS_M = 6_371_008.8
+METRES_PER_MILE = 1609.344
+
+# Straight-line → street-network distance ("circuity") factor.
+DETOUR_FACTOR = 1.3
+
+# Average door-to-door speeds per ``transport_mode`` (km/h).
+TRAVEL_SPEEDS_KMH = {
+    "walking": 4.8,
+    "transit": 18.0,
+    "driving": 30.0,
+}
+
+
+def haversine_matrix(lats, lngs) -> np.ndarray:
+    """Pairwise great-circle distances in metres, as an ``(n, n)`` array."""
+    return haversine_cross(lats, lngs, lats, lngs)
+
+
+def haversine_cross(lats_a, lngs_a, lats_b, lngs_b) -> np.ndarray:
+    """Great-circle metres from each point of *a* to each of *b*, ``(len(a), len(b))``."""
+    lat_a = np.radians(np.asarray(lats_a, dtype=np.float64))
+    lng_a = np.radians(np.asarray(lngs_a, dtype=np.float64))
+    lat_b = np.radians(np.asarray(lats_b, dtype=np.float64))
+    lng_b = np.radians(np.asarray(lngs_b, dtype=np.float64))
+    dlat = lat_a[:, None] - lat_b[None, :]
+    dlng = lng_a[:, None] - lng_b[None, :]
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat_a)[:, None] * np.cos(lat_b)[None, :] * np.sin(dlng / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def path_length(dist: np.ndarray, order: list[int]) -> float:
+    """Total length of an open path visiting *order*."""
+    if len(order) < 2:
+        return 0.0
+    idx = np.asarray(order)
+    return float(dist[idx[:-1], idx[1:]].sum())
+
+
+def solve_open_path(dist: np.ndarray, start: int = 0, max_rounds: int = 50) -> list[int]:
+    """Short open path over every node of *dist*, beginning at *start*."""
+    n = len(dist)
+    if n <= 2:
+        return list(range(n)) if start == 0 else [start] + [i for i in range(n) if i != start]
+    order = _nearest_neighbour(dist, start)
+    # A zero-cost dummy node appended to the path turns the open-path
+    # 2-opt into the classic closed-tour move with a fixed endpoint.
+    padded = np.zeros((n + 1, n + 1), dtype=np.float64)
+    padded[:n, :n] = dist
+    rows = dist.tolist()
+    for _ in range(max_rounds):
+        improved = _two_opt(padded, order)
+        if not _or_opt(rows, order) and not improved:
+            break
+    return order
+
+
+def travel_time_min(distance_m: float, transport_mode: str = "walking") -> float:
+    """Estimate door-to-door minutes for *distance_m* of straight-line travel."""
+    speed = TRAVEL_SPEEDS_KMH.get(transport_mode, TRAVEL_SPEEDS_KMH["walking"])
+    return distance_m * DETOUR_FACTOR / 1000 / speed * 60
+
+
+# ── Heuristics ───────────────────────────────────────────────────────
+
+
+def _nearest_neighbour(dist: np.ndarray, start: int) -> list[int]:
+    n = len(dist)
+    visited = np.zeros(n, dtype=bool)
+    order = [start]
+    visited[start] = True
+    for _ in range(n - 1):
+        row = np.where(visited, np.inf, dist[order[-1]])
+        nxt = int(row.argmin())
+        order.append(nxt)
+        visited[nxt] = True
+    return order
+
+
+def _two_opt(padded: np.ndarray, order: list[int]) -> bool:
+    """Apply best-improvement 2-opt moves in place until none remain."""
+    improved = False
+    n = len(order)
+    dummy = len(padded) - 1
+    while True:
+        path = np.asarray(order + [dummy])
+        # Reversing path[i..j] (1 <= i < j <= n-1) replaces edges
+        # (a,b) and (c,e) with (a,c) and (b,e), where
+        # a = path[i-1], b = path[i], c = path[j], e = path[j+1].
+        a, b = path[:n - 1], path[1:n]
+        c, e = path[1:n], path[2:n + 1]
+        delta = (
+            padded[a[:, None], c[None, :]]
+            + padded[b[:, None], e[None, :]]
+            - padded[a, b][:, None]
+            - padded[c, e][None, :]
+        )
+        delta = np.triu(delta, k=1)
+        i, j = np.unravel_index(delta.argmin(), delta.shape)
+        if delta[i, j] >= -1e-9:
+            return improved
+        i, j = i + 1, j + 1
+        order[i:j + 1] = order[i:j + 1][::-1]
+        improved = True
+
+
+def _or_opt(dist: list[list[float]], order: list[int]) -> bool:
+    """Relocate segments of 1–3 stops to a cheaper position (first improvement)."""
+    improved = False
+    n = len(order)
+    restart = True
+    while restart:
+        restart = False
+        for seg_len in (1, 2, 3):
+            for i in range(1, n - seg_len + 1):
+                end = i + seg_len - 1
+                first, last, prev = order[i], order[end], order[i - 1]
+                nxt = order[end + 1] if end + 1 < n else None
+                d_first, d_last = dist[first], dist[last]
+                removed = dist[prev][first]
+                if nxt is not None:
+                    removed += d_last[nxt] - dist[prev][nxt]
+                best_gain, best_k, best_rev = 1e-9, None, False
+                # Candidate edges (order[k], order[k+1]) not touching the segment.
+                for k in range(n - 1):
+                    if i - 1 <= k <= end:
+                        continue
+                    u, v = order[k], order[k + 1]
+                    d_u, d_uv = dist[u], dist[u][v]
+                    gain = removed - (d_u[first] + d_last[v] - d_uv)
+                    if gain > best_gain:
+                        best_gain, best_k, best_rev = gain, k, False
+                    gain = removed - (d_u[last] + d_first[v] - d_uv)
+                    if gain > best_gain:
+                        best_gain, best_k, best_rev = gain, k, True
+                if nxt is not None:
+                    # Append after the current final stop.
+                    d_tail = dist[order[-1]]
+                    for gain, rev in ((removed - d_tail[first], False), (removed - d_tail[last], True)):
+                        if gain > best_gain:
+                            best_gain, best_k, best_rev = gain, n - 1, rev
+                if best_k is None:
+                    continue
+                seg = order[i:end + 1]
+                if best_rev:
+                    seg.reverse()
+                head = order[:best_k + 1]
+                tail = order[best_k + 1:]
+                if best_k < i:
+                    order[:] = head + seg + tail[: i - best_k - 1] + tail[end - best_k:]
+                else:
+                    order[:] = order[:i] + order[end + 1:best_k + 1] + seg + tail
+                improved = restart = True
+                break
+            if restart:
+                break
+    return improved
@@ -1,49 +1,159 @@
 """
 Route Service
 =============
-Builds optimised routes between POI stops using the Esri Routing API.
+Builds optimised routes between POI stops using the Esri Routing API,
+or the in-process optimiser in ``route_optimiser`` when the network
+isn't needed (or isn't available).
+
+Esri solves are cached on the order-invariant set of (rounded) stop
+coordinates plus travel mode, so the same stops in any order never hit
+the solver twice — concurrent requests for one stop set share a single
+in-flight solve.
 """
 
-import httpx
+import logging
+
+import numpy as np
+
 from app.config import settings
+from app.data.cache import TieredCache, build_cache
+from app.services import route_optimiser
+from app.services.distance_matrix import DistanceMatrixCache
+from app.services.http_pool import HTTPClientPool
+from app.services.singleflight import SingleFlight
+
+log = logging.getLogger(__name__)
 
 ARCGIS_ROUTE_URL = (
     "https://route-api.arcgis.com/arcgis/rest/services/"
     "World/Route/NAServer/Route_World/solve"
 )
 
+# ``optimise`` modes:
+#   esri  — always call the Esri solver (local optimiser on failure)
+#   local — never touch the network
+#   auto  — local for short walking tours / no API key / no directions needed
+ROUTE_MODES = ("auto", "esri", "local")
 
-class RouteService:
-    """Async route-optimisation via ArcGIS Routing."""
+# Stop coordinates are rounded to this many decimals (≈1 m) for cache keys.
+ROUTE_KEY_DECIMALS = 5
+
+
+class RouteCacheStats:
+    """Esri solve cache hits versus solver calls."""
 
     def __init__(self):
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+        }
+
+
+class RouteService:
+    """Async route-optimisation via ArcGIS Routing or a local TSP solver."""
+
+    def __init__(
+        self,
+        http: HTTPClientPool | None = None,
+        matrices: DistanceMatrixCache | None = None,
+        route_cache: TieredCache | None = None,
+    ):
         self.api_key = settings.ARCGIS_API_KEY
-        self._client = httpx.AsyncClient(timeout=30)
+        self._owns_http = http is None
+        self._http = http or HTTPClientPool()
+        # Precomputed city matrices; stops outside them are measured on the fly.
+        self.matrices = matrices
+        self.route_cache = route_cache or build_cache(
+            "route", settings.ROUTE_CACHE_SIZE, settings.ROUTE_CACHE_TTL_S
+        )
+        self.cache_stats = RouteCacheStats()
+        self._flight = SingleFlight(result_ttl=0)
 
-    async def optimise(self, pois: list[dict]) -> dict | None:
+    def stats(self) -> dict:
+        return {
+            **self.cache_stats.stats(),
+            "cache": self.route_cache.stats(),
+            "in_flight": self._flight.stats(),
+        }
+
+    async def optimise(
+        self,
+        pois: list[dict],
+        mode: str | None = None,
+        transport_mode: str = "walking",
+        need_directions: bool = False,
+        city: str | None = None,
+    ) -> dict | None:
         """
         Given a list of POI dicts (each with 'location': {lat, lng}),
-        call the Esri Routing API and return the optimised route.
+        return the optimised route.  ``route["sequence"]`` lists the
+        indices of *pois* in visiting order.  With *city*, local solves
+        read distances from that city's precomputed matrix.  A local
+        solve standing in for an Esri one that failed (or whose circuit
+        is open) is marked ``route["fallback"] = True``.
         """
-        if len(pois) < 2:
-            return self._fallback_route(pois)
+        mode = mode or settings.ROUTE_MODE
+        if mode not in ROUTE_MODES:
+            raise ValueError(f"Unknown route mode {mode!r}; expected one of {ROUTE_MODES}")
 
-        stops = ";".join(
-            f"{p['location']['lng']},{p['location']['lat']}" for p in pois
-        )
+        if len(pois) < 2 or mode == "local" or not self.api_key:
+            return self._local_route(pois, transport_mode, city)
+        if not self._http.available(ARCGIS_ROUTE_URL):  # circuit open: fail fast
+            return {**self._local_route(pois, transport_mode, city), "fallback": True}
+
+        if mode == "auto" and not need_directions:
+            local = self._local_route(pois, transport_mode, city)
+            if (
+                transport_mode == "walking"
+                and local["total_distance_miles"] <= settings.ROUTE_LOCAL_MAX_MILES
+            ):
+                return local
+
+        canonical, key = self._route_key(pois, transport_mode, need_directions)
+        # Cached and in-flight solves are in canonical stop order; map back.
+        cached = self.route_cache.get(key)
+        if cached is not None:
+            self.cache_stats.hits += 1
+            return {**cached, "sequence": [canonical[r] for r in cached["sequence"]]}
+        self.cache_stats.misses += 1
+
+        async def solve() -> dict:
+            route = await self._esri_route([pois[i] for i in canonical], transport_mode, city)
+            if route["source"] == "esri":
+                # Local fallbacks aren't cached so the next request retries Esri.
+                self.route_cache.set(key, route)
+            return route
+
+        # Concurrent requests for the same stop set share one solve.
+        route = await self._flight.do(key, solve)
+        return {**route, "sequence": [canonical[r] for r in route["sequence"]]}
+
+    async def _esri_route(self, pois: list[dict], transport_mode: str, city: str | None) -> dict:
+        stops = ";".join(f"{lng},{lat}" for lat, lng in self._coordinates(pois).tolist())
 
         params = {
             "f": "json",
             "token": self.api_key,
             "stops": stops,
             "findBestSequence": "true",
+            # Let Esri pick both endpoints too, so the solve depends only on
+            # the stop set — which is what the route cache is keyed on.
+            "preserveFirstStop": "false",
+            "preserveLastStop": "false",
             "returnDirections": "true",
             "returnRoutes": "true",
+            "returnStops": "true",
             "directionsLanguage": "en",
         }
 
         try:
-            resp = await self._client.get(ARCGIS_ROUTE_URL, params=params)
+            resp = await self._http.get(ARCGIS_ROUTE_URL, params=params)
             data = resp.json()
             routes = data.get("routes", {}).get("features", [])
             directions = data.get("directions", [])
@@ -56,14 +166,33 @@ class RouteService:
                     "directions": self._parse_directions(directions),
                     "center": self._compute_center(pois),
                     "geometry": routes[0].get("geometry"),
+                    "sequence": self._parse_sequence(data.get("stops", {}), len(pois)),
+                    "source": "esri",
                 }
         except Exception as e:
-            print(f"⚠️  Route API error: {e}")
+            log.warning(f"⚠️  Route API error: {e}")
 
-        return self._fallback_route(pois)
+        return {**self._local_route(pois, transport_mode, city), "fallback": True}
 
     # ── Helpers ──────────────────────────────────────────────────────
 
+    @staticmethod
+    def _route_key(
+        pois: list[dict], transport_mode: str, need_directions: bool
+    ) -> tuple[list[int], str]:
+        """
+        ``(canonical, key)``: *canonical* lists input indices sorted by
+        rounded coordinate, and *key* names that stop set + travel mode.
+        """
+        coords = [
+            f"{round(p['location']['lat'], ROUTE_KEY_DECIMALS)},"
+            f"{round(p['location']['lng'], ROUTE_KEY_DECIMALS)}"
+            for p in pois
+        ]
+        canonical = sorted(range(len(pois)), key=coords.__getitem__)
+        stops = ";".join(coords[i] for i in canonical)
+        return canonical, f"{transport_mode}|{int(need_directions)}|{stops}"
+
     @staticmethod
     def _parse_directions(directions: list) -> list[str]:
         steps: list[str] = []
@@ -75,26 +204,71 @@ class RouteService:
         return steps
 
     @staticmethod
-    def _compute_center(pois: list[dict]) -> dict:
-        lats = [p["location"]["lat"] for p in pois]
-        lngs = [p["location"]["lng"] for p in pois]
-        return {
-            "lat": sum(lats) / len(lats),
-            "lng": sum(lngs) / len(lngs),
-        }
+    def _parse_sequence(stops: dict, count: int) -> list[int]:
+        """Map Esri's per-stop ``Sequence`` back to input indices."""
+        ranked = sorted(
+            (f["attributes"]["Sequence"], f["attributes"]["ObjectID"] - 1)
+            for f in stops.get("features", [])
+            if "Sequence" in f.get("attributes", {})
+        )
+        sequence = [idx for _, idx in ranked]
+        return sequence if sorted(sequence) == list(range(count)) else list(range(count))
+
+    @staticmethod
+    def _coordinates(pois: list[dict]) -> np.ndarray:
+        """``(n, 2)`` array of (lat, lng), read from the POI dicts once."""
+        return np.array(
+            [(p["location"]["lat"], p["location"]["lng"]) for p in pois], dtype=np.float64
+        ).reshape(-1, 2)
 
     @staticmethod
-    def _fallback_route(pois: list[dict]) -> dict:
-        """Return a basic route object when the API isn't available."""
+    def _compute_center(pois: list[dict], coords: np.ndarray | None = None) -> dict:
+        lat, lng = (RouteService._coordinates(pois) if coords is None else coords).mean(axis=0)
+        return {"lat": float(lat), "lng": float(lng)}
+
+    def _distances(self, pois: list[dict], city: str | None, coords: np.ndarray) -> np.ndarray:
+        if city and self.matrices is not None:
+            dist = self.matrices.submatrix(city, pois)
+            if dist is not None:
+                return dist
+        return route_optimiser.haversine_matrix(coords[:, 0], coords[:, 1])
+
+    def _local_route(
+        self, pois: list[dict], transport_mode: str = "walking", city: str | None = None
+    ) -> dict:
+        """Solve the visiting order in-process with straight-line estimates."""
         if not pois:
-            return {"total_distance_miles": 0, "total_time_min": 0, "directions": [], "center": None}
-        center = RouteService._compute_center(pois)
+            return {
+                "total_distance_miles": 0, "total_time_min": 0, "directions": [],
+                "center": None, "sequence": [], "source": "local",
+            }
+        coords = self._coordinates(pois)
+        dist = self._distances(pois, city, coords)
+        order = route_optimiser.solve_open_path(dist)
+
+        directions = []
+        for a, b in zip(order, order[1:]):
+            leg_miles = dist[a, b] * route_optimiser.DETOUR_FACTOR / route_optimiser.METRES_PER_MILE
+            directions.append(
+                f"Head to {pois[b].get('name', 'the next stop')} (~{leg_miles:.2f} mi)"
+            )
+
+        total_m = route_optimiser.path_length(dist, order)
         return {
-            "total_distance_miles": 0,
-            "total_time_min": 0,
-            "directions": ["Route calculation requires an ArcGIS API key."],
-            "center": center,
+            "total_distance_miles": round(
+                total_m * route_optimiser.DETOUR_FACTOR / route_optimiser.METRES_PER_MILE, 2
+            ),
+            "total_time_min": round(route_optimiser.travel_time_min(total_m, transport_mode), 1),
+            "directions": directions,
+            "center": RouteService._compute_center(pois, coords),
+            "geometry": {
+                "paths": [coords[order][:, ::-1].tolist()],
+                "spatialReference": {"wkid": 4326},
+            },
+            "sequence": order,
+            "source": "local",
         }
 
     async def close(self):
-        await self._client.aclose()
+        if self._owns_http:
+            await self._http.aclose()
@@ -0,0 +1,64 @@
+"""
+Single-flight
+=============
+Coalesces identical concurrent calls: the first caller for a key runs
+the work, everyone else arriving while it is in flight awaits the same
+result, and a short-lived result cache absorbs the stragglers.
+"""
+
+import asyncio
+from typing import Any, Awaitable, Callable
+
+from app.data.cache import LRUCache
+
+
+class SingleFlight:
+    """Per-key in-flight deduplication with a short TTL result cache."""
+
+    def __init__(self, result_ttl: float = 30, maxsize: int = 512):
+        self._inflight: dict[str, asyncio.Task] = {}
+        self._results = LRUCache(maxsize=maxsize, ttl=result_ttl) if result_ttl > 0 else None
+        self.executed = 0
+        self.coalesced = 0
+        self.cache_hits = 0
+        self.errors = 0
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """Return ``await fn()``, sharing one execution per *key*."""
+        if self._results is not None:
+            cached = self._results.get(key)
+            if cached is not None:
+                self.cache_hits += 1
+                return cached
+
+        task = self._inflight.get(key)
+        if task is None:
+            # Run as its own task so one caller disconnecting doesn't
+            # cancel the work everyone else is waiting on.
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._finish(key, t))
+            self.executed += 1
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+    def _finish(self, key: str, task: asyncio.Task):
+        self._inflight.pop(key, None)
+        if task.cancelled():
+            return
+        if task.exception() is not None:
+            self.errors += 1
+        elif self._results is not None:
+            self._results.set(key, task.result())
+
+    def stats(self) -> dict:
+        served = self.executed + self.coalesced + self.cache_hits
+        return {
+            "executed": self.executed,
+            "coalesced": self.coalesced,
+            "cache_hits": self.cache_hits,
+            "errors": self.errors,
+            "in_flight": len(self._inflight),
+            "dedup_rate": round(1 - self.executed / served, 3) if served else 0.0,
+        }
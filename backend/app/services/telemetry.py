@@ -0,0 +1,215 @@
+"""
+Telemetry
+=========
+Request-scoped IDs, per-stage timing spans and Prometheus metrics,
+without any extra dependency.
+
+  • ``span(stage)``      — times a block into ``geoexplore_stage_seconds``
+                           and counts failures; nests freely
+  • ``@traced(stage)``   — the same around a whole coroutine function
+  • ``request_id_var``   — set per inbound request by
+                           ``app.api.middleware.RequestContextMiddleware``
+                           and stamped on every log record
+  • ``REGISTRY.render()``— Prometheus text exposition for ``GET /metrics``
+
+Everything here is a few dict lookups and additions per observation, so
+it is cheap enough to leave on in the hot path.
+"""
+
+import bisect
+import contextvars
+import functools
+import logging
+import time
+from contextlib import contextmanager
+
+request_id_var: contextvars.ContextVar[str] = contextvars.ContextVar("request_id", default="-")
+
+# Seconds; wide enough for sub-millisecond cache hits up to slow LLM calls.
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+# ── Metric primitives ────────────────────────────────────────────────
+
+
+class Counter:
+    """Monotonic counter with optional labels."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._values: dict[tuple[str, ...], float] = {}
+
+    def inc(self, *labels: str, amount: float = 1):
+        self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def value(self, *labels: str) -> float:
+        return self._values.get(labels, 0.0)
+
+    def samples(self):
+        for labels, value in self._values.items():
+            yield self.name + "_total", labels, value
+
+
+class Histogram:
+    """Cumulative-bucket histogram with optional labels."""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = tuple(sorted(buckets))
+        # labels → [per-bucket counts (+Inf last), sum]
+        self._series: dict[tuple[str, ...], list] = {}
+
+    def observe(self, value: float, *labels: str):
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+        series[0][bisect.bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    def count(self, *labels: str) -> int:
+        series = self._series.get(labels)
+        return sum(series[0]) if series else 0
+
+    def samples(self):
+        for labels, (counts, total) in self._series.items():
+            running = 0
+            for bound, n in zip(self.buckets + (float("inf"),), counts):
+                running += n
+                yield self.name + "_bucket", labels + (_format_bound(bound),), running
+            yield self.name + "_sum", labels, total
+            yield self.name + "_count", labels, running
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: list[Counter | Histogram] = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        """Prometheus text exposition format (version 0.0.4)."""
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in metric.samples():
+                names = metric.labelnames + (("le",) if name.endswith("_bucket") else ())
+                lines.append(f"{name}{_format_labels(names, labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+def _format_bound(bound: float) -> str:
+    return "+Inf" if bound == float("inf") else repr(float(bound))
+
+
+def _format_labels(names: tuple[str, ...], values: tuple[str, ...]) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in zip(names, values)) + "}"
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+# ── Metrics ──────────────────────────────────────────────────────────
+
+REGISTRY = Registry()
+
+HTTP_REQUEST_SECONDS = REGISTRY.register(Histogram(
+    "geoexplore_http_request_seconds",
+    "Inbound API request latency.",
+    ("method", "route", "status"),
+))
+STAGE_SECONDS = REGISTRY.register(Histogram(
+    "geoexplore_stage_seconds",
+    "Time spent in each tour pipeline stage.",
+    ("stage",),
+))
+STAGE_ERRORS = REGISTRY.register(Counter(
+    "geoexplore_stage_errors",
+    "Pipeline stages that raised.",
+    ("stage",),
+))
+UPSTREAM_SECONDS = REGISTRY.register(Histogram(
+    "geoexplore_upstream_request_seconds",
+    "Outbound HTTP attempts (to response headers), by host and status.",
+    ("host", "method", "status"),
+))
+LLM_TOKENS = REGISTRY.register(Counter(
+    "geoexplore_llm_tokens",
+    "LLM tokens by kind (prompt, completion).",
+    ("model", "kind"),
+))
+
+
+# ── Spans & logging ──────────────────────────────────────────────────
+
+
+@contextmanager
+def span(stage: str):
+    """Time the enclosed block as *stage*; failures are counted and re-raised."""
+    started = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        STAGE_ERRORS.inc(stage)
+        raise
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - started, stage)
+
+
+def traced(stage: str):
+    """Decorator: run a coroutine function inside ``span(stage)``."""
+
+    def decorate(fn):
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            with span(stage):
+                return await fn(*args, **kwargs)
+
+        return wrapper
+
+    return decorate
+
+
+class RequestIdFilter(logging.Filter):
+    """Adds ``record.request_id`` from the current request context."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id_var.get()
+        return True
+
+
+def configure_logging(level: int = logging.INFO):
+    """Log ``app.*`` records with the request id; safe to call repeatedly."""
+    logger = logging.getLogger("app")
+    if any(isinstance(f, RequestIdFilter) for h in logger.handlers for f in h.filters):
+        return
+    handler = logging.StreamHandler()
+    handler.addFilter(RequestIdFilter())
+    handler.setFormatter(logging.Formatter(
+        "%(asctime)s %(levelname)s [%(request_id)s] %(name)s: %(message)s"
+    ))
+    logger.addHandler(handler)
+    logger.setLevel(level)
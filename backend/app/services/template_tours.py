@@ -0,0 +1,130 @@
+"""
+Template Tours
+==============
+Finished tours for every ``TOUR_TEMPLATES`` entry, built ahead of time
+so ``GET /api/tours/templates/{id}/tour`` never geocodes, routes or
+calls the LLM on the request path.
+
+Each built tour is stored (in the ``template_tour`` cache namespace,
+so it survives restarts when ``DATABASE_URL`` is SQLite) next to a
+fingerprint of the template it came from.  A refresh rebuilds only the
+templates whose content changed — or that have never been built — and
+drops tours for templates that no longer exist.  Degraded builds
+(placeholder narratives, fallback route) are never stored: they are
+served only while nothing better exists and retried on every refresh.
+
+Run with the server (``TEMPLATE_TOURS_REFRESH_INTERVAL_S``) or once via
+``TemplateMaterialiser.refresh()``.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import time
+
+from app.config import settings
+from app.data.cache import TieredCache, build_cache
+from app.data.catalogue import PreparedJSON, get_catalogue
+
+log = logging.getLogger(__name__)
+
+# Bump when the shape of a built tour changes, to rebuild every template.
+TOUR_FORMAT_VERSION = 1
+
+
+def template_fingerprint(template: dict) -> str:
+    """Content hash of a template (plus ``TOUR_FORMAT_VERSION``)."""
+    payload = json.dumps([TOUR_FORMAT_VERSION, template], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class TemplateMaterialiser:
+    """Builds, stores and serves one finished ``schemas.Tour`` per template."""
+
+    def __init__(self, agent, store: TieredCache | None = None, concurrency: int | None = None):
+        self.agent = agent
+        self.store = store or build_cache("template_tour", settings.TEMPLATE_TOURS_CACHE_SIZE, None)
+        self.concurrency = concurrency or settings.TEMPLATE_TOURS_CONCURRENCY
+        # template id → (fingerprint, prepared response); no fingerprint for degraded builds
+        self._tours: dict[str, tuple[str | None, PreparedJSON]] = {}
+        self.builds = 0
+        self.failures = 0
+        self.degraded = 0
+        self.last_refresh: float | None = None
+
+    def get(self, template_id: str) -> PreparedJSON | None:
+        """The prepared tour for *template_id*, if it has been built."""
+        entry = self._tours.get(template_id)
+        return entry[1] if entry else None
+
+    async def refresh(self, templates: list[dict] | None = None) -> dict[str, int]:
+        """Rebuild changed/missing/degraded templates; returns build/reuse/failure counts."""
+        if templates is None:
+            templates = list(get_catalogue().templates_by_id.values())
+        counts = {"built": 0, "unchanged": 0, "degraded": 0, "failed": 0, "removed": 0}
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def ensure(template: dict):
+            fingerprint = template_fingerprint(template)
+            current = self._tours.get(template["id"])
+            if current is not None and current[0] == fingerprint:
+                counts["unchanged"] += 1
+                return
+            stored = self.store.get(template["id"])
+            if stored is not None and stored["fingerprint"] == fingerprint:
+                self._tours[template["id"]] = (fingerprint, PreparedJSON(stored["tour"]))
+                counts["unchanged"] += 1
+                return
+            async with semaphore:
+                try:
+                    tour, degraded = await self.agent.materialise_template(template)
+                except Exception as e:
+                    # Keep serving the previous build, if any, until one succeeds.
+                    log.warning(f"⚠️  Template tour {template['id']!r} failed to build: {e}")
+                    self.failures += 1
+                    counts["failed"] += 1
+                    return
+            if degraded:
+                log.warning(f"⚠️  Template tour {template['id']!r} built degraded; will retry")
+                self.degraded += 1
+                counts["degraded"] += 1
+                # No fingerprint, so the next refresh rebuilds it; a previous
+                # complete build keeps being served meanwhile.
+                if current is None or current[0] is None:
+                    self._tours[template["id"]] = (None, PreparedJSON(tour))
+                return
+            self.store.set(template["id"], {"fingerprint": fingerprint, "tour": tour})
+            self._tours[template["id"]] = (fingerprint, PreparedJSON(tour))
+            self.builds += 1
+            counts["built"] += 1
+
+        await asyncio.gather(*(ensure(t) for t in templates))
+
+        live = {t["id"] for t in templates}
+        for template_id in [tid for tid in self._tours if tid not in live]:
+            del self._tours[template_id]
+            self.store.invalidate(template_id)
+            counts["removed"] += 1
+        self.last_refresh = time.time()
+        return counts
+
+    def stats(self) -> dict:
+        return {
+            "tours": len(self._tours),
+            "builds": self.builds,
+            "failures": self.failures,
+            "degraded": self.degraded,
+            "last_refresh": self.last_refresh,
+        }
+
+
+async def refresh_forever(materialiser: TemplateMaterialiser, interval: float):
+    """Background job: build template tours now, then re-check every *interval* seconds."""
+    while True:
+        try:
+            counts = await materialiser.refresh()
+            log.info(f"🗺️  Template tours: {counts['built']} built, {counts['unchanged']} unchanged")
+        except Exception as e:
+            log.warning(f"⚠️  Template tour refresh failed: {e}")
+        await asyncio.sleep(interval)
@@ -0,0 +1,243 @@
+"""
+Upstream Fakes
+==============
+Deterministic stand-ins for every upstream the backend talks to, served
+from one ``httpx.MockTransport`` so they plug straight into
+``HTTPClientPool(transport=...)``:
+
+  • ArcGIS geocoding   — ``findAddressCandidates`` / ``geocodeAddresses``
+  • ArcGIS routing     — ``solve`` (stops visited in the order given)
+  • Feature Service    — ``query`` (synthetic POIs inside the city bounds)
+  • OpenAI             — ``chat/completions``, plain and streamed
+
+Each endpoint sleeps for a configurable latency ± jitter drawn from a
+seeded RNG, so runs are repeatable.
+"""
+
+import asyncio
+import functools
+import json
+import random
+import re
+import time
+from dataclasses import dataclass, field
+
+import httpx
+
+from app.data.cities import SUPPORTED_CITIES
+
+FEATURE_SERVICE_URL = "https://services.arcgis.com/bench/arcgis/rest/services/POI/FeatureServer/0"
+
+# Synthetic POIs per (city, category) in the fake feature layer.
+FEATURES_PER_CATEGORY = 40
+
+
+@dataclass
+class Latency:
+    """Per-call delay: ``mean_ms`` ± uniform ``jitter_ms``."""
+
+    mean_ms: float = 0.0
+    jitter_ms: float = 0.0
+
+    def sample(self, rng: random.Random) -> float:
+        return max(0.0, self.mean_ms + rng.uniform(-self.jitter_ms, self.jitter_ms)) / 1000
+
+
+@dataclass
+class FakeProfile:
+    """Latency of each fake endpoint (plus per-token delay for streamed LLM replies)."""
+
+    geocode: Latency = field(default_factory=lambda: Latency(40, 10))
+    route: Latency = field(default_factory=lambda: Latency(250, 50))
+    features: Latency = field(default_factory=lambda: Latency(120, 30))
+    llm: Latency = field(default_factory=lambda: Latency(600, 150))
+    llm_token_ms: float = 5.0
+
+    @classmethod
+    def instant(cls) -> "FakeProfile":
+        return cls(Latency(), Latency(), Latency(), Latency(), 0.0)
+
+    def scaled(self, factor: float) -> "FakeProfile":
+        def s(lat: Latency) -> Latency:
+            return Latency(lat.mean_ms * factor, lat.jitter_ms * factor)
+
+        return FakeProfile(
+            s(self.geocode), s(self.route), s(self.features), s(self.llm), self.llm_token_ms * factor
+        )
+
+
+class FakeUpstreams:
+    """One transport answering for ArcGIS and OpenAI, with call counters."""
+
+    def __init__(self, profile: FakeProfile | None = None, seed: int = 7):
+        self.profile = profile or FakeProfile()
+        self._rng = random.Random(seed)
+        self.calls: dict[str, int] = {}
+        self.busy_s: dict[str, float] = {}
+
+    def transport(self) -> httpx.MockTransport:
+        return httpx.MockTransport(self.handle)
+
+    def stats(self) -> dict:
+        return {
+            name: {
+                "calls": n,
+                "mean_ms": round(self.busy_s[name] / n * 1000, 2) if n else 0.0,
+            }
+            for name, n in sorted(self.calls.items())
+        }
+
+    async def handle(self, request: httpx.Request) -> httpx.Response:
+        path = request.url.path
+        if path.endswith("/chat/completions"):
+            return await self._timed("llm", self.profile.llm, self._completion, request)
+        if path.endswith("/solve"):
+            return await self._timed("route", self.profile.route, self._solve, request)
+        if path.endswith("/query"):
+            return await self._timed("features", self.profile.features, self._query, request)
+        if "/GeocodeServer/" in path:
+            return await self._timed("geocode", self.profile.geocode, self._geocode, request)
+        return httpx.Response(404, json={"error": {"message": f"no fake for {path}"}})
+
+    async def _timed(self, name, latency: Latency, fn, request: httpx.Request) -> httpx.Response:
+        started = time.perf_counter()
+        await asyncio.sleep(latency.sample(self._rng))
+        response = fn(request)
+        self.calls[name] = self.calls.get(name, 0) + 1
+        self.busy_s[name] = self.busy_s.get(name, 0.0) + time.perf_counter() - started
+        return response
+
+    # ── ArcGIS ───────────────────────────────────────────────────────
+
+    @staticmethod
+    def _geocode(request: httpx.Request) -> httpx.Response:
+        if request.url.path.endswith("/geocodeAddresses"):
+            form = httpx.QueryParams(request.content.decode())
+            records = json.loads(form["addresses"])["records"]
+            return httpx.Response(200, json={"locations": [
+                {
+                    "attributes": {"ResultID": r["attributes"]["OBJECTID"]},
+                    "location": {"x": -74.0, "y": 40.7},
+                    "address": r["attributes"]["SingleLine"],
+                    "score": 100,
+                }
+                for r in records
+            ]})
+        address = request.url.params.get("singleLine", "")
+        return httpx.Response(200, json={"candidates": [
+            {"location": {"x": -74.0, "y": 40.7}, "address": address, "score": 100}
+        ]})
+
+    @staticmethod
+    def _solve(request: httpx.Request) -> httpx.Response:
+        stops = request.url.params["stops"].split(";")
+        coords = [tuple(map(float, s.split(","))) for s in stops]
+        return httpx.Response(200, json={
+            "routes": {"features": [{
+                "attributes": {"Total_Miles": 0.6 * (len(stops) - 1), "Total_TravelTime": 12.0 * (len(stops) - 1)},
+                "geometry": {"paths": [[list(c) for c in coords]]},
+            }]},
+            "directions": [{"features": [
+                {"attributes": {"text": f"Continue to stop {i + 1}"}} for i in range(1, len(stops))
+            ]}],
+            "stops": {"features": [
+                {"attributes": {"ObjectID": i + 1, "Sequence": i + 1}} for i in range(len(stops))
+            ]},
+        })
+
+    @staticmethod
+    def _query(request: httpx.Request) -> httpx.Response:
+        params = request.url.params
+        label = re.search(r"= '([^']*)'", params.get("where", ""))
+        label = label.group(1).replace("''", "'") if label else "Landmarks and Monuments"
+        bounds = [float(v) for v in params.get("geometry", "-74.26,40.49,-73.70,40.92").split(",")]
+        city = next(
+            (cid for cid, c in SUPPORTED_CITIES.items()
+             if abs(c["bounds"]["west"] - bounds[0]) < 1e-6 and abs(c["bounds"]["south"] - bounds[1]) < 1e-6),
+            "nyc",
+        )
+        features = _layer(city, label)
+        if params.get("returnCountOnly") == "true":
+            return httpx.Response(200, json={"count": len(features)})
+        offset = int(params.get("resultOffset", 0))
+        count = int(params.get("resultRecordCount", len(features)))
+        page = features[offset:offset + count]
+        return httpx.Response(200, json={
+            "features": page,
+            "exceededTransferLimit": offset + len(page) < len(features),
+        })
+
+    # ── OpenAI ───────────────────────────────────────────────────────
+
+    def _completion(self, request: httpx.Request) -> httpx.Response:
+        body = json.loads(request.content)
+        prompt = body["messages"][-1]["content"]
+        content = _intent_reply(prompt) if "Return ONLY valid JSON" in prompt else _narrative_reply(prompt)
+        if not body.get("stream"):
+            return httpx.Response(200, json={
+                "id": "chatcmpl-bench", "object": "chat.completion", "created": 0,
+                "model": body.get("model", "bench"),
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": content},
+                             "finish_reason": "stop"}],
+                "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+            })
+        return httpx.Response(
+            200,
+            headers={"content-type": "text/event-stream"},
+            content=self._sse_chunks(content, body.get("model", "bench")),
+        )
+
+    async def _sse_chunks(self, content: str, model: str):
+        # Roughly one "token" per word, each after llm_token_ms.
+        for token in re.findall(r"\S+\s*|\s+", content):
+            if self.profile.llm_token_ms:
+                await asyncio.sleep(self.profile.llm_token_ms / 1000)
+            chunk = {
+                "id": "chatcmpl-bench", "object": "chat.completion.chunk", "created": 0, "model": model,
+                "choices": [{"index": 0, "delta": {"content": token}, "finish_reason": None}],
+            }
+            yield f"data: {json.dumps(chunk)}\n\n".encode()
+        yield b"data: [DONE]\n\n"
+
+
+@functools.lru_cache(maxsize=None)
+def _layer(city: str, label: str) -> list[dict]:
+    """Deterministic synthetic features for one (city, category label)."""
+    b = SUPPORTED_CITIES[city]["bounds"]
+    rng = random.Random(f"{city}/{label}")
+    return [
+        {
+            "attributes": {
+                "OBJECTID": i + 1,
+                "Name": f"{label} {i + 1}",
+                "Address": f"{i + 1} Bench St",
+                "Description": f"Synthetic {label.lower()} #{i + 1}.",
+                "EditDate": 1_700_000_000_000,
+            },
+            "geometry": {
+                "x": rng.uniform(b["west"], b["east"]),
+                "y": rng.uniform(b["south"], b["north"]),
+            },
+        }
+        for i in range(FEATURES_PER_CATEGORY)
+    ]
+
+
+def _intent_reply(prompt: str) -> str:
+    return json.dumps({
+        "tour_type": "general",
+        "categories": ["landmarks", "museums"],
+        "num_stops": 5,
+        "time_budget_min": None,
+        "accessibility": None,
+        "transport_mode": "walking",
+    })
+
+
+def _narrative_reply(prompt: str) -> str:
+    stops = re.findall(r"^(\d+)\. (.+?) \(", prompt, re.MULTILINE)
+    return "".join(
+        f"### {n}. {name}\n{name} is a stop worth lingering at: a short story, "
+        f"a surprising fact and a tip on what to look for. Spend about 30 minutes here.\n\n"
+        for n, name in stops
+    )
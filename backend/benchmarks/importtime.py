@@ -0,0 +1,101 @@
+"""
+Import-time Budget
+==================
+Profiles ``import app.main`` in fresh interpreters (``python -X importtime``)
+and checks the result against a budget:
+
+  • modules that must stay lazy (the LLM stack, ``shapely``, ``arcgis``)
+    are not imported at all — they load on first use
+  • the total import time (best of ``--runs``) is under ``--budget-ms``
+
+The report lists the slowest modules by cumulative time.  Exits 1 on a
+breach, so it can gate CI.
+
+Run with:  python -m benchmarks.importtime [--budget-ms 1500] [--top 15] [--runs 3]
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parents[1]
+
+# Top-level packages ``import app.main`` must not pull in.
+LAZY_PACKAGES = (
+    "langchain",
+    "langchain_core",
+    "langchain_community",
+    "langchain_openai",
+    "openai",
+    "tiktoken",
+    "shapely",
+    "arcgis",
+)
+
+DEFAULT_BUDGET_MS = 1500
+
+
+def profile_imports(target: str = "app.main") -> dict[str, tuple[float, float]]:
+    """``{module: (self_ms, cumulative_ms)}`` for importing *target* in a new interpreter."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {target}"],
+        cwd=BACKEND_DIR,
+        env={**os.environ, "PYTHONDONTWRITEBYTECODE": "1"},
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    modules: dict[str, tuple[float, float]] = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        own, cumulative, name = line.removeprefix("import time:").split("|")
+        modules[name.strip()] = (int(own) / 1000, int(cumulative) / 1000)
+    return modules
+
+
+def check(modules: dict[str, tuple[float, float]], target: str, budget_ms: float) -> list[str]:
+    """Budget violations for one profile (empty when within budget)."""
+    problems = []
+    eager = sorted({m.split(".")[0] for m in modules} & set(LAZY_PACKAGES))
+    if eager:
+        problems.append(f"imported eagerly: {', '.join(eager)}")
+    total = modules.get(target, (0.0, 0.0))[1]
+    if total > budget_ms:
+        problems.append(f"import took {total:.0f} ms (budget {budget_ms:.0f} ms)")
+    return problems
+
+
+def format_report(modules: dict[str, tuple[float, float]], target: str, top: int) -> str:
+    rows = sorted(modules.items(), key=lambda kv: kv[1][1], reverse=True)[:top]
+    lines = [
+        f"import {target}: {modules.get(target, (0.0, 0.0))[1]:.1f} ms, {len(modules)} modules",
+        f"{'cumulative ms':>14} {'self ms':>9}  module",
+    ]
+    lines += [f"{cum:>14.1f} {own:>9.1f}  {name}" for name, (own, cum) in rows]
+    return "\n".join(lines)
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(description="Check app import time against a budget.")
+    parser.add_argument("--target", default="app.main")
+    parser.add_argument("--budget-ms", type=float, default=DEFAULT_BUDGET_MS)
+    parser.add_argument("--top", type=int, default=15, help="slowest modules to list")
+    parser.add_argument("--runs", type=int, default=3, help="profiles to take; the fastest is judged")
+    args = parser.parse_args(argv)
+
+    profiles = [profile_imports(args.target) for _ in range(max(1, args.runs))]
+    best = min(profiles, key=lambda m: m.get(args.target, (0.0, 0.0))[1])
+    print(format_report(best, args.target, args.top))
+    problems = check(best, args.target, args.budget_ms)
+    for problem in problems:
+        print(f"❌ {problem}")
+    if problems:
+        sys.exit(1)
+    print(f"✅ Within budget ({args.budget_ms:.0f} ms, nothing heavy imported eagerly)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,361 @@
+"""
+Benchmark Runner
+================
+Drives the real FastAPI app in-process (``httpx.ASGITransport``) with
+every upstream replaced by the fakes in ``benchmarks.fakes``, at rising
+concurrency, and reports p50/p95/p99 latency, requests/sec, per-stage
+agent timings and upstream call counts.
+
+Results are written as JSON so runs can be diffed between commits:
+
+    python -m benchmarks.run                                  # all scenarios
+    python -m benchmarks.run --scenario chat --levels 1,8,32 --requests 100
+    python -m benchmarks.run --latency-scale 0               # CPU-only profile
+    python -m benchmarks.run --compare benchmarks/results/<baseline>.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import tempfile
+import time
+from contextlib import asynccontextmanager, contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+
+import httpx
+import numpy as np
+
+from app.config import settings
+from app.agents.tour_agent import TourAgent
+from app.main import app, lifespan
+from app.services.http_pool import HTTPClientPool
+from benchmarks.fakes import FEATURE_SERVICE_URL, FakeProfile, FakeUpstreams
+
+RESULTS_DIR = Path(__file__).parent / "results"
+DEFAULT_LEVELS = (1, 4, 16, 64)
+
+CATALOGUE_PATHS = (
+    "/api/tours/templates",
+    "/api/tours/templates?city=nyc",
+    "/api/cities/",
+    "/api/cities/sf",
+    "/api/tours/templates/nyc-historic",
+)
+
+# Mix of messages the rules resolve locally and vague ones that need the LLM.
+CHAT_MESSAGES = (
+    ("Plan a historic walking tour with 4 stops", "nyc"),
+    ("Where should I eat? Food tour please", "sf"),
+    ("show me around", "chicago"),
+    ("Museums and galleries for an afternoon", "nyc"),
+    ("surprise me", "boston"),
+    ("Parks and gardens, 3 hours on foot", "sf"),
+)
+
+
+# ── Setup ────────────────────────────────────────────────────────────
+
+
+@contextmanager
+def bench_settings(**overrides):
+    """Temporarily override ``settings`` attributes."""
+    saved = {name: getattr(settings, name) for name in overrides}
+    for name, value in overrides.items():
+        setattr(settings, name, value)
+    try:
+        yield
+    finally:
+        for name, value in saved.items():
+            setattr(settings, name, value)
+
+
+class StageTimer:
+    """Wraps a ``TourAgent``'s pipeline stages and records their durations."""
+
+    STAGES = {
+        "_understand": "intent",
+        "_find_pois": "pois",
+        "_build_route": "route",
+        "_generate_narrative": "narrative",
+    }
+
+    def __init__(self, agent: TourAgent):
+        self.samples: dict[str, list[float]] = {}
+        for attr, stage in self.STAGES.items():
+            setattr(agent, attr, self._timed(stage, getattr(agent, attr)))
+        agent.run_stream = self._timed_stream(agent.run_stream)
+
+    def reset(self) -> dict[str, list[float]]:
+        samples, self.samples = self.samples, {}
+        return samples
+
+    def _record(self, stage: str, seconds: float):
+        self.samples.setdefault(stage, []).append(seconds)
+
+    def _timed(self, stage: str, fn):
+        async def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return await fn(*args, **kwargs)
+            finally:
+                self._record(stage, time.perf_counter() - started)
+
+        return wrapper
+
+    def _timed_stream(self, fn):
+        async def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            seen = set()
+            async for event, data in fn(*args, **kwargs):
+                if event not in seen:
+                    # Time from request start to the first event of each kind.
+                    seen.add(event)
+                    name = "first_token" if event == "token" else event
+                    self._record(f"stream_{name}", time.perf_counter() - started)
+                yield event, data
+
+        return wrapper
+
+
+@asynccontextmanager
+async def bench_app(profile: FakeProfile, seed: int, route_mode: str):
+    """The app (lifespan included) wired to fresh fakes; yields (client, fakes, timer)."""
+    fakes = FakeUpstreams(profile, seed)
+    with tempfile.TemporaryDirectory() as tmp, bench_settings(
+        OPENAI_API_KEY="bench",
+        ARCGIS_API_KEY="bench",
+        DATABASE_URL="sqlite://",
+        POI_STORE_URL="sqlite://",
+        POI_FEATURE_SERVICE_URL=FEATURE_SERVICE_URL,
+        POI_REFRESH_INTERVAL_S=0,
+        TEMPLATE_TOURS_REFRESH_INTERVAL_S=0,
+        DISTANCE_MATRIX_DIR=tmp,
+        ROUTE_MODE=route_mode,
+    ):
+        async with lifespan(app):
+            await app.state.http_pool.aclose()
+            app.state.http_pool = HTTPClientPool(transport=fakes.transport())
+            app.state.tour_agent = TourAgent(http=app.state.http_pool)
+            timer = StageTimer(app.state.tour_agent)
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+                yield client, fakes, timer
+            app.state.tour_agent = None
+
+
+# ── Scenarios ────────────────────────────────────────────────────────
+
+
+async def _catalogue(client: httpx.AsyncClient, i: int) -> httpx.Response:
+    return await client.get(CATALOGUE_PATHS[i % len(CATALOGUE_PATHS)])
+
+
+def _chat_body(i: int) -> dict:
+    message, city = CHAT_MESSAGES[i % len(CHAT_MESSAGES)]
+    # Unique per request so the chat result cache/single-flight don't
+    # short-circuit the pipeline; per-stop caches still warm up as in prod.
+    return {"message": f"{message} (request {i})", "city": city}
+
+
+async def _chat(client: httpx.AsyncClient, i: int) -> httpx.Response:
+    return await client.post("/api/chat/", json=_chat_body(i))
+
+
+async def _chat_stream(client: httpx.AsyncClient, i: int) -> httpx.Response:
+    return await client.post("/api/chat/stream", json=_chat_body(i))
+
+
+SCENARIOS = {
+    "catalogue": _catalogue,
+    "chat": _chat,
+    "chat_stream": _chat_stream,
+}
+
+
+# ── Measurement ──────────────────────────────────────────────────────
+
+
+def summarise(seconds: list[float]) -> dict:
+    """p50/p95/p99/mean/max in milliseconds."""
+    if not seconds:
+        return {"p50": 0.0, "p95": 0.0, "p99": 0.0, "mean": 0.0, "max": 0.0}
+    ms = np.asarray(seconds) * 1000
+    p50, p95, p99 = np.percentile(ms, [50, 95, 99])
+    return {
+        "p50": round(float(p50), 2),
+        "p95": round(float(p95), 2),
+        "p99": round(float(p99), 2),
+        "mean": round(float(ms.mean()), 2),
+        "max": round(float(ms.max()), 2),
+    }
+
+
+async def run_level(
+    client: httpx.AsyncClient,
+    fakes: FakeUpstreams,
+    timer: StageTimer,
+    scenario: str,
+    concurrency: int,
+    requests: int,
+    offset: int = 0,
+) -> dict:
+    """Send *requests* calls of *scenario*, at most *concurrency* at a time."""
+    call = SCENARIOS[scenario]
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: list[float] = []
+    errors = 0
+    calls_before = {k: v["calls"] for k, v in fakes.stats().items()}
+    timer.reset()
+
+    async def one(i: int):
+        nonlocal errors
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                response = await call(client, offset + i)
+                ok = response.status_code < 400 and b"event: error" not in response.content
+            except Exception:
+                ok = False
+            latencies.append(time.perf_counter() - started)
+            errors += not ok
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    elapsed = time.perf_counter() - started
+
+    return {
+        "concurrency": concurrency,
+        "requests": requests,
+        "errors": errors,
+        "elapsed_s": round(elapsed, 3),
+        "rps": round(requests / elapsed, 2) if elapsed else 0.0,
+        "latency_ms": summarise(latencies),
+        "stages_ms": {stage: summarise(s) for stage, s in sorted(timer.reset().items())},
+        "upstream_calls": {
+            k: v["calls"] - calls_before.get(k, 0) for k, v in fakes.stats().items()
+        },
+    }
+
+
+async def run_benchmark(
+    scenarios: list[str] | None = None,
+    levels: tuple[int, ...] = DEFAULT_LEVELS,
+    requests: int = 50,
+    profile: FakeProfile | None = None,
+    seed: int = 7,
+    route_mode: str | None = None,
+) -> dict:
+    """Run every scenario at every concurrency level; returns the results document."""
+    profile = profile or FakeProfile()
+    results = {
+        "meta": {
+            "commit": _git_commit(),
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "requests_per_level": requests,
+            "levels": list(levels),
+            "seed": seed,
+            "route_mode": route_mode or settings.ROUTE_MODE,
+            "profile": {
+                name: vars(value) if hasattr(value, "mean_ms") else value
+                for name, value in vars(profile).items()
+            },
+        },
+        "scenarios": {},
+    }
+    for scenario in scenarios or list(SCENARIOS):
+        # Fresh app state per scenario so caches warmed by one don't flatter another.
+        async with bench_app(profile, seed, route_mode or settings.ROUTE_MODE) as (client, fakes, timer):
+            rows = []
+            for n, concurrency in enumerate(levels):
+                rows.append(await run_level(
+                    client, fakes, timer, scenario, concurrency, requests, offset=n * requests
+                ))
+            results["scenarios"][scenario] = rows
+    return results
+
+
+# ── Reporting ────────────────────────────────────────────────────────
+
+
+def format_table(results: dict, baseline: dict | None = None) -> str:
+    lines = []
+    for scenario, rows in results["scenarios"].items():
+        lines.append(f"\n{scenario}")
+        lines.append(f"  {'conc':>5} {'rps':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'err':>4}")
+        base_rows = {
+            r["concurrency"]: r for r in (baseline or {}).get("scenarios", {}).get(scenario, [])
+        }
+        for row in rows:
+            lat = row["latency_ms"]
+            line = (
+                f"  {row['concurrency']:>5} {row['rps']:>9.1f} {lat['p50']:>9.1f}"
+                f" {lat['p95']:>9.1f} {lat['p99']:>9.1f} {row['errors']:>4}"
+            )
+            base = base_rows.get(row["concurrency"])
+            if base:
+                line += (
+                    f"   Δp95 {_pct(lat['p95'], base['latency_ms']['p95'])}"
+                    f"  Δrps {_pct(row['rps'], base['rps'])}"
+                )
+            lines.append(line)
+    return "\n".join(lines)
+
+
+def _pct(new: float, old: float) -> str:
+    return f"{(new - old) / old * 100:+.1f}%" if old else "n/a"
+
+
+def _git_commit() -> str | None:
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True, cwd=Path(__file__).parent,
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return out.stdout.strip() or None
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(description="Benchmark the API against local upstream fakes.")
+    parser.add_argument("--scenario", action="append", choices=sorted(SCENARIOS),
+                        help="scenario to run (repeatable; default: all)")
+    parser.add_argument("--levels", default=",".join(map(str, DEFAULT_LEVELS)),
+                        help="comma-separated concurrency levels")
+    parser.add_argument("--requests", type=int, default=50, help="requests per level")
+    parser.add_argument("--latency-scale", type=float, default=1.0,
+                        help="multiply every fake upstream latency (0 = CPU only)")
+    parser.add_argument("--route-mode", choices=("auto", "esri", "local"), default=None)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output", type=Path, default=None, help="results JSON path")
+    parser.add_argument("--compare", type=Path, default=None, help="baseline results JSON")
+    args = parser.parse_args(argv)
+
+    results = asyncio.run(run_benchmark(
+        scenarios=args.scenario,
+        levels=tuple(int(v) for v in args.levels.split(",")),
+        requests=args.requests,
+        profile=FakeProfile().scaled(args.latency_scale),
+        seed=args.seed,
+        route_mode=args.route_mode,
+    ))
+
+    output = args.output
+    if output is None:
+        stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+        output = RESULTS_DIR / f"bench-{results['meta']['commit'] or 'local'}-{stamp}.json"
+    os.makedirs(output.parent, exist_ok=True)
+    output.write_text(json.dumps(results, indent=2) + "\n", encoding="utf-8")
+
+    baseline = json.loads(args.compare.read_text(encoding="utf-8")) if args.compare else None
+    print(format_table(results, baseline))
+    print(f"\n📄 Results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
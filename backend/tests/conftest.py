@@ -0,0 +1,8 @@
+"""
+Shared test setup: keep the persistent cache tiers in memory so test runs
+never create or read a ``geoexplore.db`` on disk.
+"""
+
+import os
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
@@ -2,9 +2,22 @@
 Backend tests.
 """
 
+import asyncio
+import json
+
 import pytest
+from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
 from fastapi.testclient import TestClient
+from langchain_community.chat_models.fake import FakeListChatModel
+
+from app.agents.tour_agent import TourAgent
+from app.api.chat import get_chat_flight, get_tour_agent
+from app.api.middleware import CompressionMiddleware
+from app.config import settings
 from app.main import app
+from app.services.singleflight import SingleFlight
+from app.services.telemetry import HTTP_REQUEST_SECONDS, STAGE_SECONDS
 
 
 client = TestClient(app)
@@ -39,3 +52,319 @@ def test_get_tour_template():
     resp = client.get("/api/tours/templates/nyc-historic")
     assert resp.status_code == 200
     assert resp.json()["city"] == "nyc"
+
+
+def test_health_reports_http_pool():
+    with TestClient(app) as c:
+        resp = c.get("/health")
+        assert resp.status_code == 200
+        assert "hosts" in resp.json()["http_pool"]
+
+
+DEFAULT_INTENT_JSON = '{"tour_type": "general", "categories": ["landmarks"], "num_stops": 5}'
+NARRATIVE = "### 1. First\nWhat a tour!\n\n### 2. Second\nStill great.\n\n### 3. Third\nLast one."
+
+
+@pytest.fixture
+def fake_agent(monkeypatch):
+    """A TourAgent whose LLM is a canned fake; no network is touched."""
+    monkeypatch.setattr(settings, "OPENAI_API_KEY", "sk-test")
+    agent = TourAgent()
+    agent.llm = FakeListChatModel(responses=[DEFAULT_INTENT_JSON, NARRATIVE])
+    app.dependency_overrides[get_tour_agent] = lambda: agent
+    # No result cache, so each test exercises the agent itself.
+    flight = SingleFlight(result_ttl=0)
+    app.dependency_overrides[get_chat_flight] = lambda: flight
+    yield agent
+    app.dependency_overrides.clear()
+
+
+def test_chat(fake_agent):
+    resp = client.post("/api/chat/", json={"message": "show me around", "city": "boston"})
+    assert resp.status_code == 200
+    body = resp.json()
+    assert "What a tour!" in body["reply"] and "Last one." in body["reply"]
+    assert len(body["map_data"]["waypoints"]) == len(body["tour"]["stops"]) > 0
+
+
+def test_chat_accepts_string_numeric_preferences(fake_agent):
+    resp = client.post("/api/chat/", json={
+        "message": "museums please",
+        "city": "nyc",
+        "preferences": {"time_budget_min": "120"},
+    })
+    assert resp.status_code == 200
+
+
+def test_chat_stream_emits_stages_then_tokens(fake_agent):
+    resp = client.post("/api/chat/stream", json={"message": "show me around", "city": "boston"})
+    assert resp.status_code == 200
+    assert resp.headers["content-type"].startswith("text/event-stream")
+
+    events = []
+    for block in resp.text.strip().split("\n\n"):
+        name, data = block.split("\n", 1)
+        events.append((name.removeprefix("event: "), json.loads(data.removeprefix("data: "))))
+
+    names = [name for name, _ in events]
+    assert names[:3] == ["intent", "pois", "route"]
+    assert names[-1] == "done"
+    streamed = "".join(d["text"] for n, d in events if n == "token")
+    assert "What a tour!" in streamed
+    assert events[-1][1]["reply"] == streamed
+
+
+def test_speculative_prefetch_hit_and_miss(fake_agent):
+    client.post("/api/chat/", json={"message": "show me around", "city": "nyc"})
+    assert fake_agent.speculation.hits == 1
+
+    fake_agent.llm = FakeListChatModel(
+        responses=['{"categories": ["Museums"], "num_stops": 3}', NARRATIVE]
+    )
+    resp = client.post("/api/chat/", json={"message": "surprise me", "city": "nyc"})
+    assert all(p["category"] == "Museums" for p in resp.json()["tour"]["stops"])
+    stats = fake_agent.speculation.stats()
+    assert stats["misses"] == 1 and stats["hit_rate"] == 0.5
+
+
+@pytest.mark.asyncio
+async def test_cancelled_intent_parsing_cancels_the_speculative_prefetch(fake_agent, monkeypatch):
+    prefetch_cancelled = asyncio.Event()
+
+    async def speculate(city):
+        try:
+            await asyncio.sleep(60)
+        except asyncio.CancelledError:
+            prefetch_cancelled.set()
+            raise
+
+    async def parse_intent(*args):
+        await asyncio.sleep(60)
+
+    monkeypatch.setattr(fake_agent, "_speculate", speculate)
+    monkeypatch.setattr(fake_agent, "_parse_intent", parse_intent)
+    task = asyncio.create_task(fake_agent._understand("show me around", "nyc", None))
+    await asyncio.sleep(0.01)
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+    assert prefetch_cancelled.is_set()
+
+
+def test_clear_intents_skip_the_llm_and_repeats_hit_the_cache(fake_agent):
+    for _ in range(2):
+        resp = client.post("/api/chat/", json={"message": "Historic walking tour, 4 stops", "city": "boston"})
+        assert resp.status_code == 200
+    stats = fake_agent.intents.stats()
+    assert stats["llm_calls"] == 0
+    assert stats["rule_hits"] == 1 and stats["cache_hits"] == 1
+    assert stats["llm_skip_rate"] == 1.0
+    assert resp.json()["tour"]["category"] == "historic"
+    assert fake_agent.speculation.started == 0
+
+
+def test_repeat_stops_reuse_cached_narratives(fake_agent):
+    fake_agent.llm = FakeListChatModel(responses=[NARRATIVE])
+    first = client.post("/api/chat/", json={"message": "Landmarks walking tour", "city": "sf"}).json()
+    second = client.post("/api/chat/", json={"message": "famous landmarks walk", "city": "sf"}).json()
+
+    assert second["reply"] == first["reply"]
+    stats = fake_agent.narratives.stats()
+    assert stats["llm_calls"] == 1
+    assert stats["stops_cached"] == stats["stops_generated"] == 3
+
+
+@pytest.mark.asyncio
+async def test_single_flight_coalesces_concurrent_duplicates():
+    flight = SingleFlight(result_ttl=30)
+    runs = 0
+
+    async def pipeline():
+        nonlocal runs
+        runs += 1
+        await asyncio.sleep(0.01)
+        return {"reply": "shared"}
+
+    results = await asyncio.gather(*(flight.do("boston|historic", pipeline) for _ in range(5)))
+    assert runs == 1 and all(r == {"reply": "shared"} for r in results)
+    assert await flight.do("boston|historic", pipeline) == {"reply": "shared"}
+
+    stats = flight.stats()
+    assert (stats["executed"], stats["coalesced"], stats["cache_hits"]) == (1, 4, 1)
+    assert stats["in_flight"] == 0
+
+
+def test_list_tour_templates_filters_by_city_and_category():
+    resp = client.get("/api/tours/templates", params={"city": "nyc", "category": "historic"})
+    assert [t["id"] for t in resp.json()] == ["nyc-historic"]
+    assert "default_stops" not in resp.json()[0]
+
+
+def test_catalogue_etag_and_304():
+    resp = client.get("/api/tours/templates", headers={"Accept-Encoding": "gzip"})
+    assert resp.headers["content-encoding"] == "gzip"
+    etag = resp.headers["etag"]
+
+    cached = client.get("/api/tours/templates", headers={"If-None-Match": etag})
+    assert cached.status_code == 304
+    assert cached.content == b""
+
+    other = client.get("/api/cities/nyc", headers={"If-None-Match": etag})
+    assert other.status_code == 200
+
+
+def test_batch_streams_ndjson_and_can_be_polled(fake_agent):
+    specs = [
+        {"message": "show me around", "city": "boston", "id": "a"},
+        {"message": "museums please", "city": "nyc", "id": "b"},
+        {"message": "show me around", "city": "boston", "id": "c"},
+    ]
+    with TestClient(app) as c:
+        app.dependency_overrides[get_chat_flight] = lambda: SingleFlight(result_ttl=30)
+        resp = c.post("/api/tours/batch", json={"specs": specs})
+        assert resp.headers["content-type"].startswith("application/x-ndjson")
+        lines = [json.loads(line) for line in resp.text.splitlines()]
+        job_id = resp.headers["x-batch-job-id"]
+
+        assert lines[0]["type"] == "job" and lines[0]["total"] == 3
+        results = [line for line in lines if line["type"] == "result"]
+        assert sorted((r["index"], r["id"]) for r in results) == [(0, "a"), (1, "b"), (2, "c")]
+        assert all(r["status"] == "ok" and r["tour"]["stops"] for r in results)
+        assert lines[-1] == {**lines[-1], "type": "done", "completed": 3, "failed": 0}
+
+        polled = c.get(f"/api/tours/batch/{job_id}", params={"offset": 1}).json()
+        assert polled["status"] == "done" and len(polled["results"]) == 2
+        assert polled["next_offset"] == 3
+        assert c.get("/api/tours/batch/nope").status_code == 404
+
+        queued = c.post("/api/tours/batch", json={"specs": specs[:1], "stream": False})
+        assert queued.status_code == 202 and queued.json()["total"] == 1
+
+
+@pytest.mark.asyncio
+async def test_template_tours_are_built_once_and_rebuilt_only_when_changed(monkeypatch):
+    from benchmarks.fakes import FakeProfile, FakeUpstreams
+    from app.data.cache import LRUCache, TieredCache
+    from app.services.http_pool import HTTPClientPool
+    from app.services.template_tours import TemplateMaterialiser
+    from app.services.tour_templates import TOUR_TEMPLATES
+
+    monkeypatch.setattr(settings, "OPENAI_API_KEY", "sk-test")
+    upstreams = FakeUpstreams(FakeProfile.instant())
+    agent = TourAgent(http=HTTPClientPool(transport=upstreams.transport()))
+    materialiser = TemplateMaterialiser(agent, store=TieredCache(LRUCache()))
+    templates = [dict(t) for t in TOUR_TEMPLATES[:2]]
+
+    # LLM down: the placeholder tour is served but not stored, and retried next time.
+    agent.llm = FakeListChatModel(responses=[])
+    assert (await materialiser.refresh(templates[:1]))["degraded"] == 1
+    assert materialiser.get(templates[0]["id"]) is not None
+    assert materialiser.store.get(templates[0]["id"]) is None
+
+    agent.llm = FakeListChatModel(
+        responses=["\n\n".join(f"### {i}. Stop\nWhat a tour!" for i in range(1, 6))]
+    )
+    assert await materialiser.refresh(templates) == {
+        "built": 2, "unchanged": 0, "degraded": 0, "failed": 0, "removed": 0
+    }
+    tour = json.loads(materialiser.get(templates[0]["id"]).body)
+    assert tour["id"] == templates[0]["id"] and len(tour["stops"]) == 5
+    assert tour["stops"][0]["order"] == 1 and tour["stops"][0]["narrative"] == "What a tour!"
+
+    templates[1]["default_stops"] = templates[1]["default_stops"][:3]
+    counts = await materialiser.refresh(templates)
+    assert (counts["built"], counts["unchanged"]) == (1, 1)
+    assert len(json.loads(materialiser.get(templates[1]["id"]).body)["stops"]) == 3
+
+    assert (await materialiser.refresh(templates[:1]))["removed"] == 1
+    assert materialiser.get(templates[1]["id"]) is None
+
+    with TestClient(app) as c:
+        assert c.get(f"/api/tours/templates/{templates[0]['id']}/tour").status_code == 503
+        app.state.template_tours = materialiser
+        resp = c.get(f"/api/tours/templates/{templates[0]['id']}/tour")
+        assert resp.status_code == 200 and resp.json()["stops"][0]["poi"]["category"] == "historic"
+        assert c.get("/api/tours/templates/nope/tour").json() == {"error": "Tour not found"}
+
+
+def test_chat_route_geometry_can_be_polyline_encoded(fake_agent):
+    resp = client.post(
+        "/api/chat/", json={"message": "show me around", "city": "boston", "geometry_format": "polyline"}
+    )
+    geometry = resp.json()["tour"]["route"]["geometry"]
+    assert geometry["encoding"] == "polyline5" and len(geometry["polylines"]) == 1
+    bad = client.post("/api/chat/", json={"message": "hi", "geometry_format": "svg"})
+    assert bad.status_code == 422
+
+
+def test_compression_covers_whole_bodies_but_not_streams():
+    mini = FastAPI()
+
+    @mini.get("/big")
+    async def big():
+        return {"text": "tour " * 1000}
+
+    @mini.get("/small")
+    async def small():
+        return {"ok": True}
+
+    @mini.get("/stream")
+    async def stream():
+        return StreamingResponse(iter([b"{}\n" * 600] * 2), media_type="application/x-ndjson")
+
+    mini.add_middleware(CompressionMiddleware)
+    c = TestClient(mini)
+    resp = c.get("/big", headers={"Accept-Encoding": "gzip"})
+    assert resp.headers["content-encoding"] == "gzip" and resp.json()["text"].startswith("tour")
+    assert int(resp.headers["content-length"]) < 200
+    assert "content-encoding" not in c.get("/big", headers={"Accept-Encoding": "identity"}).headers
+    assert "content-encoding" not in c.get("/small", headers={"Accept-Encoding": "gzip"}).headers
+    assert "content-encoding" not in c.get("/stream", headers={"Accept-Encoding": "gzip"}).headers
+
+
+def test_request_id_is_echoed_or_generated():
+    resp = client.get("/health", headers={"X-Request-ID": "abc-123"})
+    assert resp.headers["x-request-id"] == "abc-123"
+    generated = client.get("/health").headers["x-request-id"]
+    assert len(generated) == 32 and generated != "abc-123"
+
+
+def test_metrics_record_stages_and_requests(fake_agent):
+    route_before = STAGE_SECONDS.count("route")
+    http_before = HTTP_REQUEST_SECONDS.count("POST", "/api/chat/", "200")
+    client.post("/api/chat/", json={"message": "show me around", "city": "boston"})
+    assert STAGE_SECONDS.count("route") == route_before + 1
+    assert HTTP_REQUEST_SECONDS.count("POST", "/api/chat/", "200") == http_before + 1
+
+    resp = client.get("/metrics")
+    assert resp.status_code == 200
+    assert resp.headers["content-type"].startswith("text/plain; version=0.0.4")
+    assert '# TYPE geoexplore_stage_seconds histogram' in resp.text
+    assert 'geoexplore_stage_seconds_bucket{stage="intent",le="+Inf"}' in resp.text
+    assert 'geoexplore_http_request_seconds_count{method="POST",route="/api/chat/",status="200"}' in resp.text
+
+
+@pytest.mark.asyncio
+async def test_benchmark_suite_runs_against_local_fakes():
+    from benchmarks.fakes import FakeProfile
+    from benchmarks.run import run_benchmark
+
+    results = await run_benchmark(
+        scenarios=["catalogue", "chat"], levels=(2,), requests=4, profile=FakeProfile.instant()
+    )
+    chat = results["scenarios"]["chat"][0]
+    assert chat["errors"] == 0 and chat["rps"] > 0
+    assert set(chat["latency_ms"]) == {"p50", "p95", "p99", "mean", "max"}
+    assert {"intent", "pois", "route"} <= set(chat["stages_ms"])
+    assert chat["upstream_calls"]["features"] > 0
+    assert results["scenarios"]["catalogue"][0]["errors"] == 0
+    json.dumps(results)
+
+
+def test_app_import_leaves_the_llm_stack_and_geos_unloaded():
+    from benchmarks.importtime import LAZY_PACKAGES, check, profile_imports
+
+    modules = profile_imports("app.main")
+    assert "app.main" in modules
+    assert check(modules, "app.main", budget_ms=float("inf")) == []
+    assert not {m.split(".")[0] for m in modules} & set(LAZY_PACKAGES)
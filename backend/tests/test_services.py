@@ -0,0 +1,737 @@
+"""
+Service-layer tests (no network — upstreams are faked with httpx.MockTransport).
+"""
+
+import asyncio
+import json
+import sqlite3
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import httpx
+import numpy as np
+import pytest
+
+from app.agents.intent_parser import extract_intent, parse_llm_intent
+from app.config import settings
+from app.data.cache import LRUCache, SQLiteCache, TieredCache, build_cache
+from app.data.poi_catalogue import POICatalogue
+from app.data.poi_store import POIStore
+from app.services.arcgis_service import ArcGISService
+from app.services.distance_matrix import DistanceMatrixCache
+from app.services.geometry import compact_route, decode_polyline, encode_polyline, zoom_tolerance_m
+from app.services.http_pool import HTTPClientPool
+from app.services.resilience import CircuitOpenError, TokenBucket
+from app.services.poi_ingest import POIIngestor
+from app.services.poi_service import POIService
+from app.services import route_optimiser
+from app.services.route_service import RouteService
+
+
+def _geocode_transport(calls: list):
+    def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(request)
+        return httpx.Response(
+            200,
+            json={
+                "candidates": [
+                    {"location": {"x": -74.01, "y": 40.71}, "address": "Federal Hall", "score": 100}
+                ]
+            },
+        )
+
+    return httpx.MockTransport(handler)
+
+
+@pytest.mark.asyncio
+async def test_http_pool_shares_one_client_per_host():
+    calls: list = []
+    pool = HTTPClientPool(transport=_geocode_transport(calls))
+    a = ArcGISService(http=pool)
+    b = ArcGISService(http=pool)
+
+    assert (await a.geocode("Federal Hall"))["label"] == "Federal Hall"
+    await b.geocode("Federal Hall")
+
+    stats = pool.stats()
+    assert list(stats["hosts"]) == ["https://geocode-api.arcgis.com"]
+    assert stats["hosts"]["https://geocode-api.arcgis.com"]["requests"] == 2
+
+    # Services never close a pool they were given.
+    await a.close()
+    assert pool.client("https://geocode-api.arcgis.com") is not None
+    await pool.aclose()
+    with pytest.raises(RuntimeError):
+        pool.client("https://geocode-api.arcgis.com")
+
+
+@pytest.mark.asyncio
+async def test_geocode_cache_serves_repeats_from_memory_then_disk():
+    calls: list = []
+    pool = HTTPClientPool(transport=_geocode_transport(calls))
+    l2 = SQLiteCache(":memory:", "geocode")
+    svc = ArcGISService(http=pool, geocode_cache=TieredCache(LRUCache(maxsize=1), l2))
+
+    first = await svc.geocode("Federal Hall")
+    assert await svc.geocode("  federal   HALL ") == first
+    assert len(calls) == 1
+    assert svc.geocode_cache.l1.hits == 1
+
+    # Evicted from L1 by another address, still served from SQLite.
+    await svc.geocode("Trinity Church")
+    assert svc.geocode_cache.l1.evictions == 1
+    assert await svc.geocode("Federal Hall") == first
+    assert len(calls) == 2 and l2.hits == 1
+
+    svc.invalidate_geocode("Federal Hall")
+    await svc.geocode("Federal Hall")
+    assert len(calls) == 3
+    await pool.aclose()
+
+
+def test_lru_cache_expires_entries():
+    cache = LRUCache(maxsize=4, ttl=-1)
+    cache.set("k", 1)
+    assert cache.get("k") is None
+    assert cache.expirations == 1
+
+
+def test_sqlite_cache_is_shared_across_processes(tmp_path):
+    path = str(tmp_path / "cache.db")
+    worker_a = SQLiteCache(path, "route")
+    assert worker_a._conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+
+    # Another worker process stores a result; this one reads it without recomputing.
+    code = (
+        "from app.data.cache import SQLiteCache; "
+        f"SQLiteCache({path!r}, 'route').set('stops', {{'miles': 1.5}})"
+    )
+    subprocess.run([sys.executable, "-c", code], check=True, cwd=Path(__file__).parents[1])
+    shared = TieredCache(LRUCache(), worker_a)
+    assert shared.get("stops") == {"miles": 1.5}
+    assert worker_a.hits == 1 and shared.l1.get("stops") == {"miles": 1.5}
+
+    shared.invalidate("stops")
+    assert SQLiteCache(path, "route").get("stops") is None
+
+
+def test_sqlite_cache_trims_expired_then_oldest_entries(tmp_path):
+    cache = SQLiteCache(str(tmp_path / "cache.db"), "geocode", maxsize=10)
+    other = SQLiteCache(str(tmp_path / "cache.db"), "intent", maxsize=10)
+    other.set("kept", 1)
+    cache.set("stale", 0, ttl=-1)
+    for i in range(29):
+        cache.set(f"k{i}", i)
+    cache._background_future.result()  # trims run on a background thread
+
+    assert len(cache) == 10 and cache.expirations == 1
+    assert cache.get("k0") is None and cache.get("k28") == 28
+    assert other.get("kept") == 1  # trimming is per namespace
+
+
+def test_sqlite_cache_gives_up_quickly_while_another_worker_writes(tmp_path):
+    path = str(tmp_path / "cache.db")
+    cache = SQLiteCache(path, "route")
+    cache.set("kept", 1)
+    other_worker = sqlite3.connect(path, isolation_level=None)
+    other_worker.execute("BEGIN IMMEDIATE")  # holds the write lock
+
+    started = time.monotonic()
+    cache.set("dropped", 2)
+    assert cache.get("kept") == 1  # WAL readers aren't blocked
+    cache.delete("kept")  # deferred until the lock is free
+    assert time.monotonic() - started < 1
+    assert cache.stats()["busy"] == 2
+
+    other_worker.execute("COMMIT")
+    cache._background_future.result()
+    assert cache.get("kept") is None and cache.get("dropped") is None
+    other_worker.close()
+
+
+def test_build_cache_caps_l1_ttl_in_front_of_the_shared_tier(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "CACHE_URL", f"sqlite:///{tmp_path}/cache.db")
+    monkeypatch.setattr(settings, "CACHE_L1_TTL_S", 60)
+    cache = build_cache("narrative", 16, 3600)
+    assert cache.l1.ttl == 60 and cache.l2.ttl == 3600
+    assert cache.l2.maxsize == settings.CACHE_L2_MAX_ENTRIES
+
+    monkeypatch.setattr(settings, "CACHE_URL", "memory://")
+    assert build_cache("narrative", 16, 3600).l2 is None
+
+
+@pytest.mark.asyncio
+async def test_geocode_many_batches_misses_and_keeps_input_order():
+    seen: list = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        seen.append(request.url.path.rsplit("/", 1)[-1])
+        if request.url.path.endswith("geocodeAddresses"):
+            form = dict(httpx.QueryParams(request.content.decode()))
+            records = json.loads(form["addresses"])["records"]
+            return httpx.Response(200, json={"locations": [
+                {
+                    "address": r["attributes"]["SingleLine"],
+                    "location": {"x": -71.0, "y": 42.0 + r["attributes"]["OBJECTID"]},
+                    "score": 99,
+                    "attributes": {"ResultID": r["attributes"]["OBJECTID"]},
+                }
+                for r in records
+            ]})
+        return _geocode_transport([]).handler(request)
+
+    pool = HTTPClientPool(transport=httpx.MockTransport(handler))
+    svc = ArcGISService(http=pool, geocode_cache=TieredCache(LRUCache()))
+    await svc.geocode("Federal Hall")
+
+    stops = ["Old North Church", "Federal Hall", "Paul Revere House", "old north church"]
+    results = await svc.geocode_many(stops)
+
+    assert seen == ["findAddressCandidates", "geocodeAddresses"]
+    assert [r["label"] for r in results] == [
+        "Old North Church", "Federal Hall", "Paul Revere House", "Old North Church",
+    ]
+    await pool.aclose()
+
+
+@pytest.mark.asyncio
+async def test_geocode_many_falls_back_to_single_lookups():
+    calls: list = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.path.endswith("geocodeAddresses"):
+            return httpx.Response(200, json={"error": {"code": 403, "message": "no batch"}})
+        return _geocode_transport(calls).handler(request)
+
+    pool = HTTPClientPool(transport=httpx.MockTransport(handler))
+    svc = ArcGISService(http=pool, geocode_cache=TieredCache(LRUCache()))
+    results = await svc.geocode_many(["a", "b", "c"])
+    assert len(calls) == 3 and all(r["label"] == "Federal Hall" for r in results)
+    await pool.aclose()
+
+
+def _poi(name: str, lat: float, lng: float) -> dict:
+    return {"name": name, "category": "Landmarks", "location": {"lat": lat, "lng": lng}}
+
+
+@pytest.mark.asyncio
+async def test_local_route_orders_stops_and_estimates_totals():
+    # Stops along a line, deliberately shuffled.
+    pois = [_poi(str(i), 40.70 + i * 0.005, -74.0) for i in (0, 3, 1, 4, 2)]
+    route = await RouteService(http=HTTPClientPool()).optimise(pois, mode="local")
+
+    assert route["source"] == "local" and "fallback" not in route
+    assert [pois[i]["name"] for i in route["sequence"]] == ["0", "1", "2", "3", "4"]
+    assert 1.5 < route["total_distance_miles"] < 2.0
+    assert route["total_time_min"] > 20
+    assert len(route["directions"]) == 4
+
+
+@pytest.mark.asyncio
+async def test_esri_failure_falls_back_to_local_route():
+    def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(500, text="upstream down")
+
+    svc = RouteService(http=HTTPClientPool(transport=httpx.MockTransport(handler)))
+    svc.api_key = "test-key"
+    pois = [_poi("a", 40.70, -74.0), _poi("b", 40.80, -74.0)]
+    route = await svc.optimise(pois, mode="esri")
+    assert route["source"] == "local" and route["total_distance_miles"] > 0
+    assert route["fallback"] is True
+
+
+@pytest.mark.asyncio
+async def test_pool_retries_transient_errors_then_opens_the_circuit(monkeypatch):
+    monkeypatch.setattr(settings, "RETRY_BASE_DELAY_S", 0)
+    monkeypatch.setattr(settings, "BREAKER_FAILURE_THRESHOLD", 3)
+    statuses = iter([503, 200])
+    calls = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(request.url.path)
+        return httpx.Response(next(statuses, 503), json={})
+
+    pool = HTTPClientPool(transport=httpx.MockTransport(handler))
+    url = "https://route-api.arcgis.com/solve"
+    assert (await pool.get(url)).status_code == 200
+    assert len(calls) == 2
+
+    # Three consecutive 5xx trip the breaker; later calls never leave the process.
+    assert (await pool.get(url)).status_code == 503
+    with pytest.raises(CircuitOpenError):
+        await pool.get(url)
+    assert len(calls) == 5
+    assert not pool.available(url)
+    upstream = pool.stats()["hosts"]["https://route-api.arcgis.com"]
+    assert upstream["breaker"]["state"] == "open" and upstream["retries"] == 3
+
+    # Routing skips straight to the local solver while the circuit is open.
+    svc = RouteService(http=pool, route_cache=TieredCache(LRUCache()))
+    svc.api_key = "test-key"
+    route = await svc.optimise([_poi("a", 40.70, -74.0), _poi("b", 40.80, -74.0)], mode="esri")
+    assert route["source"] == "local" and len(calls) == 5
+    await pool.aclose()
+
+
+@pytest.mark.asyncio
+async def test_hung_upstreams_time_out_per_attempt_within_one_deadline(monkeypatch):
+    monkeypatch.setattr(settings, "RETRY_BASE_DELAY_S", 0)
+    monkeypatch.setattr(settings, "HTTP_ATTEMPT_TIMEOUT_S", 0.05)
+    monkeypatch.setattr(settings, "HTTP_DEADLINE_S", 2)
+    monkeypatch.setattr(settings, "OPENAI_TIMEOUT_S", 0.05)
+    calls = []
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(request.method)
+        await asyncio.sleep(5)
+        return httpx.Response(200, json={})
+
+    pool = HTTPClientPool(transport=httpx.MockTransport(handler))
+    started = asyncio.get_running_loop().time()
+    with pytest.raises(httpx.TimeoutException):
+        await pool.get("https://geocode-api.arcgis.com/find")
+    assert asyncio.get_running_loop().time() - started < 1
+    assert calls == ["GET"] * 3
+
+    # The deadline caps the attempts together, however long each may take.
+    monkeypatch.setattr(settings, "HTTP_ATTEMPT_TIMEOUT_S", 5)
+    monkeypatch.setattr(settings, "HTTP_DEADLINE_S", 0.1)
+    calls.clear()
+    with pytest.raises(httpx.TimeoutException):
+        await HTTPClientPool(transport=httpx.MockTransport(handler)).get("https://example.com/slow")
+    assert calls == ["GET"]
+
+    # A completion that may already be running upstream is not resent.
+    calls.clear()
+    with pytest.raises(httpx.TimeoutException):
+        await pool.post("https://api.openai.com/v1/chat/completions", json={})
+    assert calls == ["POST"]
+    assert pool.stats()["hosts"]["https://api.openai.com"]["timeouts"] == 1
+    await pool.aclose()
+
+
+@pytest.mark.asyncio
+async def test_arcgis_error_envelopes_count_as_upstream_failures(monkeypatch):
+    monkeypatch.setattr(settings, "RETRY_BASE_DELAY_S", 0)
+    monkeypatch.setattr(settings, "BREAKER_FAILURE_THRESHOLD", 3)
+    bodies = iter([
+        {"error": {"code": 429, "message": "Too many requests"}},
+        {"features": [{"attributes": {"OBJECTID": 1}}]},
+    ])
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(200, json=next(bodies, {"error": {"code": 500, "message": "down"}}))
+
+    pool = HTTPClientPool(transport=httpx.MockTransport(handler))
+    svc = ArcGISService(http=pool, geocode_cache=TieredCache(LRUCache()))
+    url = "https://services.arcgis.com/x/FeatureServer/0"
+    # A throttling envelope slows the limiter down and is retried like a 429.
+    assert len(await svc.query_features(url)) == 1
+    upstream = pool.stats()["hosts"]["https://services.arcgis.com"]
+    assert upstream["rate_limit"]["throttled"] == 1 and upstream["retries"] == 1
+
+    # Service-error envelopes trip the breaker like 5xx responses.
+    with pytest.raises(ValueError, match="down"):
+        await svc.query_features(url)
+    assert not pool.available(url)
+    await pool.aclose()
+
+
+def test_token_bucket_backs_off_on_throttling_and_recovers():
+    bucket = TokenBucket(rate_per_s=10, burst=5)
+    bucket.on_throttled(retry_after=None)
+    bucket.on_throttled(retry_after=None)
+    assert bucket.rate == 2.5 and bucket.tokens == 0
+    for _ in range(100):
+        bucket.on_success()
+    assert bucket.rate == 10
+
+
+@pytest.mark.asyncio
+async def test_esri_solves_are_cached_regardless_of_stop_order():
+    solves = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        stops = request.url.params["stops"].split(";")
+        solves.append(stops)
+        assert request.url.params["preserveFirstStop"] == "false"
+        assert request.url.params["preserveLastStop"] == "false"
+        # Visit stops north to south, whatever order they were sent in.
+        by_lat = sorted(range(len(stops)), key=lambda i: -float(stops[i].split(",")[1]))
+        return httpx.Response(200, json={
+            "routes": {"features": [{"attributes": {"Total_Miles": 9.5, "Total_TravelTime": 30}}]},
+            "stops": {"features": [
+                {"attributes": {"ObjectID": i + 1, "Sequence": by_lat.index(i) + 1}}
+                for i in range(len(stops))
+            ]},
+        })
+
+    svc = RouteService(
+        http=HTTPClientPool(transport=httpx.MockTransport(handler)),
+        route_cache=TieredCache(LRUCache()),
+    )
+    svc.api_key = "test-key"
+    a, b, c = _poi("a", 40.80, -74.0), _poi("b", 40.70, -74.0), _poi("c", 40.75, -74.0)
+
+    first = await svc.optimise([a, b, c], mode="esri")
+    again = await svc.optimise([b, c, a], mode="esri")
+    assert len(solves) == 1
+    assert [[a, b, c][i]["name"] for i in first["sequence"]] == ["a", "c", "b"]
+    assert [[b, c, a][i]["name"] for i in again["sequence"]] == ["a", "c", "b"]
+    assert again["source"] == "esri" and again["total_distance_miles"] == 9.5
+    assert svc.stats()["hit_rate"] == 0.5
+
+    await svc.optimise([a, b, c], mode="esri", transport_mode="driving")
+    assert len(solves) == 2
+
+
+@pytest.mark.asyncio
+async def test_concurrent_overlapping_requests_share_fetches_and_solves(monkeypatch):
+    solves = []
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        solves.append(request)
+        await asyncio.sleep(0.01)
+        return httpx.Response(200, json={
+            "routes": {"features": [{"attributes": {"Total_Miles": 9.5, "Total_TravelTime": 30}}]},
+        })
+
+    routes = RouteService(
+        http=HTTPClientPool(transport=httpx.MockTransport(handler)),
+        route_cache=TieredCache(LRUCache()),
+    )
+    routes.api_key = "test-key"
+    a, b, c = _poi("a", 40.80, -74.0), _poi("b", 40.70, -74.0), _poi("c", 40.75, -74.0)
+    results = await asyncio.gather(
+        routes.optimise([a, b, c], mode="esri"), routes.optimise([c, a, b], mode="esri")
+    )
+    assert len(solves) == 1
+    assert all(r["source"] == "esri" for r in results)
+
+    pois = POIService(arcgis=ArcGISService(http=HTTPClientPool()))
+    fetches = []
+
+    async def fake_fetch(city_meta, category, limit):
+        fetches.append(category)
+        await asyncio.sleep(0.01)
+        return [_poi(f"{category} spot", 40.71, -74.0)]
+
+    monkeypatch.setattr(pois, "_fetch_category", fake_fetch)
+    first, second = await asyncio.gather(
+        pois.search("nyc", ["museums", "parks"]), pois.search("nyc", ["parks"])
+    )
+    assert sorted(fetches) == ["museums", "parks"]
+    assert second == [first[1]] and second[0] is not first[1]
+
+
+@pytest.mark.asyncio
+async def test_poi_search_fetches_categories_concurrently_and_drops_slow_ones(monkeypatch):
+    monkeypatch.setattr(settings, "POI_CATEGORY_TIMEOUT_S", 0.05)
+    svc = POIService(arcgis=ArcGISService(http=HTTPClientPool()))
+    in_flight = {"now": 0, "peak": 0}
+
+    async def fake_fetch(city_meta, category, limit):
+        in_flight["now"] += 1
+        in_flight["peak"] = max(in_flight["peak"], in_flight["now"])
+        try:
+            await asyncio.sleep(1 if category == "slow" else 0.01)
+            dup = _poi("Federal Hall", 40.7075, -74.0104)
+            return [dup, _poi(f"{category} spot", 40.71, -74.0), dup]
+        finally:
+            in_flight["now"] -= 1
+
+    monkeypatch.setattr(svc, "_fetch_category", fake_fetch)
+    pois = await svc.search("nyc", ["museums", "slow", "parks", "museums"], limit=10)
+
+    assert in_flight["peak"] > 1
+    assert [p["name"] for p in pois] == ["Federal Hall", "museums spot", "parks spot"]
+
+
+def test_route_geometry_is_simplified_for_zoom_and_polyline_encoded():
+    t = np.linspace(0, 1, 5000)
+    path = np.c_[-74 + t * 0.1, 40.7 + t * 0.05 + np.sin(t * 50) * 0.0005]
+    route = {"center": {"lat": 40.72, "lng": -73.95}, "geometry": {"paths": [path.tolist()]}}
+
+    overview = compact_route(route, "nyc")["geometry"]["paths"][0]
+    street = compact_route(route, "nyc", zoom=17)["geometry"]["paths"][0]
+    assert len(overview) < len(street) < 500
+    assert overview[0] == path[0].tolist() and overview[-1] == np.round(path[-1], 6).tolist()
+    assert len(route["geometry"]["paths"][0]) == 5000  # cached route left intact
+    assert zoom_tolerance_m(17, 40.7) < 1
+
+    encoded = compact_route(route, "nyc", geometry_format="polyline")["geometry"]
+    assert encoded["encoding"] == "polyline5" and "paths" not in encoded
+    assert np.allclose(decode_polyline(encoded["polylines"][0]), overview, atol=1e-5)
+    # Google's reference example (lat/lng order inside the string).
+    assert encode_polyline(np.array([[-120.2, 38.5], [-120.95, 40.7], [-126.453, 43.252]])) == (
+        "_p~iF~ps|U_ulLnnqC_mqNvxq`@"
+    )
+    assert compact_route(route, "nyc", geometry_format="raw") is route
+
+
+def test_rule_based_intent_extraction():
+    intent, confidence = extract_intent("Plan a 3 hour food crawl with 6 stops by subway", "nyc")
+    assert intent["tour_type"] == "foodie"
+    assert intent["categories"] == ["restaurants"]
+    assert (intent["num_stops"], intent["time_budget_min"]) == (6, 180)
+    assert intent["transport_mode"] == "transit"
+    assert confidence >= settings.INTENT_RULES_MIN_CONFIDENCE
+
+    # Vague or negated requests are left to the LLM.
+    assert extract_intent("show me around", "nyc")[1] < settings.INTENT_RULES_MIN_CONFIDENCE
+    assert extract_intent("anything but museums", "nyc")[1] < settings.INTENT_RULES_MIN_CONFIDENCE
+
+    # Number words only count as whole words ("ten" in "often", "a" in "extra").
+    intent, _ = extract_intent("I often visit places with history", "nyc")
+    assert intent["num_stops"] == 5
+    intent, _ = extract_intent("Museums for a few extra hours", "nyc")
+    assert (intent["num_stops"], intent["time_budget_min"]) == (5, None)
+
+    # Category nouns count as stops; "and a half" / "½" / "half an hour" are durations.
+    intent, confidence = extract_intent("I have an hour and a half for 3 museums", "nyc")
+    assert (intent["num_stops"], intent["time_budget_min"]) == (3, 90)
+    assert confidence >= settings.INTENT_RULES_MIN_CONFIDENCE
+    assert extract_intent("1½ hours of parks", "nyc")[0]["time_budget_min"] == 90
+    assert extract_intent("half an hour of history", "nyc")[0]["time_budget_min"] == 30
+
+    # Numbers the rules can't place go to the LLM.
+    for message in ("3 museums and 2 parks", "museums for a few hours"):
+        assert extract_intent(message, "nyc")[1] < settings.INTENT_RULES_MIN_CONFIDENCE
+
+    # Preferences may arrive as strings; unusable ones are ignored.
+    intent, _ = extract_intent("museums", "nyc", {"time_budget_min": "105", "num_stops": "many"})
+    assert (intent["num_stops"], intent["time_budget_min"]) == (3, 105)
+
+
+def test_llm_intent_is_normalised_onto_the_schema():
+    intent = parse_llm_intent('```json\n{"tour_type": "Foodie", "categories": ["Restaurants", "spaceships"], "num_stops": "40"}\n```')
+    assert intent["tour_type"] == "foodie"
+    assert intent["categories"] == ["restaurants"]
+    assert intent["num_stops"] == 12
+    assert parse_llm_intent("sorry, I can't help") is None
+
+
+def _feature_layer(total: int, max_record_count: int, seen: list):
+    """Fake feature service that caps pages at *max_record_count*."""
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        params = request.url.params
+        seen.append(dict(params))
+        if params.get("returnCountOnly") == "true":
+            return httpx.Response(200, json={"count": total})
+        offset = int(params["resultOffset"])
+        count = min(int(params["resultRecordCount"]), max_record_count, total - offset)
+        features = [{"attributes": {"OBJECTID": i + 1}} for i in range(offset, offset + count)]
+        more = offset + count < total and count < int(params["resultRecordCount"])
+        return httpx.Response(200, json={"features": features, "exceededTransferLimit": more})
+
+    return httpx.MockTransport(handler)
+
+
+@pytest.mark.asyncio
+async def test_iter_features_pages_concurrently_in_order():
+    seen: list = []
+    pool = HTTPClientPool(transport=_feature_layer(total=2500, max_record_count=400, seen=seen))
+    svc = ArcGISService(http=pool, geocode_cache=TieredCache(LRUCache()))
+
+    ids = [
+        f["attributes"]["OBJECTID"]
+        async for f in svc.iter_features(
+            "https://services.arcgis.com/x/FeatureServer/0", city="boston",
+            page_size=1000, concurrency=3, return_geometry=False,
+        )
+    ]
+    assert ids == list(range(1, 2501))
+    assert seen[0]["returnCountOnly"] == "true"
+    assert seen[1]["geometry"] == "-71.13,42.3,-70.99,42.4"
+    assert seen[1]["returnGeometry"] == "false"
+    await pool.aclose()
+
+
+@pytest.mark.asyncio
+async def test_iter_features_reaps_pending_pages_when_the_consumer_stops():
+    inner = _feature_layer(total=5000, max_record_count=1000, seen=[])
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.params.get("resultOffset", "0") != "0":
+            await asyncio.sleep(60)  # later pages are still in flight
+        return await inner.handle_async_request(request)
+
+    pool = HTTPClientPool(transport=httpx.MockTransport(handler))
+    svc = ArcGISService(http=pool, geocode_cache=TieredCache(LRUCache()))
+    features = svc.iter_features(
+        "https://services.arcgis.com/x/FeatureServer/0", page_size=1000, concurrency=3
+    )
+    assert (await features.__anext__())["attributes"]["OBJECTID"] == 1
+    await features.aclose()
+    assert asyncio.all_tasks() == {asyncio.current_task()}
+    await pool.aclose()
+
+
+@pytest.mark.asyncio
+async def test_query_features_follows_transfer_limit_up_to_limit():
+    seen: list = []
+    pool = HTTPClientPool(transport=_feature_layer(total=120, max_record_count=50, seen=seen))
+    svc = ArcGISService(http=pool, geocode_cache=TieredCache(LRUCache()))
+
+    features = await svc.query_features("https://services.arcgis.com/x/FeatureServer/0", limit=80)
+    assert [f["attributes"]["OBJECTID"] for f in features] == list(range(1, 81))
+    assert "returnCountOnly" not in seen[0]
+    await pool.aclose()
+
+
+@pytest.mark.asyncio
+async def test_poi_ingestion_is_incremental_and_serves_search(tmp_path):
+    wheres: list[str] = []
+    layer = [
+        {"attributes": {"OBJECTID": 1, "Name": "Met", "EditDate": 1_700_000_000_000},
+         "geometry": {"x": -73.963, "y": 40.779}},
+        {"attributes": {"OBJECTID": 2, "Name": "MoMA", "EditDate": 1_700_000_500_000},
+         "geometry": {"x": -73.977, "y": 40.761}},
+    ]
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        params = request.url.params
+        wheres.append(params["where"])
+        if params.get("returnCountOnly") == "true":
+            return httpx.Response(200, json={"count": len(layer)})
+        return httpx.Response(200, json={"features": layer})
+
+    pool = HTTPClientPool(transport=httpx.MockTransport(handler))
+    store = POIStore(str(tmp_path / "pois.db"))
+    assert store._conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    ingestor = POIIngestor(
+        ArcGISService(http=pool, geocode_cache=TieredCache(LRUCache())), store,
+        service_url="https://services.arcgis.com/x/FeatureServer/0",
+    )
+
+    assert await ingestor.ingest("nyc", "museums") == 2
+    assert wheres[-1] == "Category = 'Museums'"
+    await ingestor.ingest("nyc", "museums")
+    assert wheres[-1] == "Category = 'Museums' AND EditDate >= TIMESTAMP '2023-11-14 22:21:40'"
+    assert store.count("nyc") == 2
+
+    calls = len(wheres)
+    service = POIService(arcgis=ingestor.arcgis, store=store)
+    pois = await service.search("nyc", ["museums"], limit=5)
+    assert [p["name"] for p in pois] == ["Met", "MoMA"]
+    assert pois[0]["category"] == "Museums"
+    assert len(wheres) == calls  # served locally, no network
+    # Categories that were never ingested still go to the (placeholder) source.
+    assert await service.search("nyc", ["parks"], limit=2)
+    await pool.aclose()
+
+
+def test_poi_catalogue_is_columnar_with_lazy_views():
+    catalogue = POICatalogue.from_rows([
+        ("Met", "museums", 40.779, -73.963, "1000 5th Ave", None),
+        ("Bryant Park", "parks", 40.754, -73.984, None, "Lawn"),
+        ("MoMA", "museums", 40.761, -73.977, None, None),
+    ])
+    assert catalogue.category_names == ["museums", "parks"]
+    assert catalogue.category_codes.tolist() == [0, 1, 0]
+
+    view = catalogue[2]
+    assert (view.name, view.category, view.location) == ("MoMA", "museums", {"lat": 40.761, "lng": -73.977})
+    assert not hasattr(view, "__dict__")
+
+    assert catalogue.filter(["museums"]).tolist() == [0, 2]
+    assert catalogue.filter(["museums"], bbox=(-73.98, 40.75, -73.97, 40.77)).tolist() == [2]
+    assert catalogue.filter(["unknown"]).tolist() == []
+    dist = catalogue.distances_from(40.779, -73.963)
+    assert dist[0] == 0.0 and dist[1] > dist[2] > 0
+    assert catalogue.centroid(np.array([0, 2])) == {"lat": 40.77, "lng": -73.97}
+
+    assert catalogue.to_dicts([1])[0]["description"] == "Lawn"
+    assert catalogue.to_model(0).address == "1000 5th Ave" and catalogue.to_model(0).description == ""
+
+
+def test_poi_spatial_queries_use_the_local_store():
+    store = POIStore(":memory:")
+    # A 5×5 grid, ~111 m apart north–south, around (40.75, -73.99).
+    rows = [
+        {"object_id": r * 5 + c + 1, "name": f"P{r}{c}", "lat": 40.75 + r * 0.001, "lng": -73.99 + c * 0.001}
+        for r in range(5) for c in range(5)
+    ]
+    store.upsert("nyc", "landmarks", rows[:20])
+    store.upsert("nyc", "museums", rows[20:])
+    store.mark_ingested("nyc", "landmarks", 20, None)
+    store.mark_ingested("nyc", "museums", 25, None)
+    service = POIService(arcgis=ArcGISService(geocode_cache=TieredCache(LRUCache())), store=store)
+
+    inside = service.within_bbox("nyc", -73.9905, 40.7495, -73.9885, 40.7515)
+    assert sorted(p["name"] for p in inside) == ["P00", "P01", "P10", "P11"]
+
+    near = service.within_radius("nyc", 40.752, -73.988, 120)
+    assert near[0]["name"] == "P22" and near[0]["distance_m"] == 0.0
+    assert {p["name"] for p in near[1:]} == {"P12", "P32", "P21", "P23"}
+
+    nearest = service.nearest_k("nyc", 40.70, -73.99, 2, categories=["museums"])
+    assert [p["name"] for p in nearest] == ["P40", "P41"]
+    assert nearest[0]["category"] == "Museums"
+    assert nearest[0]["distance_m"] > 5000
+
+    # Re-ingesting rebuilds the index.
+    store.upsert("nyc", "museums", [{"object_id": 99, "name": "New", "lat": 40.7, "lng": -73.99}])
+    store.mark_ingested("nyc", "museums", 99, None)
+    assert service.nearest_k("nyc", 40.70, -73.99, 1)[0]["name"] == "New"
+
+
+@pytest.mark.asyncio
+async def test_distance_matrix_is_memory_mapped_and_rebuilt_incrementally(tmp_path):
+    store = POIStore(":memory:")
+    rows = [
+        {"object_id": i + 1, "name": f"P{i}", "lat": 40.75 + i * 0.003, "lng": -73.99 + (i % 3) * 0.004}
+        for i in range(6)
+    ]
+    store.upsert("nyc", "landmarks", rows[:4])
+    store.mark_ingested("nyc", "landmarks", 4, None)
+    matrices = DistanceMatrixCache(store, directory=str(tmp_path))
+
+    assert matrices.get("nyc") is None  # first use: built in the background
+    await asyncio.gather(*matrices._building.values())
+    first = matrices.get("nyc")
+    assert isinstance(first.dist, np.memmap) and len(first) == 4
+    assert matrices.stats()["rows_measured"] == 4
+
+    # Two new POIs: only their rows are measured, the rest are carried over.
+    store.upsert("nyc", "museums", rows[4:])
+    store.mark_ingested("nyc", "museums", 6, None)
+    assert matrices.get("nyc") is first  # served while the rebuild runs
+    second = await matrices.refresh("nyc")
+    assert len(second) == 6
+    assert matrices.stats()["rows_measured"] == 6 and matrices.stats()["rows_carried"] == 4
+
+    pois = [_poi(r["name"], r["lat"], r["lng"]) for r in rows]
+    expected = route_optimiser.haversine_matrix([r["lat"] for r in rows], [r["lng"] for r in rows])
+    sub = second.submatrix([pois[5], pois[0], pois[3]])
+    assert np.allclose(sub, expected[np.ix_([5, 0, 3], [5, 0, 3])], rtol=1e-5)
+    assert second.submatrix([_poi("Elsewhere", 41.0, -74.5)]) is None
+
+    # A fresh cache reuses the file on disk instead of rebuilding.
+    reopened = DistanceMatrixCache(store, directory=str(tmp_path))
+    assert len(await reopened.refresh("nyc")) == 6 and reopened.stats()["builds"] == 0
+
+    route = await RouteService(http=HTTPClientPool(), matrices=matrices).optimise(
+        pois, mode="local", city="nyc"
+    )
+    assert sorted(route["sequence"]) == list(range(6))
+
+    # Workers rebuilding the same city at once each publish a whole matrix.
+    store.upsert("nyc", "parks", [{"object_id": 7, "name": "P7", "lat": 40.76, "lng": -73.98}])
+    store.mark_ingested("nyc", "parks", 7, None)
+    workers = [DistanceMatrixCache(store, directory=str(tmp_path)) for _ in range(2)]
+    await asyncio.gather(*(w.refresh("nyc") for w in workers))
+    fresh = await DistanceMatrixCache(store, directory=str(tmp_path)).refresh("nyc")
+    assert len(fresh) == 7 and np.allclose(fresh.dist, fresh.dist.T)
+    assert not list(tmp_path.glob("*.tmp"))
+    published = json.loads((tmp_path / "nyc.json").read_text())["matrix"]
+    assert published in {p.name for p in tmp_path.glob("nyc.*.npy")}
+
+    # A city too big for a matrix is remembered, not re-scanned on every route.
+    capped = DistanceMatrixCache(store, directory=str(tmp_path / "capped"), max_pois=3)
+    assert await capped.refresh("nyc") is None
+    assert capped.get("nyc") is None and not capped._building
+    assert capped.stats()["unavailable"] == ["nyc"]